@@ -2,61 +2,23 @@
 量价关系回测 - 腾讯财经API版
 """
 
-import pandas as pd
-import requests
-import time
+from kline_parser import parse_kline_frame
+from tencent_fetcher import get_fetcher
 
 def get_tencent_data():
     """从腾讯财经获取贵州茅台日线数据"""
     
-    # 腾讯财经API
-    url = "https://web.ifzq.gtimg.cn/appstock/app/fqkline/get"
+    # 腾讯财经API（共享下载器：连接池 + 限速 + 退避重试）
+    print("获取: 腾讯财经...")
+    text = get_fetcher().fetch_kline("sh600519", count=500)  # 获取最近500个交易日
     
-    params = {
-        "_var": "kline_dayqfq",
-        "param": "sh600519,day,,,500,qfq"  # 获取最近500个交易日
-    }
-    
-    headers = {"User-Agent": "Mozilla/5.0"}
-    
-    for attempt in range(3):
-        try:
-            print(f"尝试 {attempt+1}/3: 腾讯财经...")
-            response = requests.get(url, params=params, headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                text = response.text
-                # 解析返回数据
-                if 'qfqday' in text:
-                    # 提取JSON部分
-                    json_str = text.split('=', 1)[1]
-                    data = eval(json_str)
-                    
-                    if data.get('code') == 0:
-                        klines = data['data']['sh600519']['qfqday']
-                        print(f"✅ 获取到 {len(klines)} 条K线数据")
-                        
-                        # 解析K线 [日期, 开盘, 收盘, 最高, 最低, 成交量(手)]
-                        records = []
-                        for k in klines:
-                            if len(k) >= 6:
-                                records.append({
-                                    'date': k[0],
-                                    'open': float(k[1]),
-                                    'close': float(k[2]),
-                                    'high': float(k[3]),
-                                    'low': float(k[4]),
-                                    'volume': float(k[5]) * 100  # 手转股
-                                })
-                        
-                        df = pd.DataFrame(records[::-1])  # 倒序（从早到晚）
-                        return df
-            else:
-                print(f"   HTTP {response.status_code}")
-        except Exception as e:
-            print(f"   失败: {e}")
-        
-        time.sleep(2)
+    # 解析返回数据 [日期, 开盘, 收盘, 最高, 最低, 成交量(手→股)]，按日期升序
+    if text:
+        df = parse_kline_frame(text, "sh600519")
+        if df is not None:
+            print(f"✅ 获取到 {len(df)} 条K线数据")
+            return df
+    print("   失败")
     
     return None
 
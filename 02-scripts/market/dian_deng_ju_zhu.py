@@ -9,35 +9,29 @@
 """
 
 import pandas as pd
-import numpy as np
-import os
+
+import indicators
+import market_store
+import signals
 
 # ========== 配置 ==========
 STOCK_CODE = "600021"  # 上海电力
 STOCK_NAME = "上海电力"
-DATA_FILE = f"stock_data/{STOCK_CODE}.csv"
 
 # ========== 加载数据 ==========
-df = pd.read_csv(DATA_FILE)
-df['date'] = pd.to_datetime(df['date'])
-df = df.sort_values('date').reset_index(drop=True)
+df = market_store.load_bars(STOCK_CODE)
 
 # ========== 计算指标 ==========
-df['volume_ma5'] = df['volume'].rolling(5).mean()
-df['volume_ma20'] = df['volume'].rolling(20).mean()
-df['price_ma5'] = df['close'].rolling(5).mean()
-df['price_ma20'] = df['close'].rolling(20).mean()
-df['vol_change'] = (df['volume'] - df['volume_ma5']) / df['volume_ma5']
-df['vol_change20'] = (df['volume'] - df['volume_ma20']) / df['volume_ma20']
-df['return_d1'] = df['close'].pct_change(1)
-df['return_future'] = df['close'].pct_change(-5)  # 未来5日
+indicators.add_indicators(df, ['volume_ma5', 'volume_ma20', 'price_ma5', 'price_ma20',
+                               'vol_change', 'vol_change20', 'return_d1', 'return_d10'], key=STOCK_CODE)
+indicators.add_indicators(df, {'return_future': 'return_f5'}, key=STOCK_CODE)  # 未来5日
 
 # ========== 策略信号 ==========
 
 # 点灯：缩量企稳
 # 连续3日缩量 + 横盘震荡
 df['light_3day'] = (df['vol_change'] < -0.2) & (df.shift(1)['vol_change'] < -0.2) & (df.shift(2)['vol_change'] < -0.2)
-df['light_stable'] = df['close'].pct_change(10).abs() < 0.15  # 10日内波动<15%
+df['light_stable'] = df['return_d10'].abs() < 0.15  # 10日内波动<15%
 df['signal_light'] = df['light_3day'] & df['light_stable']
 
 # 举烛：放量上涨
@@ -48,25 +42,10 @@ df['signal_candle'] = (df['vol_change'] > 0.3) & (df['return_d1'] > 0.01) & (df[
 # 找点灯后N日内举烛
 OBS_DAYS = 10
 
-df['light_date'] = None
-for i in range(len(df)):
-    if df.iloc[i]['signal_light']:
-        # 标记为点灯日
-        df.iloc[i, df.columns.get_loc('light_date')] = df.iloc[i]['date']
-
-# 填充light_date
-df['light_date'] = df['light_date'].ffill()
-
-# 判断举烛是否在点灯后的OBS_DAYS日内
-df['days_from_light'] = None
-for i in range(len(df)):
-    if df.iloc[i]['signal_candle'] and pd.notna(df.iloc[i]['light_date']):
-        light_date = pd.to_datetime(df.iloc[i]['light_date'])
-        days = (df.iloc[i]['date'] - light_date).days
-        if 1 <= days <= OBS_DAYS:
-            df.iloc[i, df.columns.get_loc('days_from_light')] = days
-
-df['signal_combined'] = df['days_from_light'].notna()
+combined_mask, wait = signals.two_stage(df['signal_light'], df['signal_candle'], OBS_DAYS,
+                                        dates=pd.to_datetime(df['date']))
+df['signal_combined'] = combined_mask
+df['days_from_light'] = wait
 
 # ========== 回测 ==========
 print("=" * 70)
@@ -86,38 +65,26 @@ combined = df[df['signal_combined']]
 print(f"\n🔥 二阶段「点灯+举烛」信号: {len(combined)} 次")
 
 if len(combined) > 0:
-    profits = []
-    for idx in combined.index:
-        future_ret = df.iloc[idx]['return_future']
-        if not np.isnan(future_ret):
-            profits.append({
-                'date': df.iloc[idx]['date'],
-                'entry': df.iloc[idx]['close'],
-                'wait': df.iloc[idx]['days_from_light'],
-                'ret': future_ret
-            })
+    trades = combined[combined['return_future'].notna()]
+    stats = signals.trade_stats(combined_mask, df['return_future'])
     
-    if profits:
-        rets = [p['ret'] for p in profits]
-        wins = sum(1 for r in rets if r > 0)
-        losses = len(rets) - wins
-        win_rate = wins / len(rets)
-        avg_ret = np.mean(rets)
+    if stats['trades'] > 0:
+        wins, losses, win_rate = stats['wins'], stats['losses'], stats['win_rate']
         
-        print(f"\n📋 交易详情 (共{len(profits)}笔):")
+        print(f"\n📋 交易详情 (共{stats['trades']}笔):")
         print("-" * 50)
-        for p in sorted(profits, key=lambda x: x['ret'], reverse=True):
-            mark = '✓' if p['ret'] > 0 else '✗'
-            print(f"  {mark} {p['date'].strftime('%Y-%m-%d')} | 买入:{p['entry']:.2f} | 等待:{int(p['wait'])}日 | 收益:{p['ret']:+.2%}")
+        for t in trades.sort_values('return_future', ascending=False).itertuples():
+            mark = '✓' if t.return_future > 0 else '✗'
+            print(f"  {mark} {pd.Timestamp(t.date).strftime('%Y-%m-%d')} | 买入:{t.close:.2f} | 等待:{int(t.days_from_light)}日 | 收益:{t.return_future:+.2%}")
         
         print("\n" + "=" * 70)
         print("📊 回测结果")
         print("=" * 70)
-        print(f"交易次数: {len(profits)}")
+        print(f"交易次数: {stats['trades']}")
         print(f"胜率: {win_rate:.1%} ({wins}胜 {losses}负)")
-        print(f"平均收益: {avg_ret:.3%}")
-        print(f"最大盈利: {max(rets):.2%}")
-        print(f"最大亏损: {min(rets):.2%}")
+        print(f"平均收益: {stats['avg_return']:.3%}")
+        print(f"最大盈利: {stats['max_win']:.2%}")
+        print(f"最大亏损: {stats['max_loss']:.2%}")
         
         # 结论
         if win_rate > 0.55:
@@ -131,15 +98,8 @@ else:
     
     # 统计单独的放量上涨信号
     print("\n📊 单独「放量上涨」信号回测:")
-    candle_profits = []
-    for idx in candles.index:
-        ret = df.iloc[idx]['return_future']
-        if not np.isnan(ret):
-            candle_profits.append(ret)
+    candle_stats = signals.trade_stats(df['signal_candle'], df['return_future'])
     
-    if candle_profits:
-        wins = sum(1 for r in candle_profits if r > 0)
-        wr = wins / len(candle_profits)
-        avg = np.mean(candle_profits)
-        print(f"   胜率: {wr:.1%}")
-        print(f"   平均收益: {avg:.3%}")
+    if candle_stats['trades'] > 0:
+        print(f"   胜率: {candle_stats['win_rate']:.1%}")
+        print(f"   平均收益: {candle_stats['avg_return']:.3%}")
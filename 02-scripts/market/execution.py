@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+A股成交模拟层：涨跌停、停牌、跳空成交、T+1、佣金 / 印花税
+
+回测引擎在整张面板（交易日 × 股票）上一次算出涨跌停价与可交易标记，
+逐笔成交只做数组比较，不逐行判断。
+
+涨跌幅限制（按代码判断板块；ST 需调用方给出标记，可用 st_flags 按名称判断）:
+    主板 60 / 00          ±10%（ST ±5%）
+    创业板 30 / 科创板 68  ±20%
+    北交所 8 / 4 / 92      ±30%
+前收盘价缺失（上市首日等）视为无涨跌幅限制。
+前复权价格不落在分价位上，涨跌停价由复权前收盘算出后与真实价位有舍入误差，
+成交判断按半个价位的容差比较（差不到半分即视为到达涨跌停价）。
+
+成交规则:
+    - 停牌（无开盘价或成交量为 0）不成交
+    - 买入价达到涨停价买不进；卖出价达到跌停价卖不出，全天封死跌停（最高价 ≤ 跌停价）当日无法卖出
+    - 止损单：开盘跳空低于止损价按开盘价成交，否则按止损价；不低于跌停价
+    - 止盈单：开盘跳空高于目标价按开盘价成交，否则按目标价
+    - T+1：买入当日不能卖出
+
+用法:
+    import execution
+    model = execution.ExecutionModel()
+    up, down = execution.limit_prices(prev_close, execution.limit_pct(codes))
+    ok = execution.can_buy(open_, up, tradable)
+    fee = model.buy_fee(value)
+
+基准:
+    python3 execution.py --bench --symbols 5000 --bars 750
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ========== 配置 ==========
+TICK = 0.01
+
+BOARD_LIMITS = (
+    (("688", "689", "300", "301"), 0.20),   # 科创板 / 创业板
+    (("8", "4", "92"), 0.30),               # 北交所
+)
+MAIN_LIMIT = 0.10
+ST_LIMIT = 0.05
+
+
+@dataclass
+class ExecutionModel:
+    """交易费用（默认按 2023-08 之后的标准：印花税 0.05% 仅卖出收取）"""
+    commission: float = 0.00025     # 佣金（双向）
+    min_commission: float = 5.0     # 单笔最低佣金
+    stamp_tax: float = 0.0005       # 印花税（卖出）
+    transfer_fee: float = 0.00001   # 过户费（双向）
+    slippage: float = 0.0           # 额外滑点（按成交额比例）
+
+    def buy_fee(self, value):
+        value = np.asarray(value, dtype=np.float64)
+        fee = np.maximum(value * self.commission, self.min_commission) + value * (self.transfer_fee + self.slippage)
+        return np.where(value > 0, fee, 0.0)
+
+    def sell_fee(self, value):
+        value = np.asarray(value, dtype=np.float64)
+        fee = (np.maximum(value * self.commission, self.min_commission)
+               + value * (self.stamp_tax + self.transfer_fee + self.slippage))
+        return np.where(value > 0, fee, 0.0)
+
+
+# ========== 涨跌停 ==========
+def limit_pct(codes: Iterable[str], st: Optional[Iterable[bool]] = None) -> np.ndarray:
+    """每只股票的涨跌幅限制比例"""
+    codes = list(codes)
+    pct = np.full(len(codes), MAIN_LIMIT)
+    for i, code in enumerate(codes):
+        for prefixes, p in BOARD_LIMITS:
+            if code.startswith(prefixes):
+                pct[i] = p
+                break
+    if st is not None:
+        main = pct == MAIN_LIMIT
+        pct[np.asarray(list(st), dtype=bool) & main] = ST_LIMIT
+    return pct
+
+
+def st_flags(names: Iterable[Optional[str]]) -> np.ndarray:
+    """按股票名称标记 ST / *ST（名称缺失视为非 ST）"""
+    return np.array(["ST" in (name or "").upper() for name in names], dtype=bool)
+
+
+def _round_price(x: np.ndarray) -> np.ndarray:
+    """交易所口径四舍五入到分"""
+    return np.floor(x / TICK + 0.5) * TICK
+
+
+def limit_prices(prev_close: np.ndarray, pct: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    涨停价 / 跌停价
+
+    Args:
+        prev_close: 前收盘价（一维或 交易日 × 股票），缺失为 NaN
+        pct: limit_pct 的结果（按列广播）
+
+    Returns:
+        (up, down)；前收盘缺失处为 +inf / -inf（不限制）
+    """
+    prev_close = np.asarray(prev_close, dtype=np.float64)
+    up = _round_price(prev_close * (1 + pct))
+    down = _round_price(prev_close * (1 - pct))
+    missing = np.isnan(prev_close)
+    return np.where(missing, np.inf, up), np.where(missing, -np.inf, down)
+
+
+def prev_close(close: np.ndarray) -> np.ndarray:
+    """前收盘价（停牌日沿用最后一个收盘价），axis 0 为时间"""
+    filled = pd.DataFrame(np.asarray(close, dtype=np.float64).reshape(len(close), -1)).ffill().to_numpy()
+    out = np.full_like(filled, np.nan)
+    out[1:] = filled[:-1]
+    return out.reshape(np.shape(close))
+
+
+def tradable(open_: np.ndarray, volume: Optional[np.ndarray] = None) -> np.ndarray:
+    """当日是否有成交（非停牌）"""
+    ok = ~np.isnan(open_) & (open_ > 0)
+    if volume is not None:
+        ok &= np.nan_to_num(volume) > 0
+    return ok
+
+
+# ========== 成交判断 ==========
+def can_buy(price: np.ndarray, up: np.ndarray, is_tradable: np.ndarray) -> np.ndarray:
+    """按 price 买入：停牌或已到涨停价则买不进"""
+    return is_tradable & (price < up - TICK / 2)
+
+
+def can_sell(high: np.ndarray, down: np.ndarray, is_tradable: np.ndarray) -> np.ndarray:
+    """当日能否卖出：停牌或全天封死跌停则卖不出"""
+    return is_tradable & (high > down + TICK / 2)
+
+
+def stop_fill(open_, low, stop, down) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    止损单
+
+    Returns:
+        (是否触发, 成交价)：跳空低开按开盘价，否则按止损价，不低于跌停价
+    """
+    hit = low <= stop
+    px = np.maximum(np.minimum(open_, stop), down)
+    return hit, px
+
+
+def target_fill(open_, high, target) -> Tuple[np.ndarray, np.ndarray]:
+    """止盈单：(是否触发, 成交价)，跳空高开按开盘价"""
+    hit = high >= target
+    return hit, np.maximum(open_, target)
+
+
+def sellable_since(entry_t: np.ndarray, t: int) -> np.ndarray:
+    """T+1：买入次日起才能卖"""
+    return (entry_t >= 0) & (entry_t < t)
+
+
+# ========== 基准 ==========
+def run_bench(symbols: int, bars: int):
+    rng = np.random.default_rng(0)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.03, (bars, symbols)), axis=0))
+    close[rng.random(close.shape) < 0.01] = np.nan  # 约 1% 停牌
+    open_ = close * (1 + rng.normal(0, 0.01, close.shape))
+    high = np.fmax(open_, close) * 1.01
+    codes = [f"{600000 + i:06d}" if i % 3 else f"{300000 + i:06d}" for i in range(symbols)]
+
+    t0 = time.perf_counter()
+    pc = prev_close(close)
+    up, down = limit_prices(pc, limit_pct(codes))
+    ok = tradable(open_)
+    buy_ok = can_buy(open_, up, ok)
+    sell_ok = can_sell(high, down, ok)
+    fees = ExecutionModel().sell_fee(np.where(sell_ok, close * 1000, 0.0))
+    elapsed = time.perf_counter() - t0
+    print(f"{bars} 日 × {symbols} 只：涨跌停价 + 可成交判断 + 费用 {elapsed:.3f}s "
+          f"（{elapsed / close.size * 1e9:.1f} ns/格，可买 {buy_ok.mean():.1%}，可卖 {sell_ok.mean():.1%}，"
+          f"费用合计 {fees.sum():,.0f}）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="A股成交模拟层")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--symbols", type=int, default=5000)
+    parser.add_argument("--bars", type=int, default=750)
+    args = parser.parse_args()
+    if args.bench:
+        run_bench(args.symbols, args.bars)
+    else:
+        parser.print_help()
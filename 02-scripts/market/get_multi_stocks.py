@@ -8,6 +8,8 @@ import requests
 import time
 import os
 
+from kline_parser import parse_kline_frame
+
 DATA_DIR = "stock_data"
 os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -35,22 +37,9 @@ def get_tencent_stock(stock_code):
             if response.status_code == 200:
                 text = response.text
                 if 'qfqday' in text and 'param error' not in text:
-                    json_str = text.split('=', 1)[1]
-                    data = eval(json_str)
-                    if data.get('code') == 0:
-                        klines = data['data'][code]['qfqday']
-                        records = []
-                        for k in klines:
-                            if len(k) >= 6:
-                                records.append({
-                                    'date': k[0],
-                                    'open': float(k[1]),
-                                    'close': float(k[2]),
-                                    'high': float(k[3]),
-                                    'low': float(k[4]),
-                                    'volume': float(k[5]) * 100
-                                })
-                        return pd.DataFrame(records[::-1])
+                    df = parse_kline_frame(text, code)
+                    if df is not None:
+                        return df
         except Exception as e:
             pass
         time.sleep(3)
@@ -9,6 +9,8 @@ import numpy as np
 import time
 import os
 
+from kline_parser import parse_kline_frame
+
 DATA_DIR = "stock_data/hs300"
 os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -36,9 +38,7 @@ def get_stock_data(code):
         params = {"_var": "kline_dayqfq", "param": f"{market},day,,,250,qfq"}
         resp = requests.get(url, params=params, headers={"User-Agent": "Mozilla/5.0"}, timeout=20)
         if resp.status_code == 200 and 'qfqday' in resp.text:
-            klines = eval(resp.text.split('=', 1)[1])['data'][market]['qfqday']
-            records = [{'date': k[0], 'close': float(k[2]), 'volume': float(k[5]) * 100} for k in klines if len(k) >= 6]
-            return pd.DataFrame(records[::-1])
+            return parse_kline_frame(resp.text, market, fields=('close', 'volume'))
     except:
         pass
     return None
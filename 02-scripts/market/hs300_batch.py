@@ -1,18 +1,18 @@
 #!/usr/bin/env python3
 """
-沪深300成分股策略分析 - 分批获取
-每批10只，获取完立即分析
+沪深300成分股策略分析 - 分批展示
+全部股票由共享下载器一次并发拉取（连接池 + 限速），再按每批10只分析展示
 """
 
-import requests
 import pandas as pd
 import numpy as np
-import time
-import os
 from datetime import datetime
 
-DATA_DIR = "stock_data/hs300"
-os.makedirs(DATA_DIR, exist_ok=True)
+import indicators
+import market_store
+import signals
+from kline_parser import parse_kline_frame
+from tencent_fetcher import get_fetcher, market_code
 
 # 沪深300成分股池（分批）
 BATCHES = [
@@ -33,23 +33,15 @@ BATCHES = [
     ["600850", "华东医药"],
 ]
 
-def get_stock_data(code):
-    """获取单只股票数据"""
-    if code.startswith('6') or code.startswith('688'):
-        market = f"sh{code}"
-    else:
-        market = f"sz{code}"
-    
-    try:
-        url = "https://web.ifzq.gtimg.cn/appstock/app/fqkline/get"
-        params = {"_var": "kline_dayqfq", "param": f"{market},day,,,250,qfq"}
-        resp = requests.get(url, params=params, headers={"User-Agent": "Mozilla/5.0"}, timeout=20)
-        if resp.status_code == 200 and 'qfqday' in resp.text:
-            klines = eval(resp.text.split('=', 1)[1])['data'][market]['qfqday']
-            records = [{'date': k[0], 'close': float(k[2]), 'volume': float(k[5]) * 100} for k in klines if len(k) >= 6]
-            return pd.DataFrame(records[::-1])
-    except:
-        pass
+def get_stock_data(code, text=None):
+    """获取单只股票数据（text 为已预取的响应文本时不再发请求）"""
+    market = market_code(code)
+    
+    if text is None:
+        text = get_fetcher().fetch_kline(market, count=250)
+    if text:
+        # 全部 OHLCV 都解析：结果要写进共享的列式存储，只存 close/volume 会让其他脚本缺列
+        return parse_kline_frame(text, market)
     return None
 
 def analyze_strategies(df):
@@ -58,31 +50,19 @@ def analyze_strategies(df):
     df['date'] = pd.to_datetime(df['date'])
     
     # 指标
-    df['v_ma5'] = df['volume'].rolling(5).mean()
-    df['vc'] = (df['volume'] - df['v_ma5']) / df['v_ma5']
-    df['ret_f5'] = df['close'].pct_change(-5)
+    indicators.add_indicators(df, {'vc': 'vol_change', 'ret_f5': 'return_f5', 'ret_d10': 'return_d10'})
+    ret_f5 = df['ret_f5'].to_numpy()
+    valid = ~np.isnan(ret_f5)
     
     # 策略1: 放量买入
-    sig1 = df[df['vc'] > 0.25]
-    profits1 = []
-    for idx in sig1.index:
-        ret = df.iloc[idx]['ret_f5']
-        if not pd.isna(ret):
-            profits1.append(ret)
-    
-    # 策略2: 缩量后的放量
-    df['squeeze'] = (df['vc'] < -0.20) & (df['close'].pct_change(10).abs() < 0.15)
+    profits1 = ret_f5[(df['vc'] > 0.25).to_numpy() & valid].tolist()
+    
+    # 策略2: 缩量后的放量（每个缩量日取其后10根内第一次放量）
+    df['squeeze'] = (df['vc'] < -0.20) & (df['ret_d10'].abs() < 0.15)
     df['breakout'] = df['vc'] > 0.25
     
-    profits2 = []
-    for i in range(len(df)):
-        if df.iloc[i]['squeeze']:
-            for j in range(i+1, min(i+11, len(df))):
-                if df.iloc[j]['breakout']:
-                    ret = df.iloc[j]['ret_f5']
-                    if not pd.isna(ret):
-                        profits2.append(ret)
-                    break
+    picked = signals.gather(ret_f5, signals.first_after(df['squeeze'], df['breakout'], 10))
+    profits2 = picked[~np.isnan(picked)].tolist()
     
     return profits1, profits2
 
@@ -95,6 +75,10 @@ def main():
     
     all_results = []
     
+    # 一次并发预取全部股票（共享连接池 + 令牌桶限速，取代逐只 sleep）
+    print(f"\n🌐 并发获取 {len(BATCHES)} 只股票...")
+    texts = get_fetcher().fetch_klines([market_code(code) for code, _ in BATCHES], count=250)
+    
     # 分批处理
     batch_size = 10
     for batch_idx in range(0, len(BATCHES), batch_size):
@@ -110,12 +94,12 @@ def main():
         for i, (code, name) in enumerate(batch):
             print(f"\r  [{i+1}/{len(batch)}] {code} {name}...", end="", flush=True)
             
-            df = get_stock_data(code)
+            df = get_stock_data(code, texts.get(market_code(code)))
             if df is None:
                 print(" ❌ 失败")
                 continue
             
-            df.to_csv(f"{DATA_DIR}/{code}.csv", index=False)
+            market_store.append_bars(code, df)
             
             # 分析
             profits1, profits2 = analyze_strategies(df)
@@ -129,8 +113,6 @@ def main():
                     's2_wr': sum(1 for p in profits2 if p > 0)/len(profits2) if profits2 else 0,
                     's2_avg': np.mean(profits2) if profits2 else 0
                 })
-            
-            time.sleep(0.8)
         
         print(f"\n\n✅ 第 {batch_num} 批完成 {len(batch_results)} 只")
         
@@ -146,11 +128,6 @@ def main():
                 print(f"{r['code']:<8} {s1:<22} {s2:<22}")
             
             all_results.extend(batch_results)
-        
-        # 每批之间暂停
-        if batch_idx + batch_size < len(BATCHES):
-            print("\n⏳ 暂停30秒...")
-            time.sleep(30)
     
     # ========== 汇总 ==========
     print("\n\n" + "=" * 75)
@@ -4,11 +4,12 @@
 """
 
 import requests
-import pandas as pd
 import time
 import os
 from datetime import datetime
 
+from kline_parser import parse_kline_frame
+
 DATA_DIR = "stock_data/hs300"
 os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -40,10 +41,7 @@ def get_stock_data(code):
         
         resp = requests.get(url, params=params, headers=headers, timeout=20)
         if resp.status_code == 200 and 'qfqday' in resp.text:
-            klines = eval(resp.text.split('=', 1)[1])['data'][market]['qfqday']
-            records = [{'date': k[0], 'close': float(k[2]), 'volume': float(k[5]) * 100} 
-                      for k in klines if len(k) >= 6]
-            return pd.DataFrame(records[::-1])
+            return parse_kline_frame(resp.text, market, fields=('close', 'volume'))
     except Exception as e:
         pass
     return None
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+增量指标状态（盘中反复扫描时只算新 tick）
+
+每个指标保存自己的滚动状态，可以：
+- update(x)：追加一根已收盘的K线，O(1)
+- peek(x)：假设当日（未收盘）K线取值 x 时的指标值，不改变状态，O(1)
+- to_dict() / from_dict()：JSON 持久化
+
+盘中每次扫描只需用最新 tick（现价 / 当日最高 / 累计成交量）调用 peek，
+历史K线一天只需下载、回放一次。
+
+数值口径与 indicators.py 一致：
+    RollingMean  = rolling(n).mean()
+    RollingMax   = rolling(n).max()
+    EMA          = ewm(span, adjust=False)
+    RSI          = 涨跌幅 n 日简单均值（wilder=True 时为 Wilder 平滑）
+
+用法:
+    from indicator_state import SymbolState, load_states, save_states
+    states = load_states(path)
+    st = SymbolState.from_bars(code, dates, close, high, volume)
+    snap = st.peek(close=12.3, high=12.5, volume=35000)
+    save_states(path, states)
+"""
+
+import json
+import math
+import os
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+NAN = float("nan")
+
+
+class RollingMean:
+    """n 日简单均值：定长窗口 + 运行和"""
+
+    def __init__(self, n: int, window: Iterable[float] = ()):
+        self.n = n
+        self.window = deque(window, maxlen=n)
+        self.total = math.fsum(self.window)
+
+    def update(self, x: float) -> float:
+        if len(self.window) == self.n:
+            self.total -= self.window[0]
+        self.window.append(x)
+        self.total += x
+        return self.value
+
+    @property
+    def value(self) -> float:
+        return self.total / self.n if len(self.window) == self.n else NAN
+
+    def peek(self, x: float) -> float:
+        if len(self.window) + 1 < self.n:
+            return NAN
+        dropped = self.window[0] if len(self.window) == self.n else 0.0
+        return (self.total - dropped + x) / self.n
+
+    def to_dict(self) -> dict:
+        return {"n": self.n, "window": list(self.window)}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "RollingMean":
+        # 运行和在加载时重新求和，避免长期累加的浮点漂移
+        return cls(d["n"], d["window"])
+
+
+class RollingMax:
+    """n 日最大值：单调递减队列 [(序号, 值)]，均摊 O(1)"""
+
+    def __init__(self, n: int, queue: Iterable = (), seq: int = 0):
+        self.n = n
+        self.queue = deque((int(i), float(v)) for i, v in queue)
+        self.seq = seq
+
+    def update(self, x: float) -> float:
+        while self.queue and self.queue[-1][1] <= x:
+            self.queue.pop()
+        self.queue.append((self.seq, x))
+        self.seq += 1
+        while self.queue[0][0] <= self.seq - 1 - self.n:
+            self.queue.popleft()
+        return self.value
+
+    @property
+    def value(self) -> float:
+        return self.queue[0][1] if self.seq >= self.n else NAN
+
+    def peek(self, x: float) -> float:
+        if self.seq + 1 < self.n:
+            return NAN
+        # 追加后窗口为 [seq-n+1, seq]，队首可能正好被挤出，最多看前两个
+        oldest = self.seq - self.n + 1
+        for i, v in self.queue:
+            if i >= oldest:
+                return max(v, x)
+        return x
+
+    def to_dict(self) -> dict:
+        return {"n": self.n, "queue": [list(q) for q in self.queue], "seq": self.seq}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "RollingMax":
+        return cls(d["n"], d["queue"], d["seq"])
+
+
+class EMA:
+    """EMA（adjust=False），首个值作为初值"""
+
+    def __init__(self, span: int, value: float = NAN):
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+        self.value = value
+
+    def peek(self, x: float) -> float:
+        if math.isnan(self.value):
+            return x
+        return self.alpha * x + (1 - self.alpha) * self.value
+
+    def update(self, x: float) -> float:
+        self.value = self.peek(x)
+        return self.value
+
+    def to_dict(self) -> dict:
+        return {"span": self.span, "value": self.value}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "EMA":
+        return cls(d["span"], d["value"])
+
+
+class MACD:
+    """MACD(12, 26, 9)，返回 (dif, dea)"""
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+
+    def update(self, close: float):
+        dif = self.fast.update(close) - self.slow.update(close)
+        return dif, self.signal.update(dif)
+
+    @property
+    def value(self):
+        return self.fast.value - self.slow.value, self.signal.value
+
+    def peek(self, close: float):
+        dif = self.fast.peek(close) - self.slow.peek(close)
+        return dif, self.signal.peek(dif)
+
+    def to_dict(self) -> dict:
+        return {"fast": self.fast.to_dict(), "slow": self.slow.to_dict(), "signal": self.signal.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "MACD":
+        m = cls()
+        m.fast, m.slow, m.signal = EMA.from_dict(d["fast"]), EMA.from_dict(d["slow"]), EMA.from_dict(d["signal"])
+        return m
+
+
+class RSI:
+    """
+    RSI 增量状态
+
+    默认与 indicators.rsi 相同（涨跌幅 n 日简单均值）；
+    wilder=True 时前 n 个涨跌幅取均值作为种子，之后 avg = (avg * (n-1) + x) / n。
+    """
+
+    def __init__(self, n: int = 14, wilder: bool = False):
+        self.n = n
+        self.wilder = wilder
+        self.prev_close = NAN
+        self.gain = RollingMean(n)
+        self.loss = RollingMean(n)
+        self.count = 0            # Wilder：已累计的涨跌幅个数
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    @staticmethod
+    def _rsi(gain: float, loss: float) -> float:
+        if math.isnan(gain) or math.isnan(loss):
+            return NAN
+        return 100 - 100 / (1 + gain / (loss + 1e-9))
+
+    def _wilder_next(self, g: float, l: float):
+        if self.count < self.n:
+            k = self.count + 1
+            return self.avg_gain + (g - self.avg_gain) / k, self.avg_loss + (l - self.avg_loss) / k, k
+        return (self.avg_gain * (self.n - 1) + g) / self.n, (self.avg_loss * (self.n - 1) + l) / self.n, self.count + 1
+
+    def update(self, close: float) -> float:
+        if not math.isnan(self.prev_close):
+            d = close - self.prev_close
+            g, l = max(d, 0.0), max(-d, 0.0)
+            if self.wilder:
+                self.avg_gain, self.avg_loss, self.count = self._wilder_next(g, l)
+            else:
+                self.gain.update(g)
+                self.loss.update(l)
+        self.prev_close = close
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if self.wilder:
+            return self._rsi(self.avg_gain, self.avg_loss) if self.count >= self.n else NAN
+        return self._rsi(self.gain.value, self.loss.value)
+
+    def peek(self, close: float) -> float:
+        if math.isnan(self.prev_close):
+            return NAN
+        d = close - self.prev_close
+        g, l = max(d, 0.0), max(-d, 0.0)
+        if self.wilder:
+            avg_gain, avg_loss, count = self._wilder_next(g, l)
+            return self._rsi(avg_gain, avg_loss) if count >= self.n else NAN
+        return self._rsi(self.gain.peek(g), self.loss.peek(l))
+
+    def to_dict(self) -> dict:
+        return {"n": self.n, "wilder": self.wilder, "prev_close": self.prev_close,
+                "gain": self.gain.to_dict(), "loss": self.loss.to_dict(),
+                "count": self.count, "avg_gain": self.avg_gain, "avg_loss": self.avg_loss}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "RSI":
+        r = cls(d["n"], d["wilder"])
+        r.prev_close = d["prev_close"]
+        r.gain, r.loss = RollingMean.from_dict(d["gain"]), RollingMean.from_dict(d["loss"])
+        r.count, r.avg_gain, r.avg_loss = d["count"], d["avg_gain"], d["avg_loss"]
+        return r
+
+
+class SymbolState:
+    """
+    单只股票的全部增量指标（开盘前候选生成器所需的一组）
+
+    snapshot() 为最后一根已收盘K线上的指标；peek(...) 为加上当日未收盘K线后的指标，
+    两者返回的键相同：current / ma5 / ma10 / ma20 / vol / vol5 / box_high / high20 / dif / dea / rsi14
+    """
+
+    PARTS = {
+        "ma5": (RollingMean, 5), "ma10": (RollingMean, 10), "ma20": (RollingMean, 20),
+        "vol5": (RollingMean, 5), "close_max10": (RollingMax, 10), "high_max20": (RollingMax, 20),
+    }
+
+    def __init__(self, code: str):
+        self.code = code
+        self.last_date: Optional[str] = None
+        self.synced_on: Optional[str] = None   # 最近一次下载历史回放的日期
+        self.bars = 0
+        self.last_close = NAN
+        self.last_volume = NAN
+        self.box_high = NAN                    # 最后一根K线之前 10 日收盘最高
+        self.parts = {k: cls(n) for k, (cls, n) in self.PARTS.items()}
+        self.macd = MACD()
+        self.rsi = RSI(14)
+
+    def update_bar(self, date: str, close: float, high: float, volume: float):
+        """追加一根已收盘K线（同一日期重复追加会被忽略）"""
+        if self.last_date is not None and date <= self.last_date:
+            return
+        self.box_high = self.parts["close_max10"].value
+        for key in ("ma5", "ma10", "ma20", "close_max10"):
+            self.parts[key].update(close)
+        self.parts["vol5"].update(volume)
+        self.parts["high_max20"].update(high)
+        self.macd.update(close)
+        self.rsi.update(close)
+        self.last_date = date
+        self.last_close = close
+        self.last_volume = volume
+        self.bars += 1
+
+    def snapshot(self) -> dict:
+        dif, dea = self.macd.value
+        return {
+            "current": self.last_close,
+            "ma5": self.parts["ma5"].value,
+            "ma10": self.parts["ma10"].value,
+            "ma20": self.parts["ma20"].value,
+            "vol": self.last_volume,
+            "vol5": self.parts["vol5"].value,
+            "box_high": self.box_high,
+            "high20": self.parts["high_max20"].value,
+            "dif": dif,
+            "dea": dea,
+            "rsi14": self.rsi.value,
+        }
+
+    def peek(self, close: float, high: float, volume: float) -> dict:
+        """当日未收盘K线（现价 / 当日最高 / 当日累计量）下的指标，不改变状态"""
+        dif, dea = self.macd.peek(close)
+        return {
+            "current": close,
+            "ma5": self.parts["ma5"].peek(close),
+            "ma10": self.parts["ma10"].peek(close),
+            "ma20": self.parts["ma20"].peek(close),
+            "vol": volume,
+            "vol5": self.parts["vol5"].peek(volume),
+            "box_high": self.parts["close_max10"].value,
+            "high20": self.parts["high_max20"].peek(high),
+            "dif": dif,
+            "dea": dea,
+            "rsi14": self.rsi.peek(close),
+        }
+
+    @classmethod
+    def from_bars(cls, code: str, dates, close, high, volume) -> "SymbolState":
+        """用历史K线回放建立状态（只在首次或历史过期时做一次）"""
+        st = cls(code)
+        for d, c, h, v in zip(dates, close, high, volume):
+            st.update_bar(str(d)[:10], float(c), float(h), float(v))
+        return st
+
+    def to_dict(self) -> dict:
+        return {
+            "code": self.code, "last_date": self.last_date, "synced_on": self.synced_on, "bars": self.bars,
+            "last_close": self.last_close, "last_volume": self.last_volume, "box_high": self.box_high,
+            "parts": {k: p.to_dict() for k, p in self.parts.items()},
+            "macd": self.macd.to_dict(), "rsi": self.rsi.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "SymbolState":
+        st = cls(d["code"])
+        st.last_date, st.synced_on, st.bars = d["last_date"], d["synced_on"], d["bars"]
+        st.last_close, st.last_volume, st.box_high = d["last_close"], d["last_volume"], d["box_high"]
+        st.parts = {k: cls.PARTS[k][0].from_dict(p) for k, p in d["parts"].items()}
+        st.macd = MACD.from_dict(d["macd"])
+        st.rsi = RSI.from_dict(d["rsi"])
+        return st
+
+
+# ========== 持久化 ==========
+def load_states(path: str) -> Dict[str, SymbolState]:
+    """读取 {代码: SymbolState}，文件不存在或损坏时返回空 dict"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+        return {code: SymbolState.from_dict(d) for code, d in raw.items()}
+    except (ValueError, KeyError):
+        return {}
+
+
+def save_states(path: str, states: Dict[str, SymbolState]):
+    """原子写入（先写临时文件再替换）"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({code: st.to_dict() for code, st in states.items()}, f, ensure_ascii=False)
+    os.replace(tmp, path)
@@ -5,17 +5,16 @@
 """
 
 import pandas as pd
-import numpy as np
-import requests
-import time
-import os
 from datetime import datetime
 from typing import Optional
 
-# ========== 配置 ==========
-DATA_DIR = "stock_data"
-os.makedirs(DATA_DIR, exist_ok=True)
+import indicators
+import market_store
+import signals
+from kline_parser import parse_kline_frame
+from tencent_fetcher import get_fetcher, market_code
 
+# ========== 配置 ==========
 # 选取不同行业代表性股票
 STOCKS = {
     "消费": [
@@ -50,37 +49,14 @@ HOLD_DAYS = 5  # 持有期
 def get_stock_data(code: str) -> Optional[pd.DataFrame]:
     """获取单只股票数据"""
     # 确定市场前缀
-    if code.startswith('6') or code.startswith('688'):
-        market_code = f"sh{code}"
-    else:
-        market_code = f"sz{code}"
-    
-    try:
-        url = "https://web.ifzq.gtimg.cn/appstock/app/fqkline/get"
-        params = {"_var": "kline_dayqfq", "param": f"{market_code},day,,,250,qfq"}
-        headers = {"User-Agent": "Mozilla/5.0"}
-        
-        response = requests.get(url, params=params, headers=headers, timeout=20)
-        if response.status_code == 200 and 'qfqday' in response.text:
-            json_str = response.text.split('=', 1)[1]
-            data = eval(json_str)
-            if data.get('code') == 0:
-                klines = data['data'][market_code]['qfqday']
-                records = []
-                for k in klines:
-                    if len(k) >= 6:
-                        records.append({
-                            'date': k[0],
-                            'open': float(k[1]),
-                            'close': float(k[2]),
-                            'high': float(k[3]),
-                            'low': float(k[4]),
-                            'volume': float(k[5]) * 100
-                        })
-                df = pd.DataFrame(records[::-1])
-                return df
-    except Exception as e:
-        print(f"   获取失败: {e}")
+    mcode = market_code(code)
+    
+    text = get_fetcher().fetch_kline(mcode, count=250)
+    if text:
+        df = parse_kline_frame(text, mcode)
+        if df is not None and len(df) > 0:
+            return df
+    print(f"   获取失败: {code}")
     return None
 
 def calculate_signals(df: pd.DataFrame) -> pd.DataFrame:
@@ -88,18 +64,14 @@ def calculate_signals(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
     
     # 指标
-    df['volume_ma5'] = df['volume'].rolling(5).mean()
-    df['volume_ma20'] = df['volume'].rolling(20).mean()
-    df['price_ma5'] = df['close'].rolling(5).mean()
-    df['price_ma20'] = df['close'].rolling(20).mean()
-    df['vol_change'] = (df['volume'] - df['volume_ma5']) / df['volume_ma5']
-    df['return_d1'] = df['close'].pct_change(1)
-    df['return_future'] = df['close'].pct_change(-HOLD_DAYS)
+    indicators.add_indicators(df, ['volume_ma5', 'volume_ma20', 'price_ma5', 'price_ma20',
+                                   'vol_change', 'return_d1', 'return_d10'])
+    indicators.add_indicators(df, {'return_future': f'return_f{HOLD_DAYS}'})
     
     # 点灯：缩量企稳
     df['signal_light'] = (
         (df['vol_change'] < -0.2) & 
-        (df['close'].pct_change(10).abs() < 0.15)
+        (df['return_d10'].abs() < 0.15)
     )
     
     # 举烛：放量上涨
@@ -111,76 +83,24 @@ def backtest_two_stage(df: pd.DataFrame) -> dict:
     """二阶段策略回测"""
     df = calculate_signals(df)
     
-    # 确保日期列是datetime
-    df['date'] = pd.to_datetime(df['date'])
-    
-    # 找点灯后N日内举烛
-    df['light_date'] = None
-    for i in range(len(df)):
-        if df.iloc[i]['signal_light']:
-            df.iloc[i, df.columns.get_loc('light_date')] = df.iloc[i]['date']
-    
-    df['light_date'] = pd.to_datetime(df['light_date'], errors='coerce')
-    df['days_from_light'] = None
-    
-    for i in range(len(df)):
-        if df.iloc[i]['signal_candle'] and pd.notna(df.iloc[i]['light_date']):
-            light_date = pd.to_datetime(df.iloc[i]['light_date'])
-            days = (df.iloc[i]['date'] - light_date).days
-            if 1 <= days <= OBS_DAYS:
-                df.iloc[i, df.columns.get_loc('days_from_light')] = days
-    
-    df['signal_combined'] = df['days_from_light'].notna()
+    # 找点灯后N日内举烛（自然日间隔，最近一次点灯前向延续）
+    combined, _ = signals.two_stage(df['signal_light'], df['signal_candle'], OBS_DAYS,
+                                    dates=pd.to_datetime(df['date']))
     
     # 统计
-    combined = df[df['signal_combined']]
-    if len(combined) == 0:
-        return {'trades': 0, 'win_rate': 0, 'avg_return': 0}
-    
-    profits = []
-    for idx in combined.index:
-        ret = df.iloc[idx]['return_future']
-        if not np.isnan(ret):
-            profits.append(ret)
-    
-    if len(profits) == 0:
+    stats = signals.trade_stats(combined, df['return_future'])
+    if stats['trades'] == 0:
         return {'trades': 0, 'win_rate': 0, 'avg_return': 0}
-    
-    wins = sum(1 for p in profits if p > 0)
-    return {
-        'trades': len(profits),
-        'wins': wins,
-        'losses': len(profits) - wins,
-        'win_rate': wins / len(profits),
-        'avg_return': np.mean(profits),
-        'max_win': max(profits),
-        'max_loss': min(profits)
-    }
+    return stats
 
 def backtest_simple(df: pd.DataFrame, signal_col: str) -> dict:
     """简单策略回测（放量买入）"""
     df = calculate_signals(df)
     
-    signals = df[df[signal_col]]
-    if len(signals) == 0:
+    stats = signals.trade_stats(df[signal_col], df['return_future'])
+    if stats['trades'] == 0:
         return {'trades': 0}
-    
-    profits = []
-    for idx in signals.index:
-        ret = df.iloc[idx]['return_future']
-        if not np.isnan(ret):
-            profits.append(ret)
-    
-    if len(profits) == 0:
-        return {'trades': 0}
-    
-    wins = sum(1 for p in profits if p > 0)
-    return {
-        'trades': len(profits),
-        'wins': wins,
-        'win_rate': wins / len(profits),
-        'avg_return': np.mean(profits)
-    }
+    return {k: stats[k] for k in ('trades', 'wins', 'win_rate', 'avg_return')}
 
 def main():
     """主函数"""
@@ -192,6 +112,15 @@ def main():
     
     all_results = {}
     
+    # 本地没有的股票一次并发下载（共享连接池 + 限速）
+    all_codes = [code for stocks in STOCKS.values() for code, _ in stocks]
+    missing = [code for code in all_codes if market_store.last_date(code) is None]
+    if missing:
+        print(f"\n🌐 并发下载 {len(missing)} 只...")
+        for code, df in zip(missing, get_fetcher().map(get_stock_data, missing)):
+            if df is not None:
+                market_store.write_bars(code, df)
+    
     # 遍历所有类别
     for category, stocks in STOCKS.items():
         print(f"\n{'='*75}")
@@ -204,20 +133,11 @@ def main():
             print(f"\n📊 {code} {name}...", end=" ")
             
             # 获取数据
-            csv_file = f"{DATA_DIR}/{code}.csv"
-            if os.path.exists(csv_file):
-                df = pd.read_csv(csv_file)
-                df['date'] = pd.to_datetime(df['date'])
-                df = df.sort_values('date').reset_index(drop=True)
-                print(f"缓存")
-            else:
-                df = get_stock_data(code)
-                if df is not None:
-                    df.to_csv(csv_file, index=False)
-                    print(f"下载 ({len(df)}行)")
-                else:
-                    print(f"❌ 失败")
-                    continue
+            df = market_store.load_bars(code)
+            if df is None:
+                print(f"❌ 失败")
+                continue
+            print(f"{'下载' if code in missing else '缓存'} ({len(df)}行)")
             
             # 回测
             two_stage = backtest_two_stage(df)
@@ -249,38 +169,19 @@ def main():
     print("📊 多行业回测汇总")
     print("=" * 75)
     
-    # 按行业汇总
-    summary_data = []
-    
-    for category, results in all_results.items():
-        if not results:
-            continue
-        
-        total_two = sum(r['two_stage']['trades'] for r in results)
-        total_simple = sum(r['simple']['trades'] for r in results)
-        
-        if total_two > 0:
-            ts_wins = sum(r['two_stage']['wins'] for r in results)
-            ts_wr = ts_wins / total_two
-        else:
-            ts_wr = 0
-        
-        if total_simple > 0:
-            s_wins = sum(r['simple']['wins'] for r in results)
-            s_wr = s_wins / total_simple
-        else:
-            s_wr = 0
-        
-        summary_data.append({
-            'category': category,
-            'two_stage_wr': ts_wr,
-            'two_stage_trades': total_two,
-            'simple_wr': s_wr,
-            'simple_trades': total_simple
-        })
-    
-    # 按二阶段胜率排序
-    summary_data.sort(key=lambda x: x['two_stage_wr'], reverse=True)
+    # 按行业汇总（逐股结果展开成一张表，groupby 一次算完各行业胜率）
+    flat = pd.DataFrame([
+        {'category': category,
+         'two_stage_trades': r['two_stage']['trades'], 'two_stage_wins': r['two_stage'].get('wins', 0),
+         'simple_trades': r['simple']['trades'], 'simple_wins': r['simple'].get('wins', 0)}
+        for category, results in all_results.items() for r in results
+    ], columns=['category', 'two_stage_trades', 'two_stage_wins', 'simple_trades', 'simple_wins'])
+    totals = flat.groupby('category', sort=False).sum()
+    for kind in ('two_stage', 'simple'):
+        trades = totals[f'{kind}_trades']
+        totals[f'{kind}_wr'] = (totals[f'{kind}_wins'] / trades.where(trades > 0)).fillna(0.0)
+    totals = totals.sort_values('two_stage_wr', ascending=False, kind='stable')
+    summary_data = totals.reset_index().to_dict('records')
     
     print(f"\n{'行业':<8} | {'二阶段策略':<20} | {'放量买入':<20}")
     print("-" * 60)
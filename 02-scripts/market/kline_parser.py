@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+腾讯 fqkline 响应解析（替代各脚本里的 eval + 逐行 dict）
+
+- 去掉 JSONP 前缀（kline_dayqfq= 等），用 orjson（可用时）解码，不执行任何代码
+- 直接构造 NumPy 列（date / open / close / high / low / volume），不经过逐行 dict
+- 一个响应里的所有股票一次解析；多个响应可批量解析
+- 按响应内实际的代码键取数据，不再写死 sh600519
+
+用法:
+    from kline_parser import parse_kline_frame
+    df = parse_kline_frame(text, "sh600519")
+
+吞吐基准:
+    python3 kline_parser.py --bench
+"""
+
+import argparse
+import itertools
+import json
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson 可选
+    _loads = json.loads
+
+FIELDS = ("open", "close", "high", "low", "volume")
+VOLUME_UNIT = 100  # 腾讯成交量单位为手，转为股
+
+
+def strip_jsonp(text: str) -> str:
+    """'kline_dayqfq={...};' -> '{...}'（无前缀时原样返回）"""
+    text = text.strip()
+    if not text.startswith("{"):
+        text = text.split("=", 1)[1]
+    return text.rstrip("; \n")
+
+
+def decode(text: str) -> dict:
+    """安全解码 JSONP 响应"""
+    return _loads(strip_jsonp(text))
+
+
+def _klines_of(item: dict) -> list:
+    # 有复权时键为 qfqday / hfqday，无复权数据的标的（如指数）为 day
+    for key in ("qfqday", "hfqday", "day"):
+        if item.get(key):
+            return item[key]
+    return []
+
+
+def klines_to_columns(klines: list) -> Dict[str, np.ndarray]:
+    """K线行 [日期, 开, 收, 高, 低, 量(手), ...] -> 列数组，按日期升序"""
+    rows = [k for k in klines if len(k) >= 6]
+    n = len(rows)
+    dates = np.array([k[0] for k in rows], dtype="datetime64[D]")
+    flat = np.fromiter(itertools.chain.from_iterable(k[1:6] for k in rows), dtype=np.float64, count=5 * n)
+    values = flat.reshape(n, 5)
+
+    order = None
+    if n > 1 and not np.all(dates[1:] > dates[:-1]):
+        order = np.argsort(dates, kind="stable")
+
+    out = {"date": dates if order is None else dates[order]}
+    for i, name in enumerate(FIELDS):
+        col = values[:, i] if order is None else values[order, i]
+        out[name] = col * VOLUME_UNIT if name == "volume" else np.ascontiguousarray(col)
+    return out
+
+
+def parse_klines(text: str, mcode: Optional[str] = None) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    解析一个响应中的全部股票
+
+    Args:
+        text: 原始响应文本
+        mcode: 只取指定代码（如 'sh600519'），None 表示全部
+
+    Returns:
+        {市场代码: {'date': ..., 'open': ..., ...}}；code != 0 时返回空 dict
+    """
+    data = decode(text)
+    if data.get("code") != 0 or not isinstance(data.get("data"), dict):
+        return {}
+    items = data["data"]
+    keys = [mcode] if mcode is not None else list(items)
+    out = {}
+    for key in keys:
+        item = items.get(key)
+        if isinstance(item, dict):
+            out[key] = klines_to_columns(_klines_of(item))
+    return out
+
+
+def parse_many(texts: Dict[str, Optional[str]]) -> Dict[str, Dict[str, np.ndarray]]:
+    """批量解析 {市场代码: 响应文本}（如 KlineFetcher.fetch_klines 的结果），失败的跳过"""
+    out = {}
+    for mcode, text in texts.items():
+        if not text:
+            continue
+        try:
+            out.update(parse_klines(text, mcode))
+        except (ValueError, KeyError, IndexError):
+            continue
+    return out
+
+
+def to_frame(columns: Dict[str, np.ndarray], fields: Iterable[str] = FIELDS) -> pd.DataFrame:
+    """列数组 -> DataFrame（date 为 datetime64）"""
+    frame = {"date": columns["date"]}
+    for name in fields:
+        frame[name] = columns[name]
+    return pd.DataFrame(frame)
+
+
+def parse_kline_frame(text: str, mcode: str, fields: Iterable[str] = FIELDS) -> Optional[pd.DataFrame]:
+    """单只股票响应 -> DataFrame（升序），解析失败返回 None"""
+    try:
+        parsed = parse_klines(text, mcode)
+    except (ValueError, KeyError, IndexError):
+        return None
+    if mcode not in parsed:
+        return None
+    return to_frame(parsed[mcode], fields)
+
+
+# ========== 基准 ==========
+def _legacy_parse(text: str, mcode: str) -> pd.DataFrame:
+    """旧实现（eval + 逐行 dict），仅用于基准对比"""
+    data = eval(text.split('=', 1)[1])
+    records = []
+    for k in data['data'][mcode]['qfqday']:
+        if len(k) >= 6:
+            records.append({
+                'date': k[0],
+                'open': float(k[1]),
+                'close': float(k[2]),
+                'high': float(k[3]),
+                'low': float(k[4]),
+                'volume': float(k[5]) * 100
+            })
+    return pd.DataFrame(records[::-1])
+
+
+def run_bench(symbols: int, bars: int):
+    from tencent_stub_server import synth_klines
+
+    texts = {}
+    for i in range(symbols):
+        mcode = f"sh{600000 + i}"
+        payload = {"code": 0, "msg": "", "data": {mcode: {"qfqday": synth_klines(mcode, bars)}}}
+        texts[mcode] = "kline_dayqfq=" + json.dumps(payload, separators=(",", ":"))
+    total = sum(bars for _ in texts)
+
+    t0 = time.perf_counter()
+    for mcode, text in texts.items():
+        _legacy_parse(text, mcode)
+    legacy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    parse_many(texts)
+    columns = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for mcode, text in texts.items():
+        parse_kline_frame(text, mcode)
+    frames = time.perf_counter() - t0
+
+    print("=" * 60)
+    print(f"📊 K线解析吞吐: {symbols} 只 × {bars} 根 = {total} 根 (JSON: {_loads.__module__})")
+    print("=" * 60)
+    print(f"旧实现 eval + dict      : {legacy:.3f}s  {total / legacy:>12,.0f} 根/秒")
+    print(f"parse_many -> NumPy 列 : {columns:.3f}s  {total / columns:>12,.0f} 根/秒  ({legacy / columns:.1f}x)")
+    print(f"parse_kline_frame      : {frames:.3f}s  {total / frames:>12,.0f} 根/秒  ({legacy / frames:.1f}x)")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="腾讯 fqkline 解析器")
+    ap.add_argument("--bench", action="store_true", help="解析吞吐基准")
+    ap.add_argument("--symbols", type=int, default=300)
+    ap.add_argument("--bars", type=int, default=500)
+    args = ap.parse_args()
+
+    if args.bench:
+        run_bench(args.symbols, args.bars)
+    else:
+        ap.print_help()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+列式行情存储（替代 stock_data/<code>.csv 逐只缓存）
+
+目录结构（按股票代码分区，每列一个可 mmap 的 .npy 文件）:
+    stock_data/store/<code>/date.npy     datetime64[D]，升序
+    stock_data/store/<code>/close.npy    float64
+    ...
+    stock_data/store/<code>/meta.json    行数 / 起止日期 / 列（最后写入，作为提交标记）
+
+支持：
+- 只追加新K线（append_bars）
+- 按列投影读取（load_bars / load_columns 的 columns 参数）
+- 一次调用加载多只股票面板（load_panel，日期 × 股票 二维数组）
+- 有 panel_server 打包的共享面板时，读取直接取其 mmap 切片（不再逐个打开分区文件）
+
+用法:
+    python3 market_store.py migrate        # 把旧的 stock_data/*.csv 导入存储
+    python3 market_store.py ls             # 列出存储中的股票
+"""
+
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# ========== 配置 ==========
+# 以模块所在目录为基准，不随调用方的工作目录变化（scripts/ 下的脚本直接导入即可）
+LEGACY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stock_data")
+STORE_DIR = os.path.join(LEGACY_DIR, "store")
+
+# 存储支持的数值列（date 单独处理）
+COLUMNS = ("open", "close", "high", "low", "volume")
+
+# 读分区时列文件与 meta.json 不一致（并发整段重写）的重读次数
+READ_RETRIES = 3
+
+# 优先从 panel_server 的共享面板读取（MARKET_PANEL=0 关闭）
+USE_PANEL = os.environ.get("MARKET_PANEL", "1") != "0"
+
+
+@dataclass
+class Panel:
+    """多股票面板：dates × codes，缺失值为 NaN"""
+    dates: np.ndarray
+    codes: List[str]
+    data: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.data[column]
+
+    @property
+    def shape(self):
+        return (len(self.dates), len(self.codes))
+
+    def frame(self, column: str) -> pd.DataFrame:
+        """单列转 DataFrame（行=日期，列=代码），便于调试"""
+        return pd.DataFrame(self.data[column], index=pd.to_datetime(self.dates), columns=self.codes)
+
+
+# ========== 内部工具 ==========
+def _code_dir(code: str) -> str:
+    return os.path.join(STORE_DIR, code)
+
+
+def _meta_path(code: str) -> str:
+    return os.path.join(_code_dir(code), "meta.json")
+
+
+def _to_day(values) -> np.ndarray:
+    """任意日期序列 -> datetime64[D]"""
+    return pd.to_datetime(pd.Series(values)).to_numpy().astype("datetime64[D]")
+
+
+def _save_array(path: str, arr: np.ndarray):
+    """先写临时文件再原子替换，避免读端看到半截文件"""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """统一为 date(datetime64[D]) + 数值列，按日期升序去重（保留最后一条）"""
+    out = pd.DataFrame({"date": _to_day(df["date"])})
+    for col in COLUMNS:
+        if col in df.columns:
+            out[col] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+    out = out.drop_duplicates("date", keep="last").sort_values("date")
+    return out.reset_index(drop=True)
+
+
+def read_meta(code: str) -> Optional[dict]:
+    """读取分区元数据，不存在返回 None"""
+    path = _meta_path(code)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def has_code(code: str) -> bool:
+    return read_meta(code) is not None
+
+
+def last_date(code: str) -> Optional[pd.Timestamp]:
+    """最后一根K线日期（只读 meta.json，不解析数据；旧CSV首次访问时自动导入）"""
+    meta = read_meta(code)
+    if meta is None and _import_legacy_csv(code):
+        meta = read_meta(code)
+    if not meta or not meta.get("rows"):
+        return None
+    return pd.Timestamp(meta["last_date"])
+
+
+# ========== 写入 ==========
+def write_bars(code: str, df: pd.DataFrame) -> int:
+    """
+    全量写入（覆盖）一只股票的K线
+
+    Args:
+        code: 股票代码，如 '600519'
+        df: 至少包含 date 列，数值列取 COLUMNS 中存在的部分
+
+    Returns:
+        int: 写入行数
+    """
+    df = _normalize(df)
+    cols = [c for c in COLUMNS if c in df.columns]
+
+    os.makedirs(_code_dir(code), exist_ok=True)
+    _save_array(os.path.join(_code_dir(code), "date.npy"), df["date"].to_numpy().astype("datetime64[D]"))
+    for col in cols:
+        _save_array(os.path.join(_code_dir(code), f"{col}.npy"), df[col].to_numpy(dtype=np.float64))
+
+    meta = {
+        "code": code,
+        "rows": int(len(df)),
+        "columns": cols,
+        "first_date": str(df["date"].iloc[0].date()) if len(df) else None,
+        "last_date": str(df["date"].iloc[-1].date()) if len(df) else None,
+    }
+    tmp = _meta_path(code) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp, _meta_path(code))
+    return len(df)
+
+
+def append_bars(code: str, df: pd.DataFrame) -> int:
+    """
+    只追加比已存最后日期更新的K线
+
+    df 必须包含已存的全部列（缺列会让新K线的这些列变成 NaN，直接报错）；
+    带来已存之外的新列时扩充分区，旧K线的该列为 NaN
+
+    Returns:
+        int: 新增行数（0 表示无新数据）
+
+    Raises:
+        ValueError: df 缺少已存的列
+    """
+    meta = read_meta(code)
+    if meta is None or not meta.get("rows"):
+        return write_bars(code, df)
+
+    new = _normalize(df)
+    missing = [c for c in meta["columns"] if c not in new.columns]
+    if missing:
+        raise ValueError(f"{code}: 追加的K线缺少已存列 {missing}")
+    new = new[new["date"] > np.datetime64(meta["last_date"], "D")]
+    if new.empty:
+        return 0
+
+    old = load_columns(code, meta["columns"], mmap=False)
+    rows = len(old["date"])
+    merged = {"date": np.concatenate([old["date"], new["date"].to_numpy().astype("datetime64[D]")])}
+    for col in COLUMNS:
+        if col in new.columns:
+            head = old[col] if col in old else np.full(rows, np.nan)
+            merged[col] = np.concatenate([head, new[col].to_numpy(dtype=np.float64)])
+    write_bars(code, pd.DataFrame(merged))
+    return len(new)
+
+
+# ========== 读取 ==========
+def load_columns(code: str, columns: Optional[Iterable[str]] = None, mmap: bool = True) -> Optional[Dict[str, np.ndarray]]:
+    """
+    按列读取原始数组（默认 mmap，零拷贝）
+
+    Returns:
+        dict: {'date': datetime64[D] 数组, 列名: float64 数组}；不存在返回 None
+    """
+    if USE_PANEL:
+        import panel_server
+        view = panel_server.attach()
+        arrays = view.slices(code, columns, copy=not mmap) if view is not None else None
+        if arrays is not None:
+            return arrays
+    return _read_columns(code, columns, mmap)
+
+
+def _read_columns(code: str, columns: Optional[Iterable[str]] = None, mmap: bool = True) -> Optional[Dict[str, np.ndarray]]:
+    """
+    直接读分区文件（load_columns 的共享面板未命中时）
+
+    写入时各列文件先逐个替换、meta.json 最后提交，读端可能读到比 meta 更新的列文件：
+    各列统一截到 meta["rows"]（追加只在尾部加行，截断后就是 meta 对应的版本）；
+    列比 meta 短说明期间又被整段重写，重读 meta 再试
+    """
+    for _ in range(READ_RETRIES):
+        meta = read_meta(code)
+        if meta is None:
+            if not _import_legacy_csv(code):
+                return None
+            meta = read_meta(code)
+
+        mode = "r" if mmap else None
+        rows = meta["rows"]
+        cols = meta["columns"] if columns is None else [c for c in columns if c in meta["columns"]]
+        out = {"date": np.load(os.path.join(_code_dir(code), "date.npy"), mmap_mode=mode)}
+        for col in cols:
+            out[col] = np.load(os.path.join(_code_dir(code), f"{col}.npy"), mmap_mode=mode)
+        if all(len(v) >= rows for v in out.values()):
+            return {k: v[:rows] for k, v in out.items()}
+    raise RuntimeError(f"{code}: 分区文件与 meta.json 行数不一致（读取期间持续被改写）")
+
+
+def load_bars(code: str, columns: Optional[Iterable[str]] = None) -> Optional[pd.DataFrame]:
+    """
+    读取单只股票K线为 DataFrame（date 升序）
+
+    Args:
+        code: 股票代码
+        columns: 需要的数值列，None 表示全部
+
+    Returns:
+        DataFrame 或 None（既无存储也无旧CSV）
+    """
+    arrays = load_columns(code, columns, mmap=False)
+    if arrays is None:
+        return None
+    arrays["date"] = pd.to_datetime(arrays["date"])
+    return pd.DataFrame(arrays)
+
+
+def load_panel(codes: Iterable[str], columns: Iterable[str] = ("close",),
+               start=None, end=None) -> Panel:
+    """
+    一次加载多只股票，按日期并集对齐为二维面板
+
+    Args:
+        codes: 股票代码列表（不存在的代码会被跳过）
+        columns: 需要的列
+        start / end: 可选日期范围（含端点）
+
+    Returns:
+        Panel: dates × codes，每列一个 float64 二维数组
+    """
+    columns = list(columns)
+    if USE_PANEL:
+        import panel_server
+        view = panel_server.attach()
+        panel = view.panel(codes, columns, start, end) if view is not None else None
+        if panel is not None:
+            return panel
+
+    lo = np.datetime64(pd.Timestamp(start).date(), "D") if start is not None else None
+    hi = np.datetime64(pd.Timestamp(end).date(), "D") if end is not None else None
+
+    loaded = []
+    for code in codes:
+        arrays = load_columns(code, columns)
+        if arrays is None:
+            continue
+        dates = arrays["date"]
+        i0 = np.searchsorted(dates, lo, "left") if lo is not None else 0
+        i1 = np.searchsorted(dates, hi, "right") if hi is not None else len(dates)
+        loaded.append((code, i0, i1, arrays))
+
+    if not loaded:
+        return Panel(dates=np.array([], dtype="datetime64[D]"), codes=[],
+                     data={c: np.empty((0, 0)) for c in columns})
+
+    all_dates = np.unique(np.concatenate([a["date"][i0:i1] for _, i0, i1, a in loaded]))
+    data = {c: np.full((len(all_dates), len(loaded)), np.nan) for c in columns}
+    for j, (_, i0, i1, arrays) in enumerate(loaded):
+        rows = np.searchsorted(all_dates, arrays["date"][i0:i1])
+        for c in columns:
+            if c in arrays:
+                data[c][rows, j] = arrays[c][i0:i1]
+
+    return Panel(dates=all_dates, codes=[code for code, _, _, _ in loaded], data=data)
+
+
+def list_codes() -> List[str]:
+    """存储中已有的股票代码"""
+    if not os.path.isdir(STORE_DIR):
+        return []
+    return sorted(c for c in os.listdir(STORE_DIR) if os.path.exists(_meta_path(c)))
+
+
+# ========== 旧CSV迁移 ==========
+def _import_legacy_csv(code: str, data_dir: str = LEGACY_DIR) -> bool:
+    """首次访问时把旧的 <code>.csv 导入存储"""
+    path = os.path.join(data_dir, f"{code}.csv")
+    if not os.path.exists(path):
+        return False
+    df = pd.read_csv(path)
+    if "date" not in df.columns or df.empty:
+        return False
+    write_bars(code, df)
+    return True
+
+
+def migrate_csv_dir(data_dir: str = LEGACY_DIR) -> int:
+    """批量导入目录下所有 <code>.csv，返回导入数量"""
+    count = 0
+    if not os.path.isdir(data_dir):
+        return 0
+    for f in sorted(os.listdir(data_dir)):
+        if not f.endswith(".csv"):
+            continue
+        code = f[:-4]
+        if _import_legacy_csv(code, data_dir):
+            count += 1
+            print(f"  ✅ {code}")
+    return count
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "ls"
+    if cmd == "migrate":
+        src = sys.argv[2] if len(sys.argv) > 2 else LEGACY_DIR
+        print(f"📦 导入 {src}/*.csv -> {STORE_DIR}/")
+        print(f"完成: {migrate_csv_dir(src)} 只")
+    else:
+        print(f"📁 {STORE_DIR}/ 存储的股票数据:")
+        print("-" * 40)
+        for code in list_codes():
+            meta = read_meta(code)
+            print(f"  {code}: {meta['rows']} 行, 最新: {meta['last_date']}")
@@ -4,42 +4,23 @@
 """
 
 import pandas as pd
-import numpy as np
-import os
 
-DATA_DIR = "stock_data"
+import indicators
+import market_store
+import strategy_dsl
+
 STOCKS = {"600519": "贵州茅台", "600036": "招商银行", "601398": "工商银行", "600887": "伊利股份", "000001": "上证指数"}
 
 def load_and_prepare(code):
-    """加载并准备数据"""
-    path = f"{DATA_DIR}/{code}.csv"
-    if not os.path.exists(path): return None
-    df = pd.read_csv(path)
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values('date').reset_index(drop=True)
-    
-    df['v_ma5'] = df['volume'].rolling(5).mean()
-    df['v_ma10'] = df['volume'].rolling(10).mean()
-    df['p_ma5'] = df['close'].rolling(5).mean()
-    df['p_ma20'] = df['close'].rolling(20).mean()
-    
-    df['vc'] = (df['volume'] - df['v_ma5']) / df['v_ma5']
-    df['ret_d1'] = df['close'].pct_change(1)
-    df['ret_f5'] = df['close'].pct_change(-5)
-    
-    df['up'] = df['ret_d1'] > 0
-    df['dup'] = df['ret_d1'] > 0.02
-    df['down'] = df['ret_d1'] < 0
-    df['ddn'] = df['ret_d1'] < -0.02
-    df['a_ma5'] = df['close'] > df['p_ma5']
-    df['a_ma20'] = df['close'] > df['p_ma20']
-    df['ma5_20'] = df['p_ma5'] > df['p_ma20']
+    """加载并准备数据（策略用到的指标由 strategy_dsl 统一计算）"""
+    df = market_store.load_bars(code, columns=('close', 'volume'))
+    if df is None: return None
     
+    indicators.add_indicators(df, {'ret_f5': 'return_f5'}, key=code)
     return df
 
-def backtest(df, sig_func):
+def backtest(df, sig):
     """回测"""
-    sig = sig_func(df)
     profit = sig.shift(1) * df['ret_f5']
     sig_c = sig.shift(1).dropna()
     p = profit.dropna()
@@ -49,24 +30,7 @@ def backtest(df, sig_func):
     wins = (p.loc[idx[sig_c.loc[idx] > 0]] > 0).sum()
     return {'signals': sc, 'wins': wins, 'losses': sc-wins, 'wr': wins/sc}
 
-# 策略定义
-STRATEGIES = [
-    ("1.放量突破", lambda d: (d['vc'] > 0.3) & (d['close'] > d['p_ma5'])),
-    ("2.放量+大阳线", lambda d: (d['vc'] > 0.3) & (d['dup'])),
-    ("3.温和放量+上涨", lambda d: (d['vc'] > 0.1) & (d['vc'] < 0.5) & (d['up'])),
-    ("4.缩量企稳", lambda d: (d['vc'] < -0.3) & (d['close'] > d['p_ma20'])),
-    ("5.地量+MA20支撑", lambda d: (d['vc'] < -0.5) & (d['close'] > d['p_ma20']) & (d['close'] < d['p_ma5'])),
-    ("6.量价齐升", lambda d: (d['vc'] > 0.2) & (d['up']) & (d['ma5_20'])),
-    ("7.放量杀跌抄底", lambda d: (d['vc'] > 0.5) & (d['down'])),
-    ("8.高位放量逃顶", lambda d: (d['vc'] > 0.5) & (d['close'] > d['p_ma20']) & (d['down'])),
-    ("9.MA5金叉MA20+放量", lambda d: (d['ma5_20']) & (d.shift(1)['ma5_20']==False) & (d['vc'] > 0.2)),
-    ("10.放量十字星", lambda d: (d['vc'] > 0.4) & (np.abs(d['ret_d1']) < 0.005)),
-    ("11.强势股缩量", lambda d: (d['a_ma20']) & (d['vc'] < -0.2)),
-    ("12.放量过前高", lambda d: (d['vc'] > 0.3) & (d['close'] > d['close'].shift(20))),
-    ("13.底部放量反弹", lambda d: (d['vc'] > 0.5) & (d['close'] < d['p_ma20']) & (d['up'])),
-    ("14.价跌量缩", lambda d: (d['down']) & (d['vc'] < -0.2)),
-    ("15.量价背离(看跌)", lambda d: (d['up']) & (d['vc'] < -0.2)),
-]
+# 策略定义见 strategy_dsl.STRATEGIES
 
 print("=" * 75)
 print("🔥 多股票策略回测 (5只股票)")
@@ -80,8 +44,10 @@ for code, name in STOCKS.items():
     if df is None: continue
     print(f"{len(df)}行")
     
-    for sname, sfunc in STRATEGIES:
-        r = backtest(df, sfunc)
+    masks = strategy_dsl.evaluate(strategy_dsl.STRATEGIES, df)
+    for rule in strategy_dsl.STRATEGIES:
+        sname = rule.name
+        r = backtest(df, pd.Series(masks[sname], index=df.index))
         if r:
             if sname not in all_results:
                 all_results[sname] = {'s': 0, 'w': 0}
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+共享行情面板：全市场 OHLCV 打包成一组 mmap 文件，各脚本零拷贝挂载
+
+market_store 按股票分区存储，每只股票每列一个 .npy；全市场加载一次要打开上万个文件。
+本模块把整个存储打包成“每列一个大数组 + 每只股票的偏移”：
+
+    stock_data/panel/current.json           当前代次（原子替换）
+    stock_data/panel/gen-000012/manifest.json
+    stock_data/panel/gen-000012/offsets.npy  (N+1,) int64，第 i 只股票的行区间
+    stock_data/panel/gen-000012/mtime.npy    (N,) 打包时各股 meta.json 的 mtime_ns
+    stock_data/panel/gen-000012/has.npy      (N, 列数) 各股是否有该列
+    stock_data/panel/gen-000012/date.npy / open.npy / close.npy / ...
+
+market_store.load_columns 发现 current.json 时自动从这里取切片（mmap 只读视图，页缓存里各进程共享），
+该股 meta.json 的 mtime 与打包时不同（已有新写入）则回退到分区文件，所以读到的永远不会比存储旧。
+设置环境变量 MARKET_PANEL=0 可关闭。
+
+常驻进程（serve）定期检查存储变化并重建新代次；旧代次保留 KEEP_GENERATIONS 个，已挂载的读端不受影响。
+
+用法:
+    python3 panel_server.py build          # 打包一次
+    python3 panel_server.py serve          # 常驻，存储有变化时重建
+    python3 panel_server.py info
+    python3 panel_server.py bench --symbols 2000 --bars 500
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import market_store
+
+# ========== 配置 ==========
+KEEP_GENERATIONS = 2    # 保留的代次数（含当前）
+SERVE_INTERVAL = 5.0    # serve 检查存储变化的间隔（秒）
+
+
+def panel_dir() -> str:
+    """与 market_store.STORE_DIR 同级的 panel 目录（跟随脚本对 STORE_DIR 的覆盖）"""
+    return os.path.join(os.path.dirname(os.path.abspath(market_store.STORE_DIR)), "panel")
+
+
+def _meta_mtime(code: str) -> int:
+    try:
+        return os.stat(market_store._meta_path(code)).st_mtime_ns
+    except OSError:
+        return -1
+
+
+# ========== 读端 ==========
+class PanelView:
+    """一个代次的只读视图"""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.path = path
+        self.codes: List[str] = self.manifest["codes"]
+        self.columns: List[str] = self.manifest["columns"]
+        self.index = {c: i for i, c in enumerate(self.codes)}
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.mtime = np.load(os.path.join(path, "mtime.npy"))
+        self.has = np.load(os.path.join(path, "has.npy"))
+        self.arrays = {c: np.load(os.path.join(path, f"{c}.npy"), mmap_mode="r")
+                       for c in ["date"] + self.columns}
+
+    @property
+    def generation(self) -> int:
+        return self.manifest["generation"]
+
+    def slices(self, code: str, columns: Optional[Iterable[str]] = None, copy: bool = False
+               ) -> Optional[Dict[str, np.ndarray]]:
+        """
+        同 market_store.load_columns 的返回格式；不在包内或已过期返回 None
+
+        Args:
+            copy: False 返回 mmap 只读视图，True 返回独立副本
+        """
+        i = self.index.get(code)
+        if i is None or _meta_mtime(code) != self.mtime[i]:
+            return None
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        wanted = self.columns if columns is None else columns
+        cols = [c for c in wanted if c in self.columns and self.has[i, self.columns.index(c)]]
+        out = {}
+        for c in ["date"] + cols:
+            v = self.arrays[c][lo:hi]
+            out[c] = np.array(v) if copy else v
+        return out
+
+    def panel(self, codes: Iterable[str], columns: Iterable[str] = ("close",), start=None, end=None
+              ) -> Optional[market_store.Panel]:
+        """
+        同 market_store.load_panel，但整块向量化组装（不逐只循环）
+
+        Returns:
+            Panel；有股票不在包内或已过期时返回 None（由调用方回退逐只读取）
+        """
+        columns = list(columns)
+        sel = []
+        for code in codes:
+            i = self.index.get(code)
+            mtime = _meta_mtime(code)
+            if i is None:
+                if mtime == -1 and not os.path.exists(os.path.join(market_store.LEGACY_DIR, f"{code}.csv")):
+                    continue  # 存储里也没有：与 load_panel 一样跳过
+                return None
+            if mtime != self.mtime[i]:
+                return None
+            sel.append(i)
+        if not sel:
+            return None
+
+        sel = np.asarray(sel)
+        lo, lengths = self.offsets[sel], self.offsets[sel + 1] - self.offsets[sel]
+        starts = np.cumsum(lengths) - lengths
+        src = np.arange(lengths.sum()) + np.repeat(lo - starts, lengths)
+        col = np.repeat(np.arange(len(sel)), lengths)
+        dates = self.arrays["date"][src]
+        keep = np.ones(len(src), dtype=bool)
+        if start is not None:
+            keep &= dates >= np.datetime64(pd.Timestamp(start).date(), "D")
+        if end is not None:
+            keep &= dates <= np.datetime64(pd.Timestamp(end).date(), "D")
+        src, col, dates = src[keep], col[keep], dates[keep]
+
+        all_dates = np.unique(dates)
+        rows = np.searchsorted(all_dates, dates)
+        data = {}
+        for c in columns:
+            data[c] = np.full((len(all_dates), len(sel)), np.nan)
+            if c in self.arrays:
+                data[c][rows, col] = self.arrays[c][src]
+        return market_store.Panel(dates=all_dates, codes=[self.codes[i] for i in sel], data=data)
+
+
+_VIEW: Optional[PanelView] = None
+_VIEW_KEY = None
+
+
+def attach() -> Optional[PanelView]:
+    """
+    挂载当前代次（进程内缓存，current.json 变化时自动切换）
+
+    Returns:
+        PanelView；未打包或打包的不是当前 STORE_DIR 时返回 None
+    """
+    global _VIEW, _VIEW_KEY
+    pointer = os.path.join(panel_dir(), "current.json")
+    try:
+        st = os.stat(pointer)
+    except OSError:
+        _VIEW, _VIEW_KEY = None, None
+        return None
+    key = (pointer, st.st_mtime_ns, st.st_ino)
+    if key != _VIEW_KEY:
+        try:
+            with open(pointer, encoding="utf-8") as f:
+                current = json.load(f)
+            view = PanelView(os.path.join(panel_dir(), current["dir"]))
+        except (OSError, ValueError, KeyError):
+            view = None
+        if view is not None and view.manifest.get("store") != os.path.abspath(market_store.STORE_DIR):
+            view = None
+        _VIEW, _VIEW_KEY = view, key
+    return _VIEW
+
+
+# ========== 打包 ==========
+def _generations(root: str) -> List[str]:
+    if not os.path.isdir(root):
+        return []
+    return sorted(d for d in os.listdir(root) if d.startswith("gen-"))
+
+
+def fingerprint(codes: Optional[List[str]] = None) -> Dict[str, int]:
+    """存储当前状态：{代码: meta.json mtime_ns}"""
+    codes = market_store.list_codes() if codes is None else codes
+    return {c: _meta_mtime(c) for c in codes}
+
+
+def build(codes: Optional[Iterable[str]] = None) -> PanelView:
+    """
+    打包存储为新代次并切换 current.json
+
+    未变化的股票（meta mtime 与上一代次相同）直接从上一代次拷贝，不重新打开分区文件。
+    """
+    root = panel_dir()
+    os.makedirs(root, exist_ok=True)
+    codes = market_store.list_codes() if codes is None else list(codes)
+    prev = attach()
+    columns = list(market_store.COLUMNS)
+
+    parts: Dict[str, list] = {c: [] for c in ["date"] + columns}
+    kept, mtimes, has, reused = [], [], [], 0
+    for code in codes:
+        mtime = _meta_mtime(code)  # 先取 mtime：读取期间有写入时读端会判定过期
+        arrays = prev.slices(code) if prev is not None else None
+        if arrays is not None:
+            reused += 1
+        else:
+            arrays = market_store._read_columns(code, None, mmap=True)
+        if arrays is None:
+            continue
+        n = len(arrays["date"])
+        kept.append(code)
+        mtimes.append(mtime)
+        has.append([c in arrays for c in columns])
+        parts["date"].append(np.asarray(arrays["date"], dtype="datetime64[D]"))
+        for c in columns:
+            parts[c].append(np.asarray(arrays[c], dtype=np.float64) if c in arrays else np.full(n, np.nan))
+
+    generation = int(_generations(root)[-1][4:]) + 1 if _generations(root) else 1
+    name = f"gen-{generation:06d}"
+    tmp = tempfile.mkdtemp(prefix=".building-", dir=root)
+    lengths = [len(d) for d in parts["date"]]
+    np.save(os.path.join(tmp, "offsets.npy"), np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+    np.save(os.path.join(tmp, "mtime.npy"), np.asarray(mtimes, dtype=np.int64))
+    np.save(os.path.join(tmp, "has.npy"), np.asarray(has, dtype=bool).reshape(len(kept), len(columns)))
+    np.save(os.path.join(tmp, "date.npy"),
+            np.concatenate(parts["date"]) if kept else np.array([], dtype="datetime64[D]"))
+    for c in columns:
+        np.save(os.path.join(tmp, f"{c}.npy"), np.concatenate(parts[c]) if kept else np.array([]))
+    manifest = {
+        "generation": generation,
+        "store": os.path.abspath(market_store.STORE_DIR),
+        "codes": kept,
+        "columns": columns,
+        "rows": int(sum(lengths)),
+        "reused": reused,
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(root, name))
+
+    pointer = os.path.join(root, "current.json")
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"dir": name, "generation": generation}, f)
+    os.replace(pointer + ".tmp", pointer)
+
+    # 旧代次：已挂载的进程持有的 mmap 在文件删除后仍然有效
+    for old in _generations(root)[:-KEEP_GENERATIONS]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return attach()
+
+
+def serve(interval: float = SERVE_INTERVAL):
+    """常驻：存储有新写入 / 新增股票时重建"""
+    view = attach()
+    if view is None:
+        view = build()
+        print(f"📦 代次 {view.generation}: {len(view.codes)} 只，{view.manifest['rows']} 行")
+    last = fingerprint()
+    print(f"👂 监听 {market_store.STORE_DIR}（每 {interval:.0f}s）")
+    try:
+        while True:
+            time.sleep(interval)
+            now = fingerprint()
+            if now == last:
+                continue
+            t0 = time.perf_counter()
+            view = build(list(now))
+            last = now
+            print(f"📦 {datetime.now():%H:%M:%S} 代次 {view.generation}: {len(view.codes)} 只，"
+                  f"复用 {view.manifest['reused']} 只，{time.perf_counter() - t0:.2f}s")
+    except KeyboardInterrupt:
+        print("\n👋 退出")
+
+
+# ========== 基准 ==========
+def run_bench(symbols: int, bars: int):
+    old_store, old_flag = market_store.STORE_DIR, market_store.USE_PANEL
+    root = tempfile.mkdtemp(prefix="panel-bench-")
+    market_store.STORE_DIR = os.path.join(root, "store")
+    try:
+        rng = np.random.default_rng(0)
+        dates = pd.bdate_range("2022-01-03", periods=bars)
+        for i in range(symbols):
+            close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+            market_store.write_bars(f"{600000 + i:06d}", pd.DataFrame({
+                "date": dates, "open": close, "close": close, "high": close * 1.01,
+                "low": close * 0.99, "volume": rng.lognormal(12, 0.5, bars)}))
+        codes = market_store.list_codes()
+        cols = ("open", "high", "low", "close", "volume")
+
+        market_store.USE_PANEL = False
+        t0 = time.perf_counter()
+        direct = market_store.load_panel(codes, cols)
+        t_direct = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        build(codes)
+        t_build = time.perf_counter() - t0
+
+        market_store.USE_PANEL = True
+        global _VIEW_KEY
+        _VIEW_KEY = None
+        t0 = time.perf_counter()
+        attach()
+        t_attach = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        shared = market_store.load_panel(codes, cols)
+        t_shared = time.perf_counter() - t0
+        assert all(np.array_equal(direct[c], shared[c], equal_nan=True) for c in cols)
+
+        print(f"{symbols} 只 × {bars} 根，加载 {len(cols)} 列面板")
+        print(f"  分区文件直读: {t_direct:.2f}s")
+        print(f"  打包: {t_build:.2f}s；挂载: {t_attach * 1000:.1f}ms；经共享面板加载: {t_shared:.2f}s")
+    finally:
+        market_store.STORE_DIR, market_store.USE_PANEL = old_store, old_flag
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="共享行情面板")
+    parser.add_argument("cmd", nargs="?", default="info", choices=["build", "serve", "info", "bench"])
+    parser.add_argument("--interval", type=float, default=SERVE_INTERVAL)
+    parser.add_argument("--symbols", type=int, default=2000)
+    parser.add_argument("--bars", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.cmd == "bench":
+        run_bench(args.symbols, args.bars)
+    elif args.cmd == "build":
+        t0 = time.perf_counter()
+        view = build()
+        print(f"✅ 代次 {view.generation}: {len(view.codes)} 只，{view.manifest['rows']} 行，"
+              f"复用 {view.manifest['reused']} 只（{time.perf_counter() - t0:.2f}s）-> {view.path}")
+    elif args.cmd == "serve":
+        serve(args.interval)
+    else:
+        view = attach()
+        if view is None:
+            print(f"⚠️ 未打包（{panel_dir()}），先运行: python3 panel_server.py build")
+            sys.exit(1)
+        stale = sum(_meta_mtime(c) != m for c, m in zip(view.codes, view.mtime))
+        print(f"📦 代次 {view.generation}（{view.manifest['built_at']}）: {len(view.codes)} 只，"
+              f"{view.manifest['rows']} 行，已过期 {stale} 只 -> {view.path}")
+
+
+if __name__ == "__main__":
+    main()
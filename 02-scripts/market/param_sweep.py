@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+「缩量后的放量」策略阈值参数扫描（多进程 + 共享内存）
+
+- 每只股票的K线/指标只加载、计算一次，放进 multiprocessing.shared_memory，工作进程直接挂载不复制
+- 参数网格（缩量阈值 × 放量阈值 × 观察期 × 持有天数）分发到进程池；
+  同一组信号参数的不同持有期在一个任务里共用信号矩阵
+- 结果逐行写入 CSV（边算边写，中途中断也保留已完成的部分）
+- 先在抽样股票上粗扫，剔除交易数足够但平均收益垫底的组合，再在全部股票上精扫
+
+用法:
+    python3 param_sweep.py --out sweep.csv
+    python3 param_sweep.py --light -0.1,-0.2,-0.3 --candle 0.2,0.3,0.4 --obs 5,10 --hold 3,5,10
+    python3 param_sweep.py --bench --symbols 500 --bars 500 --workers 4
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from multiprocessing import Pool, shared_memory
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import indicators
+import market_store
+import volume_squeeze_breakout as vsb
+
+# ========== 配置 ==========
+WORKERS = os.cpu_count() or 1
+SAMPLE_FRAC = 0.2      # 粗扫抽样股票比例（>=1 关闭粗扫）
+PRUNE_FRAC = 0.5       # 粗扫后剔除平均收益最差的比例
+MIN_TRADES = 30        # 粗扫交易数不足的组合证据不够，不剔除
+SEED = 0
+
+DEFAULT_GRID = {
+    "light": [-0.10, -0.15, -0.20, -0.25, -0.30],
+    "candle": [0.20, 0.25, 0.30, 0.40, 0.50],
+    "obs": [5, 10, 15],
+    "hold": [3, 5, 10],
+}
+
+FIELDS = ["stage", "light", "candle", "obs", "hold", "symbols", "trades", "wins", "win_rate", "avg_return"]
+
+
+# ========== 共享内存面板 ==========
+class SharedPanel:
+    """把 indicators.Stacked 的各数组放进共享内存；spec 可 pickle 传给子进程挂载"""
+
+    def __init__(self, stacked: indicators.Stacked):
+        self._blocks = []
+        self.spec = {"codes": list(stacked.codes), "arrays": {}}
+        arrays = [("__dates__", stacked.dates.view("int64"))] + list(stacked.data.items())
+        for name, arr in arrays:
+            arr = np.ascontiguousarray(arr)
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...] = arr
+            self._blocks.append(shm)
+            self.spec["arrays"][name] = (shm.name, arr.shape, arr.dtype.str)
+
+    def close(self):
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(spec: dict):
+    """按 spec 挂载共享内存，返回 (Stacked, blocks)；blocks 需保持引用直到不再使用"""
+    blocks, arrays = [], {}
+    for name, (shm_name, shape, dtype) in spec["arrays"].items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        blocks.append(shm)
+        arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+    dates = arrays.pop("__dates__").view("datetime64[D]")
+    return indicators.Stacked(codes=spec["codes"], dates=dates, data=arrays), blocks
+
+
+# ========== 工作进程 ==========
+_PANEL: Optional[indicators.Stacked] = None
+_BLOCKS = []
+_VIEWS: Dict[str, indicators.Stacked] = {}
+
+
+def _init_worker(spec: dict):
+    global _PANEL, _BLOCKS
+    _PANEL, _BLOCKS = attach(spec)
+    _VIEWS.clear()
+
+
+def _release():
+    """放开本进程对共享内存的引用（先丢数组视图再关闭）"""
+    global _PANEL, _BLOCKS
+    _PANEL = None
+    _VIEWS.clear()
+    for shm in _BLOCKS:
+        shm.close()
+    _BLOCKS = []
+
+
+def _view(stage: str, cols) -> indicators.Stacked:
+    """抽样阶段的列子集（每个进程只切一次）"""
+    if cols is None:
+        return _PANEL
+    if stage not in _VIEWS:
+        idx = np.asarray(cols)
+        _VIEWS[stage] = indicators.Stacked(codes=[_PANEL.codes[i] for i in idx], dates=_PANEL.dates[:, idx],
+                                           data={k: v[:, idx] for k, v in _PANEL.data.items()})
+    return _VIEWS[stage]
+
+
+def _evaluate(task) -> List[dict]:
+    stage, cols, light, candle, obs, holds = task
+    panel = _view(stage, cols)
+    mask = vsb.combined_signal(panel, light, candle, obs)
+    rows = []
+    for hold in holds:
+        ret = panel[f"return_f{hold}"]
+        m = mask & ~np.isnan(ret)
+        rets = ret[m]
+        trades = len(rets)
+        wins = int((rets > 0).sum())
+        rows.append({
+            "stage": stage, "light": light, "candle": candle, "obs": obs, "hold": hold,
+            "symbols": int(m.any(axis=0).sum()),
+            "trades": trades,
+            "wins": wins,
+            "win_rate": wins / trades if trades else 0.0,
+            "avg_return": float(rets.mean()) if trades else 0.0,
+        })
+    return rows
+
+
+# ========== 调度 ==========
+def _run_stage(pool, tasks, writer, fh, label: str) -> List[dict]:
+    rows = []
+    results = pool.imap_unordered(_evaluate, tasks) if pool else map(_evaluate, tasks)
+    for i, part in enumerate(results, 1):
+        writer.writerows(part)
+        fh.flush()
+        rows.extend(part)
+        print(f"\r  {label}: {i}/{len(tasks)}", end="", flush=True)
+    print()
+    return rows
+
+
+def sweep(stacked: indicators.Stacked, grid: dict, out_path: str, workers: int = WORKERS,
+          sample_frac: float = SAMPLE_FRAC, prune_frac: float = PRUNE_FRAC,
+          min_trades: int = MIN_TRADES, seed: int = SEED) -> pd.DataFrame:
+    """
+    执行参数扫描
+
+    Args:
+        stacked: volume_squeeze_breakout.load_panel(codes, holds=grid['hold']) 的结果
+        grid: {'light': [...], 'candle': [...], 'obs': [...], 'hold': [...]}
+        out_path: 结果 CSV（逐行追加写入）
+
+    Returns:
+        全量阶段的结果表
+    """
+    signal_params = list(itertools.product(grid["light"], grid["candle"], grid["obs"]))
+    holds = list(grid["hold"])
+    n_symbols = len(stacked.codes)
+
+    with SharedPanel(stacked) as shared, open(out_path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=FIELDS)
+        writer.writeheader()
+
+        if workers > 1:
+            pool = Pool(workers, initializer=_init_worker, initargs=(shared.spec,))
+        else:
+            pool = None
+            _init_worker(shared.spec)
+        try:
+            survivors = {p: holds for p in signal_params}
+
+            # 粗扫：抽样股票上跑全部组合，剔除明显差的区域
+            n_sample = int(n_symbols * sample_frac)
+            if sample_frac < 1 and n_sample >= 10:
+                cols = tuple(sorted(np.random.default_rng(seed).choice(n_symbols, n_sample, replace=False).tolist()))
+                tasks = [("sample", cols, *p, holds) for p in signal_params]
+                coarse = pd.DataFrame(_run_stage(pool, tasks, writer, fh, f"粗扫 {n_sample} 只"))
+                enough = coarse["trades"] >= min_trades
+                cutoff = coarse.loc[enough, "avg_return"].quantile(prune_frac) if enough.any() else -np.inf
+                keep = coarse[~enough | (coarse["avg_return"] >= cutoff)]
+                survivors = {}
+                for r in keep.itertuples():
+                    survivors.setdefault((r.light, r.candle, r.obs), []).append(r.hold)
+                print(f"  剪枝: {len(coarse)} 组 -> {len(keep)} 组")
+
+            # 精扫：全部股票
+            tasks = [("full", None, *p, sorted(h)) for p, h in survivors.items()]
+            full = _run_stage(pool, tasks, writer, fh, f"精扫 {n_symbols} 只")
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+            else:
+                _release()
+
+    return pd.DataFrame(full, columns=FIELDS)
+
+
+# ========== 命令行 ==========
+def synthetic_stacked(symbols: int, bars: int, holds: Iterable[int], seed: int = SEED) -> indicators.Stacked:
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (bars, symbols)), axis=0))
+    cols = {"close": close, "volume": rng.lognormal(12, 0.5, close.shape)}
+    names = vsb.IND_NAMES + [f"return_f{h}" for h in holds]
+    dates = np.datetime64("2020-01-01") + np.arange(bars).astype("timedelta64[D]")
+    return indicators.Stacked(codes=[f"{i:06d}" for i in range(symbols)],
+                              dates=np.repeat(dates[:, None], symbols, axis=1),
+                              data=indicators.compute(cols, names))
+
+
+def _floats(text: str) -> List[float]:
+    return [float(x) for x in text.split(",")]
+
+
+def _ints(text: str) -> List[int]:
+    return [int(x) for x in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="缩量后的放量 参数扫描")
+    parser.add_argument("--codes", help="逗号分隔的股票代码（默认本地行情库全部）")
+    parser.add_argument("--light", type=_floats, default=DEFAULT_GRID["light"])
+    parser.add_argument("--candle", type=_floats, default=DEFAULT_GRID["candle"])
+    parser.add_argument("--obs", type=_ints, default=DEFAULT_GRID["obs"])
+    parser.add_argument("--hold", type=_ints, default=DEFAULT_GRID["hold"])
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--sample", type=float, default=SAMPLE_FRAC, help="粗扫抽样比例，>=1 关闭剪枝")
+    parser.add_argument("--prune", type=float, default=PRUNE_FRAC)
+    parser.add_argument("--min-trades", type=int, default=MIN_TRADES)
+    parser.add_argument("--out", default="param_sweep.csv")
+    parser.add_argument("--bench", action="store_true", help="合成数据测速")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--bars", type=int, default=500)
+    args = parser.parse_args()
+
+    grid = {"light": args.light, "candle": args.candle, "obs": args.obs, "hold": args.hold}
+    n_combos = len(args.light) * len(args.candle) * len(args.obs) * len(args.hold)
+
+    t0 = time.perf_counter()
+    if args.bench:
+        stacked = synthetic_stacked(args.symbols, args.bars, args.hold)
+    else:
+        codes = args.codes.split(",") if args.codes else market_store.list_codes()
+        stacked = vsb.load_panel(codes, holds=args.hold)
+    load_s = time.perf_counter() - t0
+    if not stacked.codes:
+        print("❌ 没有可用的股票数据")
+        sys.exit(1)
+
+    print("=" * 70)
+    print(f"🔥 参数扫描: {n_combos} 组参数 × {len(stacked.codes)} 只股票（{args.workers} 进程）")
+    print("=" * 70)
+    t0 = time.perf_counter()
+    result = sweep(stacked, grid, args.out, args.workers, args.sample, args.prune, args.min_trades)
+    elapsed = time.perf_counter() - t0
+
+    top = result[result["trades"] >= args.min_trades].sort_values("avg_return", ascending=False).head(10)
+    print(f"\n🏆 平均收益前 10（交易数≥{args.min_trades}）:")
+    print("-" * 70)
+    for r in top.itertuples():
+        print(f"  缩量{r.light:+.0%} 放量{r.candle:+.0%} 观察{r.obs:>2}日 持有{r.hold:>2}日 | "
+              f"{r.trades:>5}笔 胜率{r.win_rate:.1%} 平均{r.avg_return:+.3%}")
+
+    print(f"\n⏱️ 加载 {load_s:.2f}s，扫描 {elapsed:.2f}s（精扫 {len(result)} 组）")
+    print(f"✅ 结果: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
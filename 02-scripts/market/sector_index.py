@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+板块成分索引 + 板块指数（等权 / 流通市值加权）
+
+- 成分：新浪行业板块（newSinaHy）与个股多对多，存 SQLite（stock_data/sectors.db）；
+  增量刷新：只重拉成分数变化或超过 MAX_AGE_DAYS 未更新的板块，按差集增删
+- 指数：用本地日线（market_store）一次矩阵乘法算出全部板块的日收益，存 sector_returns 表；
+  增量计算：只补最后日期之后的交易日，成分有变化的板块整段重算
+- 查询：个股所属板块 / 同板块个股、个股对应的板块涨幅矩阵（历史 excess_vs_sector）、板块相对强弱
+
+指数按当前成分回溯计算（存在幸存者偏差）；流通股本取刷新时的 流通市值 / 现价，按前收盘价加权。
+
+用法:
+    python3 sector_index.py refresh            # 刷新板块成分
+    python3 sector_index.py update             # 增量计算板块指数
+    python3 sector_index.py rs --window 20     # 板块相对强弱
+    python3 sector_index.py peers 600519
+    python3 sector_index.py --bench
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import execution
+import market_store
+from tencent_fetcher import get_fetcher
+
+# ========== 配置 ==========
+SECTORS_URL = "https://vip.stock.finance.sina.com.cn/q/view/newSinaHy.php"
+MEMBERS_URL = "https://vip.stock.finance.sina.com.cn/quotes_service/api/json_v2.php/Market_Center.getHQNodeData"
+SOURCE = "sina_industry"
+PAGE_SIZE = 100
+MAX_AGE_DAYS = 7        # 成分数没变的板块也至少每周重拉一次
+WEIGHTS = ("ew", "cw")  # 等权 / 流通市值加权
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sectors (
+    node TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    source TEXT NOT NULL,
+    members INTEGER DEFAULT 0,
+    dirty INTEGER DEFAULT 1,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS stocks (
+    code TEXT PRIMARY KEY,
+    name TEXT,
+    float_shares REAL,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS sector_members (
+    node TEXT NOT NULL,
+    code TEXT NOT NULL,
+    PRIMARY KEY (node, code)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sector_members_code ON sector_members(code, node);
+CREATE TABLE IF NOT EXISTS sector_returns (
+    node TEXT NOT NULL,
+    date TEXT NOT NULL,
+    ew REAL,
+    cw REAL,
+    n INTEGER,
+    PRIMARY KEY (node, date)
+) WITHOUT ROWID;
+"""
+
+
+def db_path() -> str:
+    """与 market_store.STORE_DIR 同级（跟随脚本对 STORE_DIR 的覆盖）"""
+    return os.path.join(os.path.dirname(os.path.abspath(market_store.STORE_DIR)), "sectors.db")
+
+
+def connect(path: Optional[str] = None) -> sqlite3.Connection:
+    path = path or db_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# ========== 成分 ==========
+def fetch_sectors() -> List[dict]:
+    """新浪行业板块列表：node / name / count / chg"""
+    resp = get_fetcher().get(SECTORS_URL)
+    if resp is None:
+        return []
+    m = re.search(r"var\s+S_Finance_bankuai_sinaindustry\s*=\s*(\{.*\});?\s*$", resp.text, re.S)
+    if not m:
+        return []
+    out = []
+    for node, val in json.loads(m.group(1)).items():
+        p = val.split(",")
+        if len(p) < 6:
+            continue
+        try:
+            out.append({"node": node, "name": p[1], "count": int(float(p[2])), "chg": float(p[5])})
+        except ValueError:
+            continue
+    return out
+
+
+def fetch_members(node: str, count: Optional[int] = None) -> Optional[List[dict]]:
+    """
+    板块全部成分（分页）：code / name / float_shares
+
+    Args:
+        count: 板块列表给出的成分数，拉够即停（整页倍数时不必再请求空页）
+
+    Returns:
+        任一页请求失败或返回非列表时为 None（不返回截断的成分）
+    """
+    fetcher = get_fetcher()
+    rows, page = [], 1
+    while count is None or len(rows) < count:
+        params = {"page": str(page), "num": str(PAGE_SIZE), "sort": "symbol", "asc": "1",
+                  "node": node, "symbol": "", "_s_r_a": "page"}
+        resp = fetcher.get(MEMBERS_URL, params)
+        try:
+            arr = resp.json() if resp is not None else None
+        except ValueError:
+            arr = None
+        if not isinstance(arr, list):
+            return None
+        for x in arr:
+            trade = float(x.get("trade") or 0) or float(x.get("settlement") or 0)
+            nmc = float(x.get("nmc") or 0)  # 流通市值（万元）
+            rows.append({"code": str(x.get("code", "")), "name": str(x.get("name", "")),
+                         "float_shares": nmc * 1e4 / trade if trade > 0 else None})
+        if len(arr) < PAGE_SIZE:
+            break
+        page += 1
+    return rows
+
+
+def update_members(conn: sqlite3.Connection, node: str, name: str, members: List[dict],
+                   source: str = SOURCE) -> Tuple[int, int]:
+    """
+    按差集更新一个板块的成分
+
+    Returns:
+        (新增数, 移除数)；有增删时板块标记为 dirty（指数需整段重算）
+    """
+    now = datetime.now().isoformat(timespec="seconds")
+    new = {m["code"] for m in members if m["code"]}
+    old = {r[0] for r in conn.execute("SELECT code FROM sector_members WHERE node = ?", (node,))}
+    added, removed = new - old, old - new
+    with conn:
+        conn.executemany("DELETE FROM sector_members WHERE node = ? AND code = ?", [(node, c) for c in removed])
+        conn.executemany("INSERT INTO sector_members(node, code) VALUES (?, ?)", [(node, c) for c in added])
+        conn.executemany(
+            "INSERT INTO stocks(code, name, float_shares, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(code) DO UPDATE SET name = excluded.name, "
+            "float_shares = COALESCE(excluded.float_shares, stocks.float_shares), updated_at = excluded.updated_at",
+            [(m["code"], m["name"], m.get("float_shares"), now) for m in members if m["code"]])
+        conn.execute(
+            "INSERT INTO sectors(node, name, source, members, dirty, updated_at) VALUES (?, ?, ?, ?, 1, ?) "
+            "ON CONFLICT(node) DO UPDATE SET name = excluded.name, members = excluded.members, "
+            "dirty = sectors.dirty OR ?, updated_at = excluded.updated_at",
+            (node, name, source, len(new), now, int(bool(added or removed))))
+    return len(added), len(removed)
+
+
+def refresh(conn: sqlite3.Connection, max_age_days: int = MAX_AGE_DAYS, force: bool = False) -> Dict[str, int]:
+    """增量刷新全部板块成分；成分拉取失败或条数与板块列表不符的板块跳过，保留旧成分"""
+    stats = {"sectors": 0, "fetched": 0, "failed": 0, "added": 0, "removed": 0}
+    stored = {r["node"]: r for r in conn.execute("SELECT node, members, updated_at FROM sectors")}
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat(timespec="seconds")
+    for s in fetch_sectors():
+        stats["sectors"] += 1
+        old = stored.get(s["node"])
+        if not force and old is not None and old["members"] == s["count"] and (old["updated_at"] or "") >= cutoff:
+            continue
+        members = fetch_members(s["node"], s["count"])
+        if not members or len(members) != s["count"]:
+            stats["failed"] += 1
+            continue
+        added, removed = update_members(conn, s["node"], s["name"], members)
+        stats["fetched"] += 1
+        stats["added"] += added
+        stats["removed"] += removed
+    return stats
+
+
+def membership(conn: sqlite3.Connection, codes: Optional[List[str]] = None
+               ) -> Tuple[List[str], List[str], np.ndarray]:
+    """
+    成分矩阵
+
+    Returns:
+        (nodes, codes, M)：M 为 (len(codes) × len(nodes)) 的 0/1 float 矩阵
+    """
+    rows = conn.execute("SELECT node, code FROM sector_members ORDER BY node, code").fetchall()
+    nodes = sorted({r[0] for r in rows})
+    codes = codes if codes is not None else sorted({r[1] for r in rows})
+    ni = {n: i for i, n in enumerate(nodes)}
+    ci = {c: i for i, c in enumerate(codes)}
+    m = np.zeros((len(codes), len(nodes)))
+    for node, code in rows:
+        if code in ci:
+            m[ci[code], ni[node]] = 1.0
+    return nodes, codes, m
+
+
+def sectors_of(conn: sqlite3.Connection, code: str) -> List[dict]:
+    return [dict(r) for r in conn.execute(
+        "SELECT s.node, s.name FROM sector_members m JOIN sectors s ON s.node = m.node WHERE m.code = ?", (code,))]
+
+
+def stock_names(conn: sqlite3.Connection) -> Dict[str, str]:
+    """{代码: 名称}（刷新成分时记录的最新名称）"""
+    return {r[0]: r[1] for r in conn.execute("SELECT code, name FROM stocks WHERE name IS NOT NULL")}
+
+
+def peers(conn: sqlite3.Connection, code: str) -> List[str]:
+    """与 code 至少同属一个板块的其他股票"""
+    return [r[0] for r in conn.execute(
+        "SELECT DISTINCT p.code FROM sector_members m JOIN sector_members p ON p.node = m.node "
+        "WHERE m.code = ? AND p.code != ?", (code, code))]
+
+
+# ========== 指数 ==========
+def _weighted(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(den > 0, num / np.where(den > 0, den, 1), np.nan)
+
+
+def compute_returns(close: np.ndarray, m: np.ndarray, float_shares: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    全部板块的日收益（一次矩阵乘法）
+
+    Args:
+        close: (T × N) 收盘价，停牌为 NaN
+        m: (N × S) 成分矩阵
+        float_shares: (N,) 流通股本，缺失为 NaN（不参与市值加权）
+
+    Returns:
+        {'ew': (T × S), 'cw': (T × S), 'n': (T × S) 当日有成交的成分数}
+    """
+    prev = execution.prev_close(close)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = close / prev - 1
+    valid = np.isfinite(r)
+    r0 = np.where(valid, r, 0.0)
+    w = np.where(valid, np.nan_to_num(prev * float_shares), 0.0)
+    n = valid.astype(np.float64) @ m
+    return {"ew": _weighted(r0 @ m, n), "cw": _weighted((r0 * w) @ m, w @ m), "n": n}
+
+
+def update_returns(conn: sqlite3.Connection, full: bool = False) -> Dict[str, int]:
+    """增量计算并写入 sector_returns：干净板块只补最后日期之后，dirty 板块整段重算"""
+    nodes, codes, m = membership(conn)
+    if not nodes:
+        return {"sectors": 0, "rows": 0}
+    dirty = {r[0] for r in conn.execute("SELECT node FROM sectors WHERE dirty = 1")}
+    last = None if full else conn.execute("SELECT MAX(date) FROM sector_returns").fetchone()[0]
+    need_full = full or last is None or bool(dirty & set(nodes))
+    # 增量时多取两周用于前收盘价
+    start = None if need_full else (pd.Timestamp(last) - pd.Timedelta(days=14)).date()
+
+    panel = market_store.load_panel(codes, ("close",), start=start)
+    if not len(panel.dates):
+        return {"sectors": len(nodes), "rows": 0}
+    ci = {c: i for i, c in enumerate(codes)}
+    m = m[[ci[c] for c in panel.codes]]
+    shares = {r[0]: r[1] for r in conn.execute("SELECT code, float_shares FROM stocks")}
+    float_shares = np.array([shares.get(c) if shares.get(c) is not None else np.nan for c in panel.codes])
+    res = compute_returns(panel["close"], m, float_shares)
+
+    dates = pd.to_datetime(panel.dates).strftime("%Y-%m-%d").to_numpy()
+    rows = []
+    for j, node in enumerate(nodes):
+        keep = np.ones(len(dates), dtype=bool) if (full or node in dirty or last is None) else dates > last
+        keep &= res["n"][:, j] > 0
+        for t in np.flatnonzero(keep):
+            ew, cw = res["ew"][t, j], res["cw"][t, j]
+            rows.append((node, dates[t], float(ew), None if np.isnan(cw) else float(cw), int(res["n"][t, j])))
+    with conn:
+        stale = list(dirty) if not full else nodes
+        conn.executemany("DELETE FROM sector_returns WHERE node = ?", [(n,) for n in stale])
+        conn.executemany("INSERT OR REPLACE INTO sector_returns(node, date, ew, cw, n) VALUES (?, ?, ?, ?, ?)", rows)
+        conn.execute("UPDATE sectors SET dirty = 0")
+    return {"sectors": len(nodes), "rows": len(rows)}
+
+
+def returns(conn: sqlite3.Connection, weight: str = "ew", start=None, end=None) -> pd.DataFrame:
+    """板块日收益：行=日期，列=板块 node"""
+    if weight not in WEIGHTS:
+        raise ValueError(f"weight 只能是 {WEIGHTS}")
+    sql = f"SELECT node, date, {weight} AS r FROM sector_returns WHERE 1 = 1"
+    params = []
+    if start is not None:
+        sql += " AND date >= ?"
+        params.append(str(pd.Timestamp(start).date()))
+    if end is not None:
+        sql += " AND date <= ?"
+        params.append(str(pd.Timestamp(end).date()))
+    df = pd.read_sql_query(sql, conn, params=params)
+    if df.empty:
+        return pd.DataFrame()
+    out = df.pivot(index="date", columns="node", values="r")
+    out.index = pd.to_datetime(out.index)
+    return out
+
+
+def sector_chg(panel: market_store.Panel, conn: Optional[sqlite3.Connection] = None,
+               weight: str = "ew") -> np.ndarray:
+    """
+    每只股票对应的板块涨幅（%），与 panel 同形 (dates × codes)
+
+    属于多个板块的取各板块平均；不在任何板块或当日无板块数据为 NaN
+    """
+    conn = conn or connect()
+    T, N = panel.shape
+    nodes, _, m = membership(conn, list(panel.codes))
+    if not nodes or not T:
+        return np.full((T, N), np.nan)
+    ret = returns(conn, weight, start=pd.Timestamp(panel.dates[0]), end=pd.Timestamp(panel.dates[-1]))
+    ret = ret.reindex(index=pd.to_datetime(panel.dates), columns=nodes).to_numpy()
+    ok = np.isfinite(ret)
+    num = np.where(ok, ret, 0.0) @ m.T
+    den = ok.astype(np.float64) @ m.T
+    return _weighted(num, den) * 100
+
+
+def relative_strength(conn: sqlite3.Connection, window: int = 20, weight: str = "ew", as_of=None) -> pd.DataFrame:
+    """
+    板块相对强弱：最近 window 个交易日的累计收益，及相对全部板块等权平均的超额
+
+    Returns:
+        DataFrame: node / name / ret / excess / rank（按 excess 降序）
+    """
+    ret = returns(conn, weight, end=as_of)
+    if ret.empty:
+        return pd.DataFrame(columns=["node", "name", "ret", "excess", "rank"])
+    tail = ret.iloc[-window:]
+    cum = np.exp(np.log1p(tail).sum(min_count=1)) - 1
+    names = dict(conn.execute("SELECT node, name FROM sectors").fetchall())
+    out = pd.DataFrame({"node": cum.index, "name": [names.get(n, n) for n in cum.index], "ret": cum.to_numpy()})
+    out["excess"] = out["ret"] - out["ret"].mean()
+    out = out.sort_values("excess", ascending=False).reset_index(drop=True)
+    out["rank"] = np.arange(1, len(out) + 1)
+    return out
+
+
+# ========== 基准 ==========
+def run_bench(symbols: int, bars: int, sectors: int):
+    rng = np.random.default_rng(0)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (bars, symbols)), axis=0))
+    close[rng.random(close.shape) < 0.01] = np.nan
+    m = np.zeros((symbols, sectors))
+    for i in range(symbols):
+        m[i, rng.choice(sectors, rng.integers(1, 4), replace=False)] = 1
+    shares = rng.lognormal(20, 1, symbols)
+
+    t0 = time.perf_counter()
+    res = compute_returns(close, m, shares)
+    t_matrix = time.perf_counter() - t0
+
+    # 对照：逐板块 pandas 循环
+    df = pd.DataFrame(close)
+    t0 = time.perf_counter()
+    prev = df.ffill().shift(1)
+    r = df / prev - 1
+    w = (prev * shares).where(r.notna())
+    ew, cw = {}, {}
+    for j in range(sectors):
+        cols = m[:, j] > 0
+        ew[j] = r.loc[:, cols].mean(axis=1)
+        cw[j] = (r.loc[:, cols] * w.loc[:, cols]).sum(axis=1) / w.loc[:, cols].sum(axis=1)
+    t_loop = time.perf_counter() - t0
+    assert np.allclose(np.column_stack([ew[j] for j in range(sectors)])[1:], res["ew"][1:], equal_nan=True)
+    assert np.allclose(np.column_stack([cw[j] for j in range(sectors)])[1:], res["cw"][1:], equal_nan=True)
+
+    t0 = time.perf_counter()
+    _weighted(np.nan_to_num(res["ew"]) @ m.T, np.isfinite(res["ew"]) @ m.T)
+    t_lookup = time.perf_counter() - t0
+
+    print(f"{bars} 日 × {symbols} 只 × {sectors} 个板块")
+    print(f"  矩阵乘法（等权 + 市值加权）: {t_matrix:.2f}s")
+    print(f"  逐板块 pandas 循环: {t_loop:.2f}s")
+    print(f"  个股板块涨幅矩阵（sector_chg 的计算部分）: {t_lookup:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="板块成分索引与板块指数")
+    parser.add_argument("cmd", nargs="?", default="rs", choices=["refresh", "update", "rs", "peers"])
+    parser.add_argument("code", nargs="?")
+    parser.add_argument("--force", action="store_true", help="refresh: 忽略增量条件全部重拉；update: 全部重算")
+    parser.add_argument("--window", type=int, default=20)
+    parser.add_argument("--weight", choices=WEIGHTS, default="ew")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--symbols", type=int, default=5000)
+    parser.add_argument("--bars", type=int, default=750)
+    parser.add_argument("--sectors", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.bench:
+        run_bench(args.symbols, args.bars, args.sectors)
+        return
+
+    conn = connect()
+    t0 = time.perf_counter()
+    if args.cmd == "refresh":
+        s = refresh(conn, force=args.force)
+        print(f"✅ 板块 {s['sectors']} 个，重拉 {s['fetched']} 个（失败 {s['failed']}），成分 +{s['added']} / -{s['removed']}"
+              f"（{time.perf_counter() - t0:.1f}s）-> {db_path()}")
+    elif args.cmd == "update":
+        s = update_returns(conn, full=args.force)
+        print(f"✅ 板块指数: {s['sectors']} 个板块，写入 {s['rows']} 行（{time.perf_counter() - t0:.2f}s）")
+    elif args.cmd == "peers":
+        if not args.code:
+            print("❌ 需要股票代码")
+            sys.exit(1)
+        own = sectors_of(conn, args.code)
+        print(f"{args.code} 所属板块: {', '.join(s['name'] for s in own) or '无'}")
+        print(f"同板块: {', '.join(peers(conn, args.code)) or '无'}")
+    else:
+        rs = relative_strength(conn, args.window, args.weight)
+        if rs.empty:
+            print("⚠️ 没有板块指数，先运行 refresh 与 update")
+            sys.exit(1)
+        print(f"📊 板块相对强弱（近 {args.window} 日，{'等权' if args.weight == 'ew' else '市值加权'}）")
+        print("-" * 50)
+        for r in rs.head(args.top).itertuples():
+            print(f"  {r.rank:>3}. {r.name:<10} {r.ret:+.2%}  超额 {r.excess:+.2%}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+二阶段信号原语（「点灯 → N 日内举烛」「缩量 → N 根内放量」）
+
+全部用数组运算完成，不逐行 iloc；输入可以是一维（单只股票）或二维（交易日 × 股票）布尔数组，
+axis 0 为时间。
+
+    last_event_index(a)              每个位置之前（含）最近一次 A 的行号，没有为 -1
+    two_stage(a, b, window, dates)   B 发生时，最近一次 A 距今 1..window（根K线，或给 dates 时按自然日）
+    first_after(a, b, window)        每个 A 之后 window 根内第一次 B 的行号，没有为 -1
+
+用法:
+    import signals
+    combined, wait = signals.two_stage(df['signal_light'], df['signal_candle'], 10, dates=df['date'])
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+
+def _bool(x) -> np.ndarray:
+    return np.asarray(x, dtype=bool)
+
+
+def _rows(shape) -> np.ndarray:
+    """与 shape 同形的行号数组"""
+    idx = np.arange(shape[0])
+    return idx if len(shape) == 1 else np.broadcast_to(idx[:, None], shape)
+
+
+def last_event_index(a) -> np.ndarray:
+    """最近一次事件（含当前行）的行号，之前从未发生为 -1（行号前向填充）"""
+    a = _bool(a)
+    return np.maximum.accumulate(np.where(a, _rows(a.shape), -1), axis=0)
+
+
+def next_event_index(b) -> np.ndarray:
+    """当前行及之后第一次事件的行号，之后不再发生为 len"""
+    b = _bool(b)
+    n = len(b)
+    idx = np.where(b, _rows(b.shape), n)
+    return np.minimum.accumulate(idx[::-1], axis=0)[::-1]
+
+
+def two_stage(a, b, window: int, dates=None, min_gap: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    B 发生且最近一次 A（含同一行）距今在 [min_gap, window] 之内
+
+    与原脚本的 light_date.ffill() 口径一致：同一天既点灯又举烛时间隔为 0，不算信号。
+
+    Args:
+        a / b: 布尔数组（一维或 交易日 × 股票）
+        window: 最大间隔
+        dates: 给出时按自然日计间隔（datetime64，一维与行对应，或与 a 同形）；否则按K线根数
+        min_gap: 最小间隔
+
+    Returns:
+        (mask, wait)：mask 为二阶段信号；wait 为间隔（非信号处为 -1）
+    """
+    a, b = _bool(a), _bool(b)
+    last = last_event_index(a)
+    has = last >= 0
+    safe = np.where(has, last, 0)
+
+    if dates is None:
+        gap = _rows(a.shape) - safe
+    else:
+        d = np.asarray(dates).astype("datetime64[D]")
+        if d.ndim == 1 and a.ndim == 2:
+            d_now, d_last = d[:, None], d[safe]
+        elif d.ndim == 1:
+            d_now, d_last = d, d[safe]
+        else:
+            d_now, d_last = d, np.take_along_axis(d, safe, axis=0)
+        gap = (d_now - d_last).astype(np.int64)
+
+    mask = b & has & (gap >= min_gap) & (gap <= window)
+    return mask, np.where(mask, gap, -1)
+
+
+def first_after(a, b, window: int) -> np.ndarray:
+    """
+    每个 A 之后（不含当行）window 根K线内第一次 B 的行号
+
+    Returns:
+        与 a 同形的整数数组：A 所在行为匹配到的 B 行号，其余（含未匹配）为 -1
+    """
+    a, b = _bool(a), _bool(b)
+    n = len(a)
+    nxt = next_event_index(b)
+    after = np.full_like(nxt, n)
+    after[:-1] = nxt[1:]
+    rows = _rows(a.shape)
+    ok = a & (after < n) & (after - rows <= window)
+    return np.where(ok, after, -1)
+
+
+def gather(values, index: np.ndarray) -> np.ndarray:
+    """按 first_after 的结果取值：index 为 -1 处为 NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    safe = np.where(index >= 0, index, 0)
+    picked = values[safe] if values.ndim == 1 else np.take_along_axis(values, safe, axis=0)
+    return np.where(index >= 0, picked, np.nan)
+
+
+def trade_stats(mask, ret) -> dict:
+    """
+    一维：信号处收益的统计（收益为 NaN 的不计）
+
+    Returns:
+        {'trades', 'wins', 'losses', 'win_rate', 'avg_return', 'max_win', 'max_loss'}；无交易时只有 trades=0
+    """
+    ret = np.asarray(ret, dtype=np.float64)
+    rets = ret[_bool(mask) & ~np.isnan(ret)]
+    if len(rets) == 0:
+        return {'trades': 0}
+    wins = int((rets > 0).sum())
+    return {
+        'trades': len(rets),
+        'wins': wins,
+        'losses': len(rets) - wins,
+        'win_rate': wins / len(rets),
+        'avg_return': float(rets.mean()),
+        'max_win': float(rets.max()),
+        'max_loss': float(rets.min()),
+    }
+
+
+def panel_trade_stats(mask, ret) -> dict:
+    """
+    二维：按列（股票）统计
+
+    Returns:
+        {'trades': int 数组, 'wins': ..., 'avg_return': ...}，无交易的列 avg_return 为 NaN
+    """
+    ret = np.asarray(ret, dtype=np.float64)
+    m = _bool(mask) & ~np.isnan(ret)
+    trades = m.sum(axis=0)
+    wins = (m & (ret > 0)).sum(axis=0)
+    total = np.where(m, ret, 0.0).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg = np.where(trades > 0, total / trades, np.nan)
+    return {'trades': trades, 'wins': wins, 'avg_return': avg}
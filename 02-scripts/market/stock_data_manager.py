@@ -2,14 +2,17 @@
 """
 股票数据缓存系统
 目标：确保数据获取稳定性，支持离线回测
+存储：market_store 列式分区（stock_data/store/<code>/），旧 CSV 首次访问时自动导入
 """
 
 import pandas as pd
-import requests
-import time
 import os
 from datetime import datetime
 
+import market_store
+from kline_parser import parse_kline_frame
+from tencent_fetcher import get_fetcher, market_code
+
 # ========== 配置 ==========
 DATA_DIR = "stock_data"
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -18,104 +21,134 @@ os.makedirs(DATA_DIR, exist_ok=True)
 SOURCES = {
     "tencent": {
         "name": "腾讯财经",
-        "url": "https://web.ifzq.gtimg.cn/appstock/app/fqkline/get",
-        "params": {"_var": "kline_dayqfq", "param": "sh600519,day,,,500,qfq"},
         "parser": "parse_tencent"
     }
 }
 
-def parse_tencent(response_text):
-    """解析腾讯财经数据"""
-    json_str = response_text.split('=', 1)[1]
-    data = eval(json_str)
-    if data.get('code') == 0:
-        klines = data['data']['sh600519']['qfqday']
-        records = []
-        for k in klines:
-            if len(k) >= 6:
-                records.append({
-                    'date': k[0],
-                    'open': float(k[1]),
-                    'close': float(k[2]),
-                    'high': float(k[3]),
-                    'low': float(k[4]),
-                    'volume': float(k[5]) * 100
-                })
-        return pd.DataFrame(records[::-1])
-    return None
+FULL_BARS = 500          # 全量下载条数
+OVERLAP_TOLERANCE = 1e-4  # 重叠K线价格比对容差（复权价变化即视为除权除息）
+
+def parse_tencent(response_text, mcode):
+    """解析腾讯财经数据（按请求的市场代码取数据）"""
+    return parse_kline_frame(response_text, mcode)
+
+def expected_last_bar(now=None):
+    """
+    当前时刻应有的最新日K日期（未收盘取上一工作日；节假日按工作日近似，
+    多出的一次增量请求代价很小）
+    """
+    now = now or datetime.now()
+    day = pd.Timestamp(now.date())
+    if now.hour < 15:
+        day -= pd.Timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= pd.Timedelta(days=1)
+    return day
 
-def get_stock_data(stock_code, source="tencent", force_update=False):
+def fetch_bars(stock_code, source="tencent", start="", count=FULL_BARS):
     """
-    获取股票数据，自动缓存到CSV
+    从API拉取K线（共享下载器负责连接池、限速与退避重试）
+
+    Args:
+        start: 起始日期 'YYYY-MM-DD'（含），为空表示取最近 count 条
+        count: 最多返回条数
+
+    Returns:
+        (DataFrame 或 None, 响应字节数)
+    """
+    parser = globals()[SOURCES[source]["parser"]]
+    text = get_fetcher().fetch_kline(market_code(stock_code), count=count, start=start)
+    if not text:
+        return None, 0
+    df = parser(text, market_code(stock_code))
+    if df is None:
+        print(f"   解析失败: {stock_code}")
+        return None, 0
+    # 未收盘的当日K线不入库，避免收盘后仍被当作最新数据
+    df = df[pd.to_datetime(df['date']) <= expected_last_bar()]
+    return df, len(text.encode('utf-8'))
+
+def _overlap_changed(stock_code, delta, last_date):
+    """增量数据中与缓存最后一根重叠的K线价格是否变化（除权除息后前复权价整体重算）"""
+    overlap = delta[pd.to_datetime(delta['date']) == last_date]
+    if overlap.empty:
+        return True
+    cached = market_store.load_columns(stock_code, ['open', 'close'])
+    for col in ('open', 'close'):
+        if col not in cached:
+            continue
+        old = float(cached[col][-1])
+        new = float(overlap[col].iloc[-1])
+        if abs(new - old) > OVERLAP_TOLERANCE * max(abs(old), 1.0):
+            return True
+    return False
+
+def get_stock_data(stock_code, source="tencent", force_update=False, incremental=True):
+    """
+    获取股票数据，自动缓存到列式存储
     
     Args:
         stock_code: 股票代码，如 '600519'
         source: 数据源 ('tencent')
-        force_update: 是否强制更新
+        force_update: 是否强制全量更新
+        incremental: 有缓存时只拉取缓存最后日期之后的K线并原地追加
     
     Returns:
         DataFrame: 股票数据
     """
-    csv_path = f"{DATA_DIR}/{stock_code}.csv"
-    
-    # 1. 优先从CSV读取（未过期）
-    if not force_update and os.path.exists(csv_path):
-        df = pd.read_csv(csv_path)
-        # 检查是否过期（超过7天）
-        if len(df) > 0:
-            last_date = pd.to_datetime(df['date'].max())
-            if (datetime.now() - last_date).days < 7:
-                print(f"📁 从缓存读取: {stock_code}.csv ({len(df)} 行)")
-                return df
-    
-    # 2. 从API获取
+    last_date = market_store.last_date(stock_code)
+
+    # 1. 缓存已是最新：直接读取（只读 meta.json 判断，不解析数据）
+    if not force_update and last_date is not None and last_date >= expected_last_bar():
+        df = market_store.load_bars(stock_code)
+        print(f"📁 从缓存读取: {stock_code} ({len(df)} 行)")
+        return df
+
+    # 2. 增量：从缓存最后日期（含）开始取，重叠一根用于校验复权价
+    if incremental and not force_update and last_date is not None:
+        gap_days = (pd.Timestamp(datetime.now().date()) - last_date).days
+        delta, nbytes = fetch_bars(stock_code, source, start=last_date.strftime('%Y-%m-%d'),
+                                   count=min(FULL_BARS, gap_days + 2))
+        if delta is not None and len(delta) > 0:
+            if _overlap_changed(stock_code, delta, last_date):
+                print(f"🔁 {stock_code} 复权价变化（除权除息），重新全量下载")
+            else:
+                added = market_store.append_bars(stock_code, delta)
+                print(f"➕ 增量更新: {stock_code} +{added} 行 ({nbytes / 1024:.1f} KB)")
+                return market_store.load_bars(stock_code)
+
+    # 3. 全量：首次获取 / 强制更新 / 复权价变化 / 增量失败
     print(f"🌐 从{source}获取: {stock_code}...")
+    df, nbytes = fetch_bars(stock_code, source)
+    if df is not None and len(df) > 0:
+        # 保存到列式存储
+        market_store.write_bars(stock_code, df)
+        print(f"✅ 保存到: {market_store.STORE_DIR}/{stock_code}/ ({len(df)} 行, {nbytes / 1024:.1f} KB)")
+        return market_store.load_bars(stock_code)
     
-    headers = {"User-Agent": "Mozilla/5.0"}
-    source_info = SOURCES[source]
-    
-    for attempt in range(3):
-        try:
-            response = requests.get(
-                source_info["url"], 
-                params=source_info["params"], 
-                headers=headers, 
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                parser = globals()[source_info["parser"]]
-                df = parser(response.text)
-                
-                if df is not None and len(df) > 0:
-                    # 保存到CSV
-                    df.to_csv(csv_path, index=False)
-                    print(f"✅ 保存到: {csv_path} ({len(df)} 行)")
-                    return df
-                    
-        except Exception as e:
-            print(f"   尝试 {attempt+1}/3 失败: {e}")
-            time.sleep(2)
-    
-    # 3. 失败时尝试使用旧缓存
-    if os.path.exists(csv_path):
-        print(f"⚠️ API失败，使用旧缓存: {csv_path}")
-        return pd.read_csv(csv_path)
+    # 4. 失败时尝试使用旧缓存
+    df = market_store.load_bars(stock_code)
+    if df is not None:
+        print(f"⚠️ API失败，使用旧缓存: {stock_code} ({len(df)} 行)")
+        return df
     
     print(f"❌ 无法获取 {stock_code} 数据")
     return None
 
+def refresh_stocks(stock_codes, source="tencent"):
+    """批量日常刷新（增量，共享下载器线程池并发），返回成功数量"""
+    results = get_fetcher().map(lambda code: get_stock_data(code, source), stock_codes)
+    return sum(1 for df in results if df is not None)
+
 def list_cached_stocks():
     """列出已缓存的股票"""
-    print(f"\n📁 {DATA_DIR}/ 缓存的股票数据:")
+    print(f"\n📁 {market_store.STORE_DIR}/ 缓存的股票数据:")
     print("-" * 40)
     
-    for f in os.listdir(DATA_DIR):
-        if f.endswith('.csv'):
-            df = pd.read_csv(f"{DATA_DIR}/{f}")
-            if len(df) > 0:
-                last_date = df['date'].max()
-                print(f"  {f.replace('.csv','')}: {len(df)} 行, 最新: {last_date}")
+    for code in market_store.list_codes():
+        meta = market_store.read_meta(code)
+        if meta['rows'] > 0:
+            print(f"  {code}: {meta['rows']} 行, 最新: {meta['last_date']}")
     
     print()
 
@@ -9,6 +9,8 @@ import pandas as pd
 import time
 from typing import Dict, Optional, List
 
+from kline_parser import parse_kline_frame
+
 class StockCodeValidator:
     """股票代码验证器"""
     
@@ -166,26 +168,7 @@ class StockCodeValidator:
             
             response = requests.get(url, params=params, headers=self.headers, timeout=30)
             if response.status_code == 200 and 'qfqday' in response.text:
-                json_str = response.text.split('=', 1)[1]
-                data = eval(json_str)
-                
-                if data.get('code') == 0:
-                    klines = data['data'][market_code]['qfqday']
-                    
-                    records = []
-                    for k in klines:
-                        if len(k) >= 6:
-                            records.append({
-                                'date': k[0],
-                                'open': float(k[1]),
-                                'close': float(k[2]),
-                                'high': float(k[3]),
-                                'low': float(k[4]),
-                                'volume': float(k[5]) * 100
-                            })
-                    
-                    df = pd.DataFrame(records[::-1])
-                    return df
+                return parse_kline_frame(response.text, market_code)
         
         except Exception as e:
             print(f"获取数据失败: {e}")
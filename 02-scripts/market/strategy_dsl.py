@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+声明式策略规则：表达式对象 -> NumPy 布尔掩码
+
+规则用 Python 表达式对象书写，列名即指标名（见 indicators）或数据里已有的列：
+
+    from strategy_dsl import col, Rule
+    vc, close, ma5 = col("vol_change"), col("close"), col("price_ma5")
+    rule = Rule("放量突破", (vc > 0.3) & (close > ma5))
+
+evaluate() 一次求值一组规则：
+- 所有规则里结构相同的子表达式（如 vol_change > 0.3、close > price_ma20）只算一次
+- 数据里没有的指标列统一交给 indicators.compute 一次算出
+- 输入可以是一维（单只股票）或二维（交易日 × 股票）；DataFrame / dict / Panel / Stacked 均可
+
+内置规则：STRATEGIES（15 个量价策略）、WATCHLIST_TIERS（盘前观察 / 确认 / 进攻三仓条件）
+
+基准:
+    python3 strategy_dsl.py --bench --symbols 5000 --bars 500
+"""
+
+import argparse
+import operator
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+import indicators
+
+
+# ========== 表达式 ==========
+class Expr:
+    """表达式节点；key 为结构化的唯一标识，结构相同的节点 key 相同"""
+
+    key: tuple = ()
+
+    def _eval(self, ev: "Evaluator") -> np.ndarray:
+        raise NotImplementedError
+
+    def columns(self) -> List[str]:
+        """引用到的列名"""
+        out = []
+        for c in self._children():
+            for name in c.columns():
+                if name not in out:
+                    out.append(name)
+        return out
+
+    def _children(self) -> tuple:
+        return ()
+
+    def __repr__(self):
+        return f"Expr{self.key}"
+
+    # 比较
+    def __gt__(self, other): return Op(">", self, other)
+    def __ge__(self, other): return Op(">=", self, other)
+    def __lt__(self, other): return Op("<", self, other)
+    def __le__(self, other): return Op("<=", self, other)
+    def __eq__(self, other): return Op("==", self, other)
+    def __ne__(self, other): return Op("!=", self, other)
+    __hash__ = None
+
+    # 逻辑
+    def __and__(self, other): return Op("&", self, other)
+    def __or__(self, other): return Op("|", self, other)
+    def __invert__(self): return Op("~", self)
+
+    # 算术
+    def __add__(self, other): return Op("+", self, other)
+    def __sub__(self, other): return Op("-", self, other)
+    def __mul__(self, other): return Op("*", self, other)
+    def __truediv__(self, other): return Op("/", self, other)
+    def __neg__(self): return Op("neg", self)
+    def __abs__(self): return Op("abs", self)
+
+    def shift(self, n: int = 1) -> "Expr":
+        """同 pandas shift（axis 0 为时间）；布尔表达式移出的位置为 False"""
+        return Shift(self, n)
+
+
+class Col(Expr):
+    def __init__(self, name: str):
+        self.name = name
+        self.key = ("col", name)
+
+    def columns(self):
+        return [self.name]
+
+    def _eval(self, ev):
+        return ev.column(self.name)
+
+    def __repr__(self):
+        return self.name
+
+
+class Const(Expr):
+    def __init__(self, value):
+        self.value = value
+        self.key = ("const", value)
+
+    def _eval(self, ev):
+        return self.value
+
+    def __repr__(self):
+        return repr(self.value)
+
+
+_BINARY = {
+    ">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le,
+    "==": operator.eq, "!=": operator.ne,
+    "&": operator.and_, "|": operator.or_,
+    "+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv,
+}
+_UNARY = {"~": operator.invert, "neg": operator.neg, "abs": np.abs}
+_COMMUTATIVE = {"&", "|", "+", "*", "==", "!="}
+
+
+def _wrap(x) -> Expr:
+    return x if isinstance(x, Expr) else Const(x)
+
+
+class Op(Expr):
+    def __init__(self, op: str, *args):
+        self.op = op
+        self.args = tuple(_wrap(a) for a in args)
+        keys = [a.key for a in self.args]
+        if op in _COMMUTATIVE:
+            keys.sort(key=repr)  # a & b 与 b & a 视为同一节点
+        self.key = (op, *keys)
+
+    def _children(self):
+        return self.args
+
+    def _eval(self, ev):
+        vals = [ev(a) for a in self.args]
+        if self.op in _UNARY:
+            return _UNARY[self.op](vals[0])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return _BINARY[self.op](*vals)
+
+    def __repr__(self):
+        if self.op in _UNARY:
+            return f"{self.op}({self.args[0]!r})"
+        return f"({self.args[0]!r} {self.op} {self.args[1]!r})"
+
+
+class Shift(Expr):
+    def __init__(self, expr: Expr, n: int):
+        self.expr, self.n = expr, n
+        self.key = ("shift", n, expr.key)
+
+    def _children(self):
+        return (self.expr,)
+
+    def _eval(self, ev):
+        x = np.asarray(ev(self.expr))
+        if x.dtype != bool:
+            return indicators.shift(x, self.n)
+        out = np.zeros_like(x)
+        if self.n > 0:
+            out[self.n:] = x[:-self.n]
+        elif self.n < 0:
+            out[:self.n] = x[-self.n:]
+        else:
+            out[:] = x
+        return out
+
+    def __repr__(self):
+        return f"{self.expr!r}.shift({self.n})"
+
+
+def col(name: str) -> Col:
+    return Col(name)
+
+
+@dataclass(eq=False)
+class Rule:
+    name: str
+    expr: Expr
+    hold_days: int = 5
+
+
+# ========== 求值 ==========
+def _lookup(columns, name: str):
+    data = getattr(columns, "data", None)  # Panel / Stacked
+    src = data if isinstance(data, dict) else columns
+    try:
+        return src[name]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+class Evaluator:
+    """带记忆的求值器：同一 key 的节点只计算一次"""
+
+    def __init__(self, columns, refs: Dict[tuple, int] = None):
+        self._columns = columns
+        self._extra: Dict[str, np.ndarray] = {}
+        self.memo: Dict[tuple, np.ndarray] = {}
+        self.refs = dict(refs or {})  # 节点剩余使用次数，用完即从 memo 释放
+        self.computed = 0
+        self.reused = 0
+
+    def prepare(self, names: Iterable[str]):
+        """数据里缺的指标一次性交给 indicators.compute"""
+        missing = [n for n in names if _lookup(self._columns, n) is None]
+        if not missing:
+            return
+        raw = {c: np.asarray(_lookup(self._columns, c), dtype=np.float64)
+               for c in indicators.required_columns(missing)}
+        self._extra.update(indicators.compute(raw, missing))
+
+    def column(self, name: str) -> np.ndarray:
+        if name in self._extra:
+            return self._extra[name]
+        v = _lookup(self._columns, name)
+        if v is None:
+            raise KeyError(f"缺少列: {name}")
+        return np.asarray(v)
+
+    def __call__(self, expr: Expr):
+        k = expr.key
+        if k in self.memo:
+            self.reused += 1
+            v = self.memo[k]
+        else:
+            v = expr._eval(self)
+            self.memo[k] = v
+            self.computed += 1
+        if k in self.refs:
+            self.refs[k] -= 1
+            if self.refs[k] <= 0:
+                del self.memo[k]
+        return v
+
+
+def _count_refs(exprs: Iterable[Expr]) -> Dict[tuple, int]:
+    """整组规则展开成 DAG 后，每个节点被引用的次数（根节点各算一次）"""
+    refs: Dict[tuple, int] = {}
+    stack = list(exprs)
+    for e in stack:
+        refs[e.key] = refs.get(e.key, 0) + 1
+    seen = set()
+    while stack:
+        e = stack.pop()
+        if e.key in seen:
+            continue
+        seen.add(e.key)
+        for c in e._children():
+            refs[c.key] = refs.get(c.key, 0) + 1
+            stack.append(c)
+    return refs
+
+
+def evaluate(rules: Iterable[Rule], columns, share: bool = True) -> Dict[str, np.ndarray]:
+    """
+    求值一组规则
+
+    Args:
+        rules: Rule 列表
+        columns: 列名 -> 数组（DataFrame / dict / market_store.Panel / indicators.Stacked）
+        share: False 时每条规则各自求值（仅用于基准对比）
+
+    Returns:
+        {规则名: 布尔数组}，形状与输入列相同；NaN 参与的比较为 False（同 pandas）
+    """
+    rules = list(rules)
+    names = []
+    for r in rules:
+        for n in r.expr.columns():
+            if n not in names:
+                names.append(n)
+    ev = Evaluator(columns, _count_refs(r.expr for r in rules) if share else None)
+    ev.prepare(names)
+    out = {}
+    for r in rules:
+        if not share:
+            ev.memo.clear()
+        out[r.name] = np.asarray(ev(r.expr), dtype=bool)
+    return out
+
+
+# ========== 内置规则 ==========
+_close, _vc, _ret = col("close"), col("vol_change"), col("return_d1")
+_ma5, _ma20 = col("price_ma5"), col("price_ma20")
+_up, _big_up, _down = _ret > 0, _ret > 0.02, _ret < 0
+_ma5_above_ma20 = _ma5 > _ma20
+
+STRATEGIES = [
+    Rule("1.放量突破(MA5+30%)", (_vc > 0.3) & (_close > _ma5)),
+    Rule("2.放量+大阳线", (_vc > 0.3) & _big_up),
+    Rule("3.温和放量+上涨", (_vc > 0.1) & (_vc < 0.5) & _up),
+    Rule("4.缩量企稳", (_vc < -0.3) & (_close > _ma20)),
+    Rule("5.地量+MA20支撑", (_vc < -0.5) & (_close > _ma20) & (_close < _ma5)),
+    Rule("6.量价齐升", (_vc > 0.2) & _up & _ma5_above_ma20),
+    Rule("7.放量杀跌抄底", (_vc > 0.5) & _down),
+    Rule("8.高位放量逃顶", (_vc > 0.5) & (_close > _ma20) & _down),
+    Rule("9.MA5金叉MA20+放量", _ma5_above_ma20 & ~_ma5_above_ma20.shift(1) & (_vc > 0.2)),
+    Rule("10.放量十字星", (_vc > 0.4) & (abs(_ret) < 0.005)),
+    Rule("11.强势股缩量(MA20上方+缩量)", (_close > _ma20) & (_vc < -0.2)),
+    Rule("12.放量过前高", (_vc > 0.3) & (_close > _close.shift(20))),
+    Rule("13.底部放量反弹", (_vc > 0.5) & (_close < _ma20) & _up),
+    Rule("14.价跌量缩(止跌信号)", _down & (_vc < -0.2)),
+    Rule("15.量价背离(看跌)", _up & (_vc < -0.2)),
+]
+
+# 盘前三仓条件（generate_preopen_watchlist 的候选表列；排序与名额由调用方处理）
+_chg, _turnover, _vr = col("chg"), col("turnover"), col("vol_ratio5")
+_ex_index, _ex_sector, _rsi = col("excess_vs_index"), col("excess_vs_sector"), col("rsi14")
+
+WATCHLIST_TIERS = [
+    Rule("observe", (_chg >= 2.0) & (_turnover >= 2.0) & (_turnover <= 15.0)
+         & (_vr >= 0.9) & (_vr <= 4.0) & (_ex_index >= 1.5)),
+    Rule("confirm", (_ex_index >= 3.0) & (_ex_sector >= 2.0) & col("macd_ok")
+         & (_rsi >= 55) & (_rsi <= 85) & (_vr >= 1.0)),
+    Rule("attack", (_chg >= 7.0) & (_turnover >= 5.0) & (_turnover <= 15.0)),
+]
+
+
+# ========== 基准 ==========
+def run_bench(symbols: int, bars: int):
+    rng = np.random.default_rng(0)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (bars, symbols)), axis=0))
+    volume = rng.lognormal(12, 0.5, close.shape)
+    data = {"close": close, "volume": volume}
+    data.update(indicators.compute(data, ["vol_change", "return_d1", "price_ma5", "price_ma20"]))
+    tiers = {
+        "chg": rng.normal(1, 3, close.shape), "turnover": rng.uniform(0, 20, close.shape),
+        "vol_ratio5": rng.uniform(0.5, 3, close.shape), "excess_vs_index": rng.normal(1, 3, close.shape),
+        "excess_vs_sector": rng.normal(1, 3, close.shape), "macd_ok": rng.random(close.shape) > 0.5,
+        "rsi14": rng.uniform(20, 90, close.shape),
+    }
+    data.update(tiers)
+    rules = STRATEGIES + WATCHLIST_TIERS
+
+    evaluate(rules, data)  # 预热
+    t0 = time.perf_counter()
+    shared = evaluate(rules, data)
+    t_shared = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    separate = evaluate(rules, data, share=False)
+    t_separate = time.perf_counter() - t0
+    assert all(np.array_equal(shared[k], separate[k]) for k in shared)
+
+    ev = Evaluator(data, _count_refs(r.expr for r in rules))
+    for r in rules:
+        ev(r.expr)
+    print(f"{bars} 日 × {symbols} 只，{len(rules)} 条规则")
+    print(f"  共享子表达式: {t_shared:.2f}s（计算 {ev.computed} 个节点，复用 {ev.reused} 次）")
+    print(f"  逐条独立求值: {t_separate:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="策略规则 DSL")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--symbols", type=int, default=5000)
+    parser.add_argument("--bars", type=int, default=500)
+    args = parser.parse_args()
+    if args.bench:
+        run_bench(args.symbols, args.bars)
+    else:
+        for r in STRATEGIES + WATCHLIST_TIERS:
+            print(f"{r.name:<28} {r.expr!r}")
@@ -1,17 +1,30 @@
 #!/usr/bin/env python3
 """
 量价策略库 - 综合回测
-用真实数据验证多种策略，按胜率排序
+用真实数据验证多种策略，按胜率排序（样本内）
+
+    python3 strategy_ranker.py                    # 样本内排名
+    python3 strategy_ranker.py --walk-forward     # 滚动样本外评估 + 胜率置信区间
 """
 
+import sys
+
 import pandas as pd
-import numpy as np
+
+import indicators
+import market_store
+import strategy_dsl
+import walk_forward
 
 # ========== 加载数据 ==========
-DATA_PATH = "stock_data/600519.csv"
-df = pd.read_csv(DATA_PATH)
-df['date'] = pd.to_datetime(df['date'])
-df = df.sort_values('date').reset_index(drop=True)
+STOCK_CODE = "600519"
+
+# --walk-forward：滚动训练/测试窗的样本外评估（见 walk_forward.py），其余参数原样传过去
+if "--walk-forward" in sys.argv[1:]:
+    walk_forward.main([a for a in sys.argv[1:] if a != "--walk-forward"], codes=[STOCK_CODE])
+    sys.exit(0)
+
+df = market_store.load_bars(STOCK_CODE)
 
 print("=" * 70)
 print(f"📊 贵州茅台量价策略回测")
@@ -20,33 +33,13 @@ print(f"   时间: {df['date'].min().strftime('%Y-%m-%d')} ~ {df['date'].max().s
 print("=" * 70)
 
 # ========== 预处理 ==========
-# 计算基础指标
-df['volume_ma5'] = df['volume'].rolling(5).mean()
-df['volume_ma10'] = df['volume'].rolling(10).mean()
-df['price_ma5'] = df['close'].rolling(5).mean()
-df['price_ma20'] = df['close'].rolling(20).mean()
-
-# 成交量变化率
-df['vol_change'] = (df['volume'] - df['volume_ma5']) / df['volume_ma5']
-df['vol_change10'] = (df['volume'] - df['volume_ma10']) / df['volume_ma10']
-
-# 价格变化
-df['return_d1'] = df['close'].pct_change(1)  # 当日涨幅
-df['return_d5'] = df['close'].pct_change(5)  # 5日涨幅
-df['return_future'] = df['close'].pct_change(-5)  # 未来5日涨幅
-
-# 涨跌标记
-df['is_up'] = df['return_d1'] > 0
-df['is_down'] = df['return_d1'] < 0
-df['is_big_up'] = df['return_d1'] > 0.02  # 大阳线 >2%
-df['is_big_down'] = df['return_d1'] < -0.02  # 大阴线 >-2%
-
-# 均线状态
-df['above_ma5'] = df['close'] > df['price_ma5']
-df['above_ma20'] = df['close'] > df['price_ma20']
-df['ma5_above_ma20'] = df['price_ma5'] > df['price_ma20']  # 金叉状态
+# 计算基础指标 / 成交量变化率 / 价格变化（return_future 为未来5日收益）
+indicators.add_indicators(df, ['volume_ma5', 'volume_ma10', 'price_ma5', 'price_ma20',
+                               'vol_change', 'vol_change10', 'return_d1', 'return_d5'], key=STOCK_CODE)
+indicators.add_indicators(df, {'return_future': 'return_f5'}, key=STOCK_CODE)
 
 # ========== 策略定义 ==========
+# 15 个策略的规则见 strategy_dsl.STRATEGIES，共用的子条件（放量、站上均线等）只算一次
 strategies = []
 
 def add_strategy(name, signal_condition, hold_days=5):
@@ -57,67 +50,9 @@ def add_strategy(name, signal_condition, hold_days=5):
         'hold_days': hold_days
     })
 
-# ========== 策略库 ==========
-
-# 1. 放量突破
-add_strategy("1.放量突破(MA5+30%)", 
-    (df['vol_change'] > 0.3) & (df['close'] > df['price_ma5']))
-
-# 2. 放量+大阳线
-add_strategy("2.放量+大阳线", 
-    (df['vol_change'] > 0.3) & (df['is_big_up']))
-
-# 3. 温和放量+上涨
-add_strategy("3.温和放量+上涨", 
-    (df['vol_change'] > 0.1) & (df['vol_change'] < 0.5) & (df['is_up']))
-
-# 4. 缩量企稳
-add_strategy("4.缩量企稳", 
-    (df['vol_change'] < -0.3) & (df['close'] > df['price_ma20']))
-
-# 5. 地量+底部
-add_strategy("5.地量+MA20支撑", 
-    (df['vol_change'] < -0.5) & (df['close'] > df['price_ma20']) & (df['close'] < df['price_ma5']))
-
-# 6. 量价齐升
-add_strategy("6.量价齐升", 
-    (df['vol_change'] > 0.2) & (df['is_up']) & (df['ma5_above_ma20']))
-
-# 7. 放量杀跌(抄底)
-add_strategy("7.放量杀跌抄底", 
-    (df['vol_change'] > 0.5) & (df['is_down']))
-
-# 8. 高位放量(逃顶)
-add_strategy("8.高位放量逃顶", 
-    (df['vol_change'] > 0.5) & (df['close'] > df['price_ma20']) & (df['is_down']))
-
-# 9. 均线金叉+放量
-add_strategy("9.MA5金叉MA20+放量", 
-    (df['ma5_above_ma20']) & (df.shift(1)['ma5_above_ma20'] == False) & (df['vol_change'] > 0.2))
-
-# 10. 放量十字星
-add_strategy("10.放量十字星", 
-    (df['vol_change'] > 0.4) & (np.abs(df['return_d1']) < 0.005))
-
-# 11. 强势股缩量
-add_strategy("11.强势股缩量(MA20上方+缩量)", 
-    (df['above_ma20']) & (df['vol_change'] < -0.2))
-
-# 12. 放量过前高
-add_strategy("12.放量过前高", 
-    (df['vol_change'] > 0.3) & (df['close'] > df['close'].shift(20)))
-
-# 13. 底部放量
-add_strategy("13.底部放量反弹", 
-    (df['vol_change'] > 0.5) & (df['close'] < df['price_ma20']) & (df['is_up']))
-
-# 14. 价跌量缩(止跌)
-add_strategy("14.价跌量缩(止跌信号)", 
-    (df['is_down']) & (df['vol_change'] < -0.2))
-
-# 15. 量价背离(上涨缩量)
-add_strategy("15.量价背离(看跌)", 
-    (df['is_up']) & (df['vol_change'] < -0.2))
+masks = strategy_dsl.evaluate(strategy_dsl.STRATEGIES, df)
+for rule in strategy_dsl.STRATEGIES:
+    add_strategy(rule.name, pd.Series(masks[rule.name], index=df.index), rule.hold_days)
 
 # ========== 回测函数 ==========
 def backtest(strategy, df):
@@ -126,7 +61,7 @@ def backtest(strategy, df):
     hold_days = strategy['hold_days']
     
     # 计算未来收益
-    future_return = df['close'].pct_change(-hold_days)
+    future_return = pd.Series(indicators.forward_return(df['close'].to_numpy(), hold_days), index=df.index)
     
     # 信号次日生效
     valid_signal = signal.shift(1)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+腾讯 fqkline 并发批量下载器
+
+- 共享 requests.Session 连接池（HTTP keep-alive，避免每只股票重新握手）
+- 令牌桶限速 + 每个 host 的并发上限
+- 有界线程池并发
+- 失败重试：指数退避 + 随机抖动（429 / 5xx / 网络异常）
+
+用法:
+    from tencent_fetcher import get_fetcher, market_code
+    texts = get_fetcher().fetch_klines([market_code(c) for c in codes], count=250)
+
+离线压测（本地替身服务器，见 tencent_stub_server.py）:
+    python3 tencent_fetcher.py --bench --n 300 --latency 0.05
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ========== 配置 ==========
+KLINE_URL = os.environ.get("TENCENT_KLINE_URL", "https://web.ifzq.gtimg.cn/appstock/app/fqkline/get")
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+MAX_WORKERS = 16       # 线程池大小
+RATE = 30.0            # 每个 host 每秒请求数
+BURST = 30             # 令牌桶容量
+PER_HOST = 8           # 每个 host 同时在途请求上限
+RETRIES = 3
+BACKOFF = 0.5          # 退避基数（秒）
+BACKOFF_CAP = 8.0
+TIMEOUT = 20
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+# 代码前缀 -> 腾讯市场前缀（按顺序匹配；9 开头只有 900 是沪市 B股，92 属北交所）
+MARKET_PREFIXES = (
+    (("92", "8", "4"), "bj"),         # 北交所（含 920 新代码段）
+    (("900", "5", "6"), "sh"),        # 沪市 A股 / 科创板 / 基金 / B股
+    (("00", "20", "30", "1"), "sz"),  # 深市 A股 / B股 / 创业板 / 基金
+)
+
+
+def market_code(code: str) -> str:
+    """6位代码 -> 腾讯市场代码（sh/sz/bj 前缀）；未列出的前缀按深市处理"""
+    for prefixes, market in MARKET_PREFIXES:
+        if code.startswith(prefixes):
+            return f"{market}{code}"
+    return f"sz{code}"
+
+
+class TokenBucket:
+    """线程安全令牌桶"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class KlineFetcher:
+    """连接池 + 限速 + 重试 的共享下载器"""
+
+    def __init__(self, base_url: str = KLINE_URL, max_workers: int = MAX_WORKERS,
+                 rate: float = RATE, burst: int = BURST, per_host: int = PER_HOST,
+                 retries: int = RETRIES, timeout: float = TIMEOUT):
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.rate = rate
+        self.burst = burst
+        self.per_host = per_host
+        self.retries = retries
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "failed": 0, "bytes": 0}
+        self._stats_lock = threading.Lock()
+
+    def _host_limits(self, url: str):
+        host = urlparse(url).netloc
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = (TokenBucket(self.rate, self.burst), threading.BoundedSemaphore(self.per_host))
+            return self._hosts[host]
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def get(self, url: str, params: Optional[dict] = None) -> Optional[requests.Response]:
+        """带限速与重试的 GET，最终失败返回 None"""
+        bucket, slots = self._host_limits(url)
+        for attempt in range(self.retries):
+            if attempt:
+                self._count("retries")
+                time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF * 2 ** attempt)))
+            bucket.acquire()
+            try:
+                with slots:
+                    resp = self.session.get(url, params=params, timeout=self.timeout)
+                self._count("requests")
+                if resp.status_code in RETRY_STATUS:
+                    continue
+                self._count("bytes", len(resp.content))
+                return resp
+            except requests.RequestException:
+                self._count("requests")
+                continue
+        self._count("failed")
+        return None
+
+    def fetch_kline(self, mcode: str, count: int = 250, start: str = "", fq: str = "qfq") -> Optional[str]:
+        """
+        单只股票日K原始响应文本（JSONP）
+
+        Args:
+            mcode: 腾讯市场代码，如 'sh600519'
+            count: 最多返回条数
+            start: 起始日期 'YYYY-MM-DD'（含），为空取最近 count 条
+        """
+        params = {"_var": f"kline_day{fq}", "param": f"{mcode},day,{start},,{count},{fq}"}
+        resp = self.get(self.base_url, params)
+        if resp is None or resp.status_code != 200:
+            return None
+        return resp.text
+
+    def map(self, fn: Callable, items: Iterable) -> List:
+        """在有界线程池中并发执行 fn(item)，结果按输入顺序返回"""
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as pool:
+            return list(pool.map(fn, items))
+
+    def fetch_klines(self, mcodes: Iterable[str], count: int = 250, start: str = "",
+                     fq: str = "qfq") -> Dict[str, Optional[str]]:
+        """批量并发下载，返回 {市场代码: 响应文本或 None}"""
+        mcodes = list(mcodes)
+        texts = self.map(lambda m: self.fetch_kline(m, count, start, fq), mcodes)
+        return dict(zip(mcodes, texts))
+
+
+_FETCHER = None
+_FETCHER_LOCK = threading.Lock()
+
+
+def get_fetcher() -> KlineFetcher:
+    """进程内共享的下载器（共享连接池与限速状态）"""
+    global _FETCHER
+    with _FETCHER_LOCK:
+        if _FETCHER is None:
+            _FETCHER = KlineFetcher()
+        return _FETCHER
+
+
+def run_bench(n: int, latency: float, fail_rate: float, rate: float, workers: int):
+    """对本地替身服务器压测，对比旧的串行 + sleep(0.8) 方案"""
+    from tencent_stub_server import start_stub_server
+
+    server, base_url = start_stub_server(latency=latency, fail_rate=fail_rate)
+    try:
+        codes = [market_code(f"{600000 + i:06d}") for i in range(n)]
+        fetcher = KlineFetcher(base_url=base_url, max_workers=workers, rate=rate, burst=int(rate))
+
+        t0 = time.perf_counter()
+        texts = fetcher.fetch_klines(codes, count=250)
+        elapsed = time.perf_counter() - t0
+
+        ok = sum(1 for t in texts.values() if t)
+        print("=" * 60)
+        print(f"📊 并发下载压测: {n} 只, 服务端延迟 {latency * 1000:.0f}ms, 失败率 {fail_rate:.0%}")
+        print("=" * 60)
+        print(f"成功: {ok}/{n}  重试: {fetcher.stats['retries']}  失败: {fetcher.stats['failed']}")
+        print(f"耗时: {elapsed:.2f}s  ({n / elapsed:.1f} 只/秒, {fetcher.stats['bytes'] / 1024:.0f} KB)")
+        legacy = n * (latency + 0.8) + (n // 10 - 1) * 30 if n > 10 else n * (latency + 0.8)
+        print(f"旧方案估算（串行 + 0.8s/只 + 30s/批）: {legacy:.0f}s")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="腾讯 fqkline 并发下载器")
+    ap.add_argument("--bench", action="store_true", help="对本地替身服务器压测")
+    ap.add_argument("--n", type=int, default=300)
+    ap.add_argument("--latency", type=float, default=0.05, help="替身服务器单请求延迟（秒）")
+    ap.add_argument("--fail-rate", type=float, default=0.02, help="替身服务器随机 503 比例")
+    ap.add_argument("--rate", type=float, default=RATE)
+    ap.add_argument("--workers", type=int, default=MAX_WORKERS)
+    args = ap.parse_args()
+
+    if args.bench:
+        run_bench(args.n, args.latency, args.fail_rate, args.rate, args.workers)
+    else:
+        ap.print_help()
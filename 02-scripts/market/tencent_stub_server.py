@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+腾讯 fqkline 本地替身服务器（离线压测 / 回放用）
+
+按请求参数生成确定性的合成日K（同一代码每次结果相同），响应格式与
+web.ifzq.gtimg.cn/appstock/app/fqkline/get 一致：
+    kline_dayqfq={"code":0,"msg":"","data":{"sh600519":{"qfqday":[[日期,开,收,高,低,量],...]}}}
+
+用法:
+    python3 tencent_stub_server.py --port 8765 --latency 0.05
+    TENCENT_KLINE_URL=http://127.0.0.1:8765/appstock/app/fqkline/get python3 hs300_batch.py
+
+代码中:
+    server, base_url = start_stub_server(latency=0.05)
+    ...
+    server.shutdown()
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+KLINE_PATH = "/appstock/app/fqkline/get"
+
+
+@lru_cache(maxsize=4096)
+def _synth_history(mcode: str, end_day: date):
+    rng = random.Random(zlib.crc32(mcode.encode()))
+    days = []
+    d = end_day
+    while len(days) < 800:
+        if d.weekday() < 5:
+            days.append(d)
+        d -= timedelta(days=1)
+    days.reverse()
+
+    price = 5 + rng.random() * 50
+    rows = []
+    for day in days:
+        o = price * (1 + rng.gauss(0, 0.005))
+        c = o * (1 + rng.gauss(0, 0.02))
+        h = max(o, c) * (1 + abs(rng.gauss(0, 0.005)))
+        l = min(o, c) * (1 - abs(rng.gauss(0, 0.005)))
+        vol = rng.randint(20000, 400000)
+        rows.append([day.isoformat(), f"{o:.3f}", f"{c:.3f}", f"{h:.3f}", f"{l:.3f}", f"{vol}.000"])
+        price = c
+    return rows
+
+
+def synth_klines(mcode: str, count: int, start: str = "", end_day: date = None):
+    """确定性合成K线（按代码做种子的随机游走），日期为工作日"""
+    rows = _synth_history(mcode, end_day or date.today())
+    if start:
+        rows = [r for r in rows if r[0] >= start]
+    return rows[-count:] if count else rows
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    fail_rate = 0.0
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != KLINE_PATH:
+            self.send_error(404)
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_rate and random.random() < self.fail_rate:
+            self.send_error(503)
+            return
+
+        qs = parse_qs(url.query)
+        var = qs.get("_var", ["kline_dayqfq"])[0]
+        parts = (qs.get("param", [""])[0].split(",") + [""] * 6)[:6]
+        mcode, start, count, fq = parts[0], parts[2], parts[4], parts[5] or "qfq"
+        count = int(count) if count.isdigit() else 320
+
+        data = {mcode: {f"{fq}day" if fq else "day": synth_klines(mcode, count, start)}}
+        body = f"{var}=" + json.dumps({"code": 0, "msg": "", "data": data}, separators=(",", ":"))
+        raw = body.encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, fail_rate: float = 0.0):
+    """
+    后台线程启动替身服务器
+
+    Returns:
+        (server, base_url)：base_url 可直接作为 KlineFetcher(base_url=...)
+    """
+    handler = type("Handler", (StubHandler,), {"latency": latency, "fail_rate": fail_rate})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}{KLINE_PATH}"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="腾讯 fqkline 本地替身服务器")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    args = ap.parse_args()
+
+    server, base_url = start_stub_server(args.host, args.port, args.latency, args.fail_rate)
+    print(f"🧪 替身服务器: {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
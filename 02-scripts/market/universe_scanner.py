@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+全市场横截面扫描器
+
+- 股票池：新浪 hs_a 节点的全部沪深A股（约 5000 只），代码 / 名称缓存到 stock_data/universe.json
+- 日线：market_store 本地存储（--sync 用共享下载器增量刷新）
+- 指标一次加载、计算成 (K线 × 股票) 矩阵，只保留最近 SCAN_BARS 根参与扫描；
+  任意一组 strategy_dsl 规则在全部股票上一次求值，取各股最新一根K线
+- 排序用 argpartition 取前 k，不做全量排序
+
+盘前三仓（--tiers）在全市场上复用 strategy_dsl.WATCHLIST_TIERS：涨幅 / 量比 / MACD / RSI 来自本地日线，
+指数涨幅取全体股票等权平均；板块涨幅取 sector_index（--spot 时用实时涨幅按成分现算等权板块涨幅，
+否则取最新交易日的板块指数），不在任何板块的退回指数口径；
+--spot 时用新浪实时快照覆盖涨幅与换手率，否则换手率条件按满足处理。
+
+用法:
+    python3 universe_scanner.py --refresh-universe --sync       # 更新股票池与本地日线
+    python3 universe_scanner.py --strategy 1.放量突破(MA5+30%) --rank vol_change --top 20
+    python3 universe_scanner.py --tiers --spot
+    python3 universe_scanner.py --bench --symbols 5000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import indicators
+import market_store
+import sector_index
+import strategy_dsl
+from tencent_fetcher import get_fetcher
+
+# ========== 配置 ==========
+UNIVERSE_PATH = os.path.join(market_store.LEGACY_DIR, "universe.json")
+SPOT_URL = "https://vip.stock.finance.sina.com.cn/quotes_service/api/json_v2.php/Market_Center.getHQNodeData"
+SPOT_NODE = "hs_a"
+PAGE_SIZE = 100
+MAX_SHRINK = 0.1    # 新股票池比现有的少超过 10% 时视为拉取不全，不覆盖（--force 强制）
+
+LOOKBACK = 120      # 每只股票加载的K线数（指标预热）
+SCAN_BARS = 30      # 扫描时保留的最近K线数（需 ≥ 规则里最大 shift + 1）
+TOP_K = 20
+NEUTRAL_TURNOVER = 5.0
+
+INDICATOR_NAMES = ["return_d1", "vol_change", "price_ma5", "price_ma20", "dif", "dea", "rsi14"]
+RAW_COLUMNS = ["close", "high", "volume"]
+
+
+# ========== 股票池 ==========
+def fetch_spot(node: str = SPOT_NODE) -> pd.DataFrame:
+    """新浪节点全部个股的实时快照（分页拉取）；任一页请求失败时整体作废，返回空表"""
+    fetcher = get_fetcher()
+    rows, page = [], 1
+    while True:
+        params = {"page": str(page), "num": str(PAGE_SIZE), "sort": "symbol", "asc": "1",
+                  "node": node, "symbol": "", "_s_r_a": "page"}
+        resp = fetcher.get(SPOT_URL, params)
+        try:
+            arr = resp.json() if resp is not None else False
+        except ValueError:
+            arr = False
+        if arr is None and page > 1:  # 翻过最后一页（总数恰为整页倍数）返回 null
+            break
+        if not isinstance(arr, list):
+            rows = []
+            break
+        rows.extend(arr)
+        if len(arr) < PAGE_SIZE:
+            break
+        page += 1
+
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return pd.DataFrame(columns=["code", "name", "chg", "turnover", "amount", "trade"])
+    out = pd.DataFrame({"code": df["code"].astype(str), "name": df["name"].astype(str)})
+    for dst, src in [("chg", "changepercent"), ("turnover", "turnoverratio"), ("amount", "amount"), ("trade", "trade")]:
+        out[dst] = pd.to_numeric(df.get(src), errors="coerce")
+    return out.drop_duplicates("code").reset_index(drop=True)
+
+
+def save_universe(spot: pd.DataFrame, path: str = UNIVERSE_PATH, force: bool = False) -> bool:
+    """写入股票池；比现有股票池缩水超过 MAX_SHRINK 时不覆盖（除非 force），返回是否写入"""
+    if not force and os.path.exists(path):
+        old = len(load_universe(path))
+        if len(spot) < old * (1 - MAX_SHRINK):
+            print(f"⚠️ 新股票池 {len(spot)} 只，比现有 {old} 只缩水超过 {MAX_SHRINK:.0%}，未覆盖（--force 强制）")
+            return False
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(dict(zip(spot["code"], spot["name"])), f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return True
+
+
+def load_universe(path: str = UNIVERSE_PATH) -> Dict[str, str]:
+    """{代码: 名称}；没有股票池文件时退回本地存储里的全部代码"""
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {c: "" for c in market_store.list_codes()}
+
+
+def sync(codes: Iterable[str]) -> int:
+    """增量刷新本地日线（共享下载器并发）"""
+    import stock_data_manager
+    return stock_data_manager.refresh_stocks(list(codes))
+
+
+# ========== 排序 ==========
+def top_k(values: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    取最大的 k 个下标（从大到小）；mask 为 False 或值为 NaN 的不参与
+
+    argpartition 是 O(N)，只对选出的 k 个排序
+    """
+    key = np.where(np.isnan(values), -np.inf, values)
+    if mask is not None:
+        key = np.where(mask, key, -np.inf)
+    k = min(k, int(np.isfinite(key).sum()))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    idx = np.argpartition(-key, k - 1)[:k]
+    return idx[np.argsort(-key[idx], kind="stable")]
+
+
+# ========== 扫描器 ==========
+class Scanner:
+    """全市场最近 SCAN_BARS 根K线的指标矩阵（右对齐，最后一行是各股最新K线）"""
+
+    def __init__(self, stacked: indicators.Stacked, names: Optional[Dict[str, str]] = None,
+                 scan_bars: int = SCAN_BARS):
+        tail = slice(-scan_bars, None)
+        self.codes = list(stacked.codes)
+        self.names = [(names or {}).get(c, "") for c in self.codes]
+        self.data = {k: v[tail] for k, v in stacked.data.items()}
+        last = stacked.dates[-1] if len(stacked.dates) else np.array([], dtype="datetime64[D]")
+        self.last_date = last
+        self.as_of = last.max() if len(last) else None
+        # 最新K线不是最新交易日的（停牌 / 未更新）不参与
+        self.fresh = last == self.as_of if self.as_of is not None else np.zeros(0, dtype=bool)
+        self._index = {c: i for i, c in enumerate(self.codes)}
+
+    @classmethod
+    def load(cls, codes: Optional[Iterable[str]] = None, bars: int = LOOKBACK,
+             names: Iterable[str] = INDICATOR_NAMES, scan_bars: int = SCAN_BARS) -> "Scanner":
+        universe = load_universe()
+        codes = list(codes) if codes is not None else list(universe)
+        stacked = indicators.compute_stacked(codes, names, bars=bars, columns=RAW_COLUMNS)
+        return cls(stacked, universe, scan_bars)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def align(self, frame: pd.DataFrame, column: str) -> np.ndarray:
+        """把按 code 给出的一列（如实时快照）对齐到扫描器的股票顺序，缺失为 NaN"""
+        out = np.full(len(self.codes), np.nan)
+        idx = frame["code"].map(self._index)
+        ok = idx.notna().to_numpy()
+        out[idx[ok].astype(int).to_numpy()] = pd.to_numeric(frame[column], errors="coerce").to_numpy()[ok]
+        return out
+
+    def latest(self, rules: Iterable[strategy_dsl.Rule], extra: Optional[Dict[str, np.ndarray]] = None
+               ) -> Dict[str, np.ndarray]:
+        """
+        在全部股票上求值一组规则，返回各规则在最新K线上的布尔数组（长度 N）
+
+        Args:
+            extra: 额外的列，二维 (SCAN_BARS × N) 或只有最新一根的一维 (N,)
+        """
+        cols = dict(self.data)
+        for k, v in (extra or {}).items():
+            v = np.asarray(v)
+            if v.ndim == 1:
+                full = np.full(self.data["close"].shape, np.nan if v.dtype.kind == "f" else False, dtype=v.dtype)
+                full[-1] = v
+                v = full
+            cols[k] = v
+        with np.errstate(invalid="ignore"):
+            masks = strategy_dsl.evaluate(rules, cols)
+        return {k: m[-1] & self.fresh for k, m in masks.items()}
+
+    def column(self, name: str) -> np.ndarray:
+        """某指标在最新K线上的值（不新鲜的为 NaN）"""
+        return np.where(self.fresh, self.data[name][-1], np.nan)
+
+    def scan(self, rules: Iterable[strategy_dsl.Rule], rank: np.ndarray, k: int = TOP_K,
+             extra: Optional[Dict[str, np.ndarray]] = None, show: Iterable[str] = ()) -> pd.DataFrame:
+        """
+        同时满足全部规则的股票，按 rank 取前 k
+
+        Returns:
+            DataFrame: code / name / rank / show 中的各列
+        """
+        masks = self.latest(rules, extra)
+        hit = np.logical_and.reduce(list(masks.values())) if masks else self.fresh.copy()
+        idx = top_k(rank, k, hit)
+        out = pd.DataFrame({"code": [self.codes[i] for i in idx], "name": [self.names[i] for i in idx],
+                            "rank": rank[idx]})
+        for name in show:
+            src = (extra or {}).get(name)
+            values = np.asarray(src)[-1] if src is not None and np.ndim(src) == 2 else src
+            out[name] = (values if values is not None else self.column(name))[idx]
+        out.attrs["matched"] = int(hit.sum())
+        return out
+
+    def tier_columns(self, spot: Optional[pd.DataFrame] = None) -> Dict[str, np.ndarray]:
+        """盘前三仓条件需要的列（最新一根），口径同 generate_preopen_watchlist"""
+        chg = self.column("return_d1") * 100
+        turnover = np.full(len(self.codes), NEUTRAL_TURNOVER)
+        if spot is not None and len(spot):
+            live = self.align(spot, "chg")
+            chg = np.where(np.isnan(live), chg, live)
+            live_turnover = self.align(spot, "turnover")
+            turnover = np.where(np.isnan(live_turnover), turnover, live_turnover)
+        with np.errstate(invalid="ignore"):
+            index_chg = np.nanmean(chg) if np.isfinite(chg).any() else 0.0
+            sector_chg = self.sector_chg(chg if spot is not None and len(spot) else None)
+            dif, dea = self.column("dif"), self.column("dea")
+            return {
+                "chg": chg,
+                "turnover": turnover,
+                "vol_ratio5": self.column("vol_change") + 1,
+                "excess_vs_index": chg - index_chg,
+                "excess_vs_sector": chg - np.where(np.isnan(sector_chg), index_chg, sector_chg),
+                "macd_ok": (dif > 0) & (dif > dea),
+                "rsi14": self.column("rsi14"),
+            }
+
+    def sector_chg(self, live_chg: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        各股所属板块涨幅（%，多板块取平均）；没有板块索引或不在任何板块为 NaN
+
+        Args:
+            live_chg: 实时涨幅（%）；给出时按成分现算等权板块涨幅，否则取最新交易日的板块指数
+        """
+        if not os.path.exists(sector_index.db_path()):
+            return np.full(len(self.codes), np.nan)
+        conn = sector_index.connect()
+        try:
+            if live_chg is None:
+                day = market_store.Panel(dates=np.array([self.as_of]), codes=self.codes, data={})
+                return sector_index.sector_chg(day, conn)[0]
+            nodes, _, m = sector_index.membership(conn, self.codes)
+        finally:
+            conn.close()
+        if not nodes:
+            return np.full(len(self.codes), np.nan)
+        ok = np.isfinite(live_chg)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            node_chg = (np.where(ok, live_chg, 0.0) @ m) / (ok.astype(np.float64) @ m)
+            node_ok = np.isfinite(node_chg)
+            return (np.where(node_ok, node_chg, 0.0) @ m.T) / (node_ok.astype(np.float64) @ m.T)
+
+    def tiers(self, spot: Optional[pd.DataFrame] = None) -> Dict[str, pd.DataFrame]:
+        """盘前三仓：观察仓取超额前 10，确认仓取其中前 2，进攻仓取其中涨幅最大 1 只（同盘前脚本）"""
+        cols = self.tier_columns(spot)
+        mainboard = np.array([c.startswith(("60", "00")) for c in self.codes], dtype=bool)
+        not_st = np.array(["ST" not in n.upper() and "退" not in n for n in self.names], dtype=bool)
+        masks = self.latest(strategy_dsl.WATCHLIST_TIERS, cols)
+        show = list(cols)
+
+        def frame(idx, key):
+            out = pd.DataFrame({"code": [self.codes[i] for i in idx], "name": [self.names[i] for i in idx],
+                                "rank": key[idx]})
+            for n in show:
+                out[n] = cols[n][idx]
+            return out
+
+        key = cols["excess_vs_index"] + np.nan_to_num(cols["chg"]) * 1e-6
+        observe = top_k(key, 10, masks["observe"] & mainboard & not_st)
+        confirm = observe[masks["confirm"][observe]][:2]
+        attack = confirm[masks["attack"][confirm]]
+        attack = attack[top_k(cols["chg"][attack], 1)] if len(attack) else attack
+        return {"observe": frame(observe, key), "confirm": frame(confirm, key), "attack": frame(attack, key)}
+
+
+# ========== 基准 ==========
+def synthetic_stacked(symbols: int, bars: int, seed: int = 0) -> indicators.Stacked:
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (bars, symbols)), axis=0))
+    cols = {"close": close, "high": close * 1.01, "volume": rng.lognormal(12, 0.5, close.shape)}
+    data = indicators.compute(cols, INDICATOR_NAMES)
+    data.update(cols)
+    dates = np.datetime64("2024-01-01") + np.arange(bars).astype("timedelta64[D]")
+    return indicators.Stacked(codes=[f"{600000 + i:06d}" for i in range(symbols)],
+                              dates=np.repeat(dates[:, None], symbols, axis=1), data=data)
+
+
+def run_bench(symbols: int, bars: int):
+    t0 = time.perf_counter()
+    scanner = Scanner(synthetic_stacked(symbols, bars))
+    build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    masks = scanner.latest(strategy_dsl.STRATEGIES)
+    vc = scanner.column("vol_change")
+    for rule in strategy_dsl.STRATEGIES:
+        top_k(vc, TOP_K, masks[rule.name])
+    t_strategies = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    tiers = scanner.tiers()
+    t_tiers = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    np.argsort(-np.nan_to_num(vc, nan=-np.inf))[:TOP_K]
+    t_sort = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    top_k(vc, TOP_K)
+    t_part = time.perf_counter() - t0
+
+    print(f"{symbols} 只 × {bars} 根（扫描保留 {SCAN_BARS} 根）：构造+指标 {build:.2f}s")
+    print(f"  {len(strategy_dsl.STRATEGIES)} 条策略全市场扫描 + 各取前 {TOP_K}: {t_strategies * 1000:.1f}ms")
+    print(f"  盘前三仓: {t_tiers * 1000:.1f}ms（观察 {len(tiers['observe'])} / 确认 {len(tiers['confirm'])} / "
+          f"进攻 {len(tiers['attack'])}）")
+    print(f"  前 {TOP_K}: argpartition {t_part * 1e6:.0f}µs vs 全量 argsort {t_sort * 1e6:.0f}µs")
+
+
+# ========== 命令行 ==========
+def _print_frame(title: str, df: pd.DataFrame, columns: List[str]):
+    print(f"\n{title}（{len(df)} 只）")
+    print("-" * 70)
+    if df.empty:
+        print("  无")
+        return
+    for r in df.itertuples(index=False):
+        values = " ".join(f"{c}={getattr(r, c):.2f}" for c in columns if c in df.columns)
+        print(f"  {r.code} {r.name:<8} {values}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全市场横截面扫描")
+    parser.add_argument("--refresh-universe", action="store_true", help="从新浪更新全市场股票池")
+    parser.add_argument("--force", action="store_true", help="股票池缩水过多时仍覆盖 universe.json")
+    parser.add_argument("--sync", action="store_true", help="扫描前增量刷新本地日线")
+    parser.add_argument("--codes", help="逗号分隔的股票代码（默认全部股票池）")
+    parser.add_argument("--strategy", action="append", default=[], help="strategy_dsl.STRATEGIES 里的规则名，可重复（同时满足）")
+    parser.add_argument("--rank", default="vol_change", help="排序指标")
+    parser.add_argument("--top", type=int, default=TOP_K)
+    parser.add_argument("--tiers", action="store_true", help="盘前三仓筛选")
+    parser.add_argument("--spot", action="store_true", help="用新浪实时快照覆盖涨幅 / 换手率")
+    parser.add_argument("--bars", type=int, default=LOOKBACK)
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--symbols", type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.bench:
+        run_bench(args.symbols, args.bars)
+        return
+
+    spot = None
+    if args.refresh_universe or args.spot:
+        spot = fetch_spot()
+        if spot.empty:
+            print("⚠️ 实时快照获取失败")
+            spot = None
+        elif args.refresh_universe and save_universe(spot, force=args.force):
+            print(f"✅ 股票池: {len(spot)} 只 -> {UNIVERSE_PATH}")
+
+    codes = args.codes.split(",") if args.codes else list(load_universe())
+    if args.sync:
+        t0 = time.perf_counter()
+        ok = sync(codes)
+        print(f"🔄 日线刷新: {ok}/{len(codes)} 只（{time.perf_counter() - t0:.1f}s）")
+
+    t0 = time.perf_counter()
+    scanner = Scanner.load(codes, bars=args.bars)
+    load_s = time.perf_counter() - t0
+    if not len(scanner):
+        print("❌ 没有可用的股票数据")
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    if args.tiers:
+        result = scanner.tiers(spot)
+        scan_s = time.perf_counter() - t0
+        for tier, title in [("observe", "观察仓"), ("confirm", "确认仓"), ("attack", "进攻仓")]:
+            _print_frame(title, result[tier], ["chg", "excess_vs_index", "vol_ratio5", "rsi14"])
+    else:
+        by_name = {r.name: r for r in strategy_dsl.STRATEGIES}
+        unknown = [s for s in args.strategy if s not in by_name]
+        if unknown:
+            print(f"❌ 未知策略: {', '.join(unknown)}；可选: {', '.join(by_name)}")
+            sys.exit(1)
+        if args.rank not in scanner.data:
+            print(f"❌ 未知排序指标: {args.rank}；可选: {', '.join(scanner.data)}")
+            sys.exit(1)
+        result = scanner.scan([by_name[s] for s in args.strategy], scanner.column(args.rank), args.top,
+                              show=["return_d1", "vol_change", "rsi14"])
+        scan_s = time.perf_counter() - t0
+        title = " & ".join(args.strategy) or "全部"
+        _print_frame(f"🔍 {title}，按 {args.rank} 前 {args.top}，命中 {result.attrs['matched']} 只",
+                     result, ["rank", "return_d1", "vol_change", "rsi14"])
+
+    print(f"\n⏱️ 加载+指标 {load_s:.2f}s，扫描 {scan_s * 1000:.1f}ms"
+          f"（{len(scanner)} 只，最新交易日 {scanner.as_of}，有效 {int(scanner.fresh.sum())} 只）")
+
+
+if __name__ == "__main__":
+    main()
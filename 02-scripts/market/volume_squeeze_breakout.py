@@ -4,11 +4,10 @@
 核心逻辑：先缩量，再放量买入
 """
 
-import pandas as pd
 import numpy as np
-import os
 
-DATA_DIR = "stock_data"
+import indicators
+import signals
 
 # 已获取的股票
 STOCKS = [
@@ -24,93 +23,67 @@ STOCKS = [
     ("600021", "上海电力"),
 ]
 
-def load_data(code):
-    """加载数据"""
-    path = f"{DATA_DIR}/{code}.csv"
-    if not os.path.exists(path):
-        return None
-    df = pd.read_csv(path)
-    df['date'] = pd.to_datetime(df['date'])
-    return df.sort_values('date').reset_index(drop=True)
+# 二阶段扫描用到的指标（return_f{N} 为未来N日收益，默认持有5日）
+IND_NAMES = ['vol_change', 'return_d1', 'return_d10']
+HOLD_DAYS = 5
 
-def add_indicators(df):
-    """添加技术指标"""
-    df['volume_ma5'] = df['volume'].rolling(5).mean()
-    df['volume_ma20'] = df['volume'].rolling(20).mean()
-    df['price_ma5'] = df['close'].rolling(5).mean()
-    df['price_ma20'] = df['close'].rolling(20).mean()
-    df['vol_change'] = (df['volume'] - df['volume_ma5']) / df['volume_ma5']
-    df['vol_change20'] = (df['volume'] - df['volume_ma20']) / df['volume_ma20']
-    df['return_d1'] = df['close'].pct_change(1)
-    df['return_future'] = df['close'].pct_change(-5)
-    df['price_stable'] = df['close'].pct_change(10).abs() < 0.15  # 10日波动<15%
-    return df
+def load_panel(codes, holds=(HOLD_DAYS,)):
+    """一次加载多只股票的指标（各股自身K线右对齐，停牌日不插空行）"""
+    return indicators.compute_stacked(codes, IND_NAMES + [f'return_f{h}' for h in holds])
 
-def test_strategy(code, name, light_thresh, candle_thresh, obs_days):
+def combined_signal(stacked, light_thresh, candle_thresh, obs_days):
     """
-    测试缩量后的放量策略
+    缩量后的放量二阶段信号（交易日 × 股票 布尔矩阵）
     
     Args:
         light_thresh: 缩量阈值 (如 -0.2 表示缩量20%)
         candle_thresh: 放量阈值 (如 0.3 表示放量30%)
         obs_days: 观察期（缩量后多少天内放量有效）
     """
-    df = load_data(code)
-    if df is None:
-        return None
-    
-    df = add_indicators(df)
+    vc = stacked['vol_change']
     
     # ===== 点灯：缩量企稳 =====
-    # 连续N日缩量 + 价格横盘
-    df['light_2day'] = (df['vol_change'] < light_thresh) & (df.shift(1)['vol_change'] < light_thresh)
-    df['light_stable'] = df['price_stable']
-    df['signal_light'] = df['light_2day'] & df['light_stable']
+    # 连续2日缩量 + 价格横盘（10日波动<15%）
+    light_2day = (vc < light_thresh) & (indicators.shift(vc, 1) < light_thresh)
+    price_stable = np.abs(stacked['return_d10']) < 0.15
+    signal_light = light_2day & price_stable
     
     # ===== 举烛：放量上涨 =====
-    df['signal_candle'] = (df['vol_change'] > candle_thresh) & (df['return_d1'] > 0)
+    signal_candle = (vc > candle_thresh) & (stacked['return_d1'] > 0)
     
     # ===== 二阶段：点灯后N日内举烛 =====
-    df['light_date'] = None
-    for i in range(len(df)):
-        if df.iloc[i]['signal_light']:
-            df.iloc[i, df.columns.get_loc('light_date')] = df.iloc[i]['date']
-    
-    df['light_date'] = pd.to_datetime(df['light_date'], errors='coerce')
-    df['light_date'] = df['light_date'].ffill()
-    
-    df['days_from_light'] = None
-    for i in range(len(df)):
-        if df.iloc[i]['signal_candle'] and pd.notna(df.iloc[i]['light_date']):
-            light_date = df.iloc[i]['light_date']
-            days = (df.iloc[i]['date'] - light_date).days
-            if 1 <= days <= obs_days:
-                df.iloc[i, df.columns.get_loc('days_from_light')] = days
+    combined, _ = signals.two_stage(signal_light, signal_candle, obs_days, dates=stacked.dates)
+    return combined
+
+def scan_panel(stacked, light_thresh, candle_thresh, obs_days, hold=HOLD_DAYS):
+    """
+    对面板内全部股票同时测试缩量后的放量策略（hold 为持有天数，需已在 load_panel 中加载）
     
-    df['signal_combined'] = df['days_from_light'].notna()
+    Returns:
+        {code: {'trades', 'wins', 'losses', 'win_rate', 'avg_return'}}，无信号的为 {'trades': 0}
+    """
+    combined = combined_signal(stacked, light_thresh, candle_thresh, obs_days)
     
     # ===== 回测 =====
-    combined = df[df['signal_combined']]
-    if len(combined) == 0:
-        return {'trades': 0}
-    
-    profits = []
-    for idx in combined.index:
-        ret = df.iloc[idx]['return_future']
-        if not np.isnan(ret):
-            profits.append(ret)
-    
-    if len(profits) == 0:
-        return {'trades': 0}
-    
-    wins = sum(1 for p in profits if p > 0)
-    return {
-        'trades': len(profits),
-        'wins': wins,
-        'losses': len(profits) - wins,
-        'win_rate': wins / len(profits),
-        'avg_return': np.mean(profits)
-    }
+    st = signals.panel_trade_stats(combined, stacked[f'return_f{hold}'])
+    results = {}
+    for j, code in enumerate(stacked.codes):
+        trades, wins = int(st['trades'][j]), int(st['wins'][j])
+        if trades == 0:
+            results[code] = {'trades': 0}
+            continue
+        results[code] = {
+            'trades': trades,
+            'wins': wins,
+            'losses': trades - wins,
+            'win_rate': wins / trades,
+            'avg_return': float(st['avg_return'][j])
+        }
+    return results
+
+def test_strategy(code, name, light_thresh, candle_thresh, obs_days):
+    """测试单只股票（无数据返回 None）"""
+    return scan_panel(load_panel([code]), light_thresh, candle_thresh, obs_days).get(code)
 
 def run_parameter_scan():
     """参数扫描"""
@@ -132,6 +105,7 @@ def run_parameter_scan():
     ]
     
     all_results = {}
+    stacked = load_panel([code for code, _ in STOCKS])
     
     for light_thresh, candle_thresh, obs_days in param_combos:
         param_name = f"缩量>{abs(light_thresh):.0%} 放量>{candle_thresh:.0%} 观察{obs_days}日"
@@ -140,9 +114,10 @@ def run_parameter_scan():
         print("-" * 60)
         
         param_results = []
+        scanned = scan_panel(stacked, light_thresh, candle_thresh, obs_days)
         
         for code, name in STOCKS:
-            result = test_strategy(code, name, light_thresh, candle_thresh, obs_days)
+            result = scanned.get(code)
             if result and result['trades'] > 0:
                 param_results.append(result)
         
@@ -202,9 +177,10 @@ def run_best_param_test():
     print("-" * 60)
     
     results = []
+    scanned = scan_panel(load_panel([code for code, _ in STOCKS]), light_thresh, candle_thresh, obs_days)
     
     for code, name in STOCKS:
-        result = test_strategy(code, name, light_thresh, candle_thresh, obs_days)
+        result = scanned.get(code)
         if result and result['trades'] > 0:
             result['code'] = code
             result['name'] = name
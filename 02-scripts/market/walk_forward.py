@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+量价策略滚动样本外评估（walk-forward）
+
+- 训练窗 / 测试窗滚动前进，中间留 embargo 间隔（默认等于持有期），训练期标签不会看到测试期价格
+- 信号与 strategy_ranker 口径一致：T-1 日信号，T 日收盘买入，持有 hold 日
+- 指标与 15 个策略的信号在全序列上只算一次（指标都只看过去），各折只是切片；
+  每折的交易数 / 胜数 / 收益和用前缀和 O(1) 取出
+- 胜率置信区间：按折重抽样（bootstrap），反映不同时间段之间的波动
+- 每个 (策略, 股票, 折) 的结果缓存到磁盘；折的边界从序列起点固定，新增一天只会重算最后一折的统计
+  （指标与信号仍在全序列上算，EMA 类指标与全量运行逐位一致，缓存结果不依赖首次计算的方式）
+
+用法:
+    python3 walk_forward.py --codes 600519,600036 --train 250 --test 60
+    python3 strategy_ranker.py --walk-forward
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import indicators
+import market_store
+import strategy_dsl
+
+# ========== 配置 ==========
+TRAIN_BARS = 250       # 训练窗
+TEST_BARS = 60         # 测试窗（也是滚动步长）
+HOLD_DAYS = 5
+EMBARGO = None         # 训练窗与测试窗之间的间隔，None 为 HOLD_DAYS
+MIN_TRADES = 5         # 训练期交易数不足的策略不参与该折的选择
+TOP_K = 3              # 每折按训练胜率选出的策略数
+BOOTSTRAP = 2000
+ALPHA = 0.10           # 90% 置信区间
+SEED = 0
+CACHE_PATH = os.path.join(market_store.LEGACY_DIR, "walk_forward_cache.json")
+
+Fold = Tuple[int, int, int, int]  # train_lo, train_hi, test_lo, test_hi（左闭右开）
+
+
+# ========== 折划分 ==========
+def make_folds(n: int, train: int, test: int, embargo: int) -> List[Fold]:
+    """从序列起点固定划分；最后一折的测试窗可能不满"""
+    folds = []
+    k = 0
+    while True:
+        tr_lo = k * test
+        tr_hi = tr_lo + train
+        te_lo = tr_hi + embargo
+        if te_lo >= n:
+            break
+        folds.append((tr_lo, tr_hi, te_lo, min(te_lo + test, n)))
+        k += 1
+    return folds
+
+
+def _window(cs: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    """前缀和数组（首列为 0）上 [lo, hi) 的区间和"""
+    return cs[..., hi] - cs[..., lo]
+
+
+def fold_stats(masks: np.ndarray, ret: np.ndarray, folds: List[Fold]) -> Dict[str, np.ndarray]:
+    """
+    Args:
+        masks: (策略 × K线) 信号
+        ret: 每根K线买入后的持有期收益
+
+    Returns:
+        {'train_trades'/'train_wins'/'train_ret'/'test_*': (策略 × 折)}
+    """
+    sig = np.zeros_like(masks)
+    sig[:, 1:] = masks[:, :-1]                      # T-1 日信号，T 日买入
+    valid = sig & ~np.isnan(ret)[None, :]
+    r = np.where(valid, ret[None, :], 0.0)
+    pad = np.zeros((masks.shape[0], 1))
+    cs = {
+        "trades": np.hstack([pad, np.cumsum(valid, axis=1)]),
+        "wins": np.hstack([pad, np.cumsum(valid & (r > 0), axis=1)]),
+        "ret": np.hstack([pad, np.cumsum(r, axis=1)]),
+    }
+    out = {}
+    for part, (lo_i, hi_i) in (("train", (0, 1)), ("test", (2, 3))):
+        for k, c in cs.items():
+            out[f"{part}_{k}"] = np.stack(
+                [_window(c, f[lo_i], f[hi_i]) for f in folds], axis=1
+            ) if folds else np.zeros((masks.shape[0], 0))
+    return out
+
+
+# ========== 缓存 ==========
+def _fingerprint(*parts) -> str:
+    return hashlib.sha1("|".join(map(str, parts)).encode("utf-8")).hexdigest()[:12]
+
+
+class FoldCache:
+    """{键: 单折统计} 的 JSON 文件缓存"""
+
+    def __init__(self, path: Optional[str] = CACHE_PATH):
+        self.path = path
+        self.data: Dict[str, dict] = {}
+        self.dirty = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except ValueError:
+                self.data = {}
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.data.get(key)
+
+    def put(self, key: str, value: dict):
+        self.data[key] = value
+        self.dirty = True
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+# ========== 评估 ==========
+STAT_KEYS = ("train_trades", "train_wins", "train_ret", "test_trades", "test_wins", "test_ret")
+
+
+def evaluate_symbol(code: str, rules: List[strategy_dsl.Rule], cache: FoldCache,
+                    train: int = TRAIN_BARS, test: int = TEST_BARS, hold: int = HOLD_DAYS,
+                    embargo: Optional[int] = None) -> List[dict]:
+    """单只股票全部策略、全部折的统计；已完成且缓存命中的折不再计算"""
+    df = market_store.load_bars(code, columns=("close", "volume"))
+    if df is None:
+        return []
+    embargo = hold if embargo is None else embargo
+    n = len(df)
+    dates = df["date"].dt.strftime("%Y-%m-%d").to_numpy()
+    folds = make_folds(n, train, test, embargo)
+    if not folds:
+        return []
+
+    cfg = _fingerprint(train, test, hold, embargo)
+    rule_fp = {r.name: _fingerprint(repr(r.expr)) for r in rules}
+
+    def key(rule, f):
+        return f"{code}|{rule.name}|{rule_fp[rule.name]}|{cfg}|{dates[f[0]]}|{dates[f[3] - 1]}"
+
+    def complete(f):
+        # 测试窗满且最后一笔的持有期已走完，结果不会再变
+        return f[3] - f[2] == test and f[3] - 1 + hold <= n - 1
+
+    cached = {}
+    todo = []
+    for i, f in enumerate(folds):
+        hits = [cache.get(key(r, f)) for r in rules] if complete(f) else [None]
+        if all(h is not None for h in hits):
+            cached[i] = hits
+        else:
+            todo.append(i)
+
+    computed = {}
+    if todo:
+        # 信号在全序列上算（截断预热会让 dif / dea / rsi 与全量运行不一致），只对需要的折取统计
+        masks = strategy_dsl.evaluate(rules, df)
+        ret = indicators.forward_return(df["close"].to_numpy(dtype=np.float64), hold)
+        stats = fold_stats(np.stack([masks[r.name] for r in rules]), ret, [folds[i] for i in todo])
+        for j, i in enumerate(todo):
+            computed[i] = [{k: float(stats[k][s, j]) for k in STAT_KEYS} for s in range(len(rules))]
+            if complete(folds[i]):
+                for s, r in enumerate(rules):
+                    cache.put(key(r, folds[i]), computed[i][s])
+
+    records = []
+    for i, f in enumerate(folds):
+        per_rule = cached.get(i) or computed[i]
+        for r, st in zip(rules, per_rule):
+            records.append({
+                "strategy": r.name, "code": code, "fold": i,
+                "train_start": dates[f[0]], "test_start": dates[f[2]], "test_end": dates[f[3] - 1],
+                "cached": i in cached, **st,
+            })
+    return records
+
+
+def bootstrap_ci(wins: np.ndarray, trades: np.ndarray, n_boot: int = BOOTSTRAP, alpha: float = ALPHA,
+                 seed: int = SEED) -> Tuple[float, float]:
+    """按折重抽样的合并胜率置信区间"""
+    wins, trades = np.asarray(wins, dtype=np.float64), np.asarray(trades, dtype=np.float64)
+    if len(trades) == 0 or trades.sum() == 0:
+        return float("nan"), float("nan")
+    idx = np.random.default_rng(seed).integers(0, len(trades), (n_boot, len(trades)))
+    t = trades[idx].sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        wr = wins[idx].sum(axis=1) / t
+    wr = wr[t > 0]
+    return float(np.quantile(wr, alpha / 2)), float(np.quantile(wr, 1 - alpha / 2))
+
+
+def summarize(records: pd.DataFrame, min_trades: int = MIN_TRADES, top_k: int = TOP_K,
+              n_boot: int = BOOTSTRAP, alpha: float = ALPHA) -> Tuple[pd.DataFrame, dict]:
+    """
+    Returns:
+        (每个策略的样本内 / 样本外汇总表, 按训练胜率逐折选策略的样本外结果)
+    """
+    # 折 = (股票, 折序号)，重抽样单位
+    g = records.groupby(["strategy", "code", "fold"], sort=False)[list(STAT_KEYS)].sum()
+    rows = []
+    for name, part in g.groupby(level="strategy", sort=False):
+        tr_t, tr_w = part["train_trades"].sum(), part["train_wins"].sum()
+        te_t, te_w = part["test_trades"].sum(), part["test_wins"].sum()
+        lo, hi = bootstrap_ci(part["test_wins"].to_numpy(), part["test_trades"].to_numpy(), n_boot, alpha)
+        rows.append({
+            "strategy": name,
+            "folds": len(part),
+            "train_trades": int(tr_t),
+            "train_wr": tr_w / tr_t if tr_t else np.nan,
+            "test_trades": int(te_t),
+            "test_wr": te_w / te_t if te_t else np.nan,
+            "test_avg": part["test_ret"].sum() / te_t if te_t else np.nan,
+            "ci_lo": lo,
+            "ci_hi": hi,
+        })
+    table = pd.DataFrame(rows).sort_values("test_wr", ascending=False, na_position="last")
+
+    # 每个 (股票, 折) 按训练胜率选 top_k，看它们在测试窗的表现
+    r = records[records["train_trades"] >= min_trades].copy()
+    r["train_wr"] = r["train_wins"] / r["train_trades"]
+    picked = r.sort_values("train_wr", ascending=False).groupby(["code", "fold"], sort=False).head(top_k)
+    t, w = picked["test_trades"].sum(), picked["test_wins"].sum()
+    per_fold = picked.groupby(["code", "fold"])[["test_wins", "test_trades"]].sum()
+    lo, hi = bootstrap_ci(per_fold["test_wins"].to_numpy(), per_fold["test_trades"].to_numpy(), n_boot, alpha)
+    selection = {
+        "trades": int(t),
+        "win_rate": w / t if t else float("nan"),
+        "avg_return": picked["test_ret"].sum() / t if t else float("nan"),
+        "ci_lo": lo,
+        "ci_hi": hi,
+    }
+    return table, selection
+
+
+def run(codes: List[str], rules=None, train: int = TRAIN_BARS, test: int = TEST_BARS, hold: int = HOLD_DAYS,
+        embargo: Optional[int] = EMBARGO, cache_path: Optional[str] = CACHE_PATH) -> pd.DataFrame:
+    rules = rules or strategy_dsl.STRATEGIES
+    cache = FoldCache(cache_path)
+    records = []
+    for code in codes:
+        records.extend(evaluate_symbol(code, rules, cache, train, test, hold, embargo))
+    cache.save()
+    return pd.DataFrame(records)
+
+
+def main(argv=None, codes=None):
+    parser = argparse.ArgumentParser(description="量价策略滚动样本外评估")
+    parser.add_argument("--codes", help="逗号分隔的股票代码")
+    parser.add_argument("--train", type=int, default=TRAIN_BARS)
+    parser.add_argument("--test", type=int, default=TEST_BARS)
+    parser.add_argument("--hold", type=int, default=HOLD_DAYS)
+    parser.add_argument("--embargo", type=int, default=EMBARGO, help="默认等于持有期")
+    parser.add_argument("--top", type=int, default=TOP_K)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args(argv)
+
+    codes = args.codes.split(",") if args.codes else (codes or market_store.list_codes())
+    t0 = time.perf_counter()
+    records = run(codes, train=args.train, test=args.test, hold=args.hold, embargo=args.embargo,
+                  cache_path=None if args.no_cache else CACHE_PATH)
+    elapsed = time.perf_counter() - t0
+    if records.empty:
+        print("❌ 数据不足以划分训练/测试窗")
+        return
+
+    embargo = args.hold if args.embargo is None else args.embargo
+    table, selection = summarize(records, top_k=args.top)
+    n_folds = records.groupby("code")["fold"].nunique().sum()
+    cached = records.drop_duplicates(["code", "fold"])["cached"].sum()
+
+    print("=" * 100)
+    print(f"📊 滚动样本外评估: {len(codes)} 只股票，{n_folds} 折（训练{args.train} / 间隔{embargo} / 测试{args.test}，持有{args.hold}日）")
+    print("=" * 100)
+    print(f"\n{'策略名称':<28} | {'样本内胜率':^10} | {'样本外胜率':^10} | {f'{1 - ALPHA:.0%}区间':^15} | {'样本外笔数':^8} | {'平均收益':^8}")
+    print("-" * 100)
+    for r in table.itertuples():
+        print(f"{r.strategy:<28} | {r.train_wr:>9.1%} | {r.test_wr:>9.1%} | "
+              f"{r.ci_lo:>6.1%} ~ {r.ci_hi:<6.1%} | {r.test_trades:^8} | {r.test_avg:>+8.2%}")
+
+    s = selection
+    print(f"\n🎯 每折按训练胜率选前 {args.top} 个策略，样本外: {s['trades']} 笔，胜率 {s['win_rate']:.1%}"
+          f"（{s['ci_lo']:.1%} ~ {s['ci_hi']:.1%}），平均收益 {s['avg_return']:+.2%}")
+    print(f"\n⏱️ {elapsed:.2f}s（缓存命中 {cached}/{len(records.drop_duplicates(['code', 'fold']))} 折）")
+
+
+if __name__ == "__main__":
+    main()
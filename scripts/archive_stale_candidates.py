@@ -37,12 +37,11 @@ def get_active_candidates():
     """获取所有活跃候选票（有过记录且未标记为失效）"""
     conn = conn_db()
     cur = conn.cursor()
-    # 假设我们有 status 字段，不等于 '失效' 的为活跃
+    # code_summary 由触发器维护：active_last_seen 为该股最后一条非'失效'记录的日期
     cur.execute("""
-        SELECT DISTINCT code, name, sector, MAX(report_date) as last_date
-        FROM watchlist_records
-        WHERE status != '失效'
-        GROUP BY code, name, sector
+        SELECT code, name, sector, active_last_seen as last_date
+        FROM code_summary
+        WHERE active_last_seen IS NOT NULL
     """)
     rows = [dict(r) for r in cur.fetchall()]
     conn.close()
@@ -100,6 +99,11 @@ def main():
     p.add_argument('--dry-run', action='store_true', help='仅打印，不修改数据库')
     args = p.parse_args()
 
+    # 补跑表结构迁移（code_summary 汇总表）
+    import watchlist_tracker
+    watchlist_tracker.DB_PATH = DB_PATH
+    watchlist_tracker.init_db()
+
     print(f"开始归档检查（阈值: {args.days} 天）...")
     archive_stale(args.days, args.dry_run)
 
@@ -0,0 +1,717 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""盘前链路基准（离线，录制夹具回放）
+
+分阶段测量 墙钟时间 / 峰值 RSS / 内存分配，结果按 git 提交追加到历史文件，
+与上一个提交对比标出退化，开盘前先跑一遍就能发现热路径变慢。
+
+覆盖:
+    preopen.*    generate_preopen_watchlist 各阶段：板块 / 大盘 / 成分股 / 指标（冷、热）/ 分层 / 渲染
+    store.sync   腾讯日K下载 + 解析 + 写入本地行情库（tencent_stub_server 提供日K）
+    tracker.*    watchlist_tracker 入库（单份 / 批量 / ingest-all 目录补录 / 内容未变的重复入库）
+    backtest.*   portfolio_backtest / walk_forward / param_sweep
+    dashboard.*  watchlist_dashboard 各路由（Flask test client）
+
+夹具（全部离线）:
+    http/       新浪板块、新浪成分股、腾讯大盘行情（http_cache 录制格式，HTTP_CACHE_MODE=replay 回放）
+    akshare/    stock_zh_a_hist / stock_zh_a_hist_tx 的 CSV（本地行情库缺失的股票走这条回退路径）
+    manifest.json
+没有录制过夹具时按固定种子合成同格式的数据，开箱即可运行。
+
+指标:
+    wall_ms     多次运行的中位数（min_ms 为最小值）
+    rss_mb      阶段内峰值 RSS 相对阶段开始时的增量（每阶段前重置 VmHWM；peak_rss_mb 为进程绝对峰值）
+    alloc_kb    tracemalloc 峰值（单独一次运行，不计入时间）
+    blocks      阶段结束时净增的内存块数（sys.getallocatedblocks）
+
+用法:
+    python3 scripts/bench_pipeline.py run [--repeat 3] [--only preopen,tracker] [--no-save]
+    python3 scripts/bench_pipeline.py record          # 联网录制一次真实接口夹具
+    python3 scripts/bench_pipeline.py compare [--base <commit>]
+    python3 scripts/bench_pipeline.py history
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+MARKET_DIR = SCRIPTS_DIR.parent / '02-scripts' / 'market'
+sys.path.insert(0, str(SCRIPTS_DIR))
+sys.path.insert(0, str(MARKET_DIR))
+
+from http_cache import CacheMiss, HttpCache, cache_key  # noqa: E402
+
+# === 配置 ===
+WORKSPACE = Path('/root/.openclaw/workspace')
+BENCH_DIR = WORKSPACE / 'data' / 'bench'
+FIXTURE_DIR = BENCH_DIR / 'fixtures'
+HISTORY_PATH = BENCH_DIR / 'history.jsonl'
+
+REPEAT = 3
+SEED = 20260320
+SYNTH_SECTORS = 40         # 合成夹具：板块数
+SYNTH_MEMBERS = 120        # 合成夹具：每个板块成分股数（与 getHQNodeData num=120 一致）
+SYNTH_POOL = 1500          # 合成夹具：代码池大小（板块间有重叠，触发去重）
+AK_SHARE = 0.2             # 成分股中不进本地行情库、走 akshare 夹具的比例
+AK_RECORD = 40             # record：最多录制多少只股票的 akshare 日K
+STORE_BARS = 800           # 本地行情库每只股票的K线条数（够 walk_forward 划出多折）
+REPORT_DAYS = 60           # 入库基准：连续多少天的报告（也是看板的历史数据量）
+SWEEP_GRID = {'light': [-0.15, -0.25], 'candle': [0.25, 0.4], 'obs': [5, 10], 'hold': [5]}
+
+REGRESSION = 0.20          # 相对上一个提交变慢 / 变大超过 20% 视为退化
+MIN_DELTA_MS = 5.0         # 且绝对差超过 5ms（过滤抖动）
+MIN_DELTA_MB = 5.0
+
+GROUPS = ('store', 'preopen', 'tracker', 'backtest', 'dashboard')
+
+SINA_HY_URL = 'https://vip.stock.finance.sina.com.cn/q/view/newSinaHy.php'
+SINA_NODE_URL = 'https://vip.stock.finance.sina.com.cn/quotes_service/api/json_v2.php/Market_Center.getHQNodeData'
+QT_INDEX_URL = 'https://qt.gtimg.cn/q=sh000001'
+
+
+# ============================================
+# 测量
+# ============================================
+def _reset_peak_rss() -> bool:
+    """把 VmHWM 重置为当前 RSS（Linux 4.0+），失败时退回进程累计峰值"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _status_mb(field: str) -> Optional[float]:
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _peak_rss_mb() -> float:
+    peak = _status_mb('VmHWM')
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if peak is None else peak
+
+
+def measure(name: str, fn: Callable, repeat: int = REPEAT, setup: Optional[Callable] = None) -> dict:
+    """
+    运行 fn repeat 次取墙钟中位数，再在 tracemalloc 下单独跑一次统计分配
+
+    Args:
+        setup: 每次运行前调用（不计时），用于清掉上一次运行留下的状态
+    """
+    times = []
+    rss = peak_rss = 0.0
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        _reset_peak_rss()
+        start = _status_mb('VmRSS') or 0.0
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+        peak = _peak_rss_mb()
+        peak_rss = max(peak_rss, peak)
+        rss = max(rss, peak - start)
+
+    if setup:
+        setup()
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    result = {
+        'wall_ms': round(statistics.median(times), 2),
+        'min_ms': round(min(times), 2),
+        'rss_mb': round(rss, 1),
+        'peak_rss_mb': round(peak_rss, 1),
+        'alloc_kb': round(peak / 1024, 1),
+        'blocks': sys.getallocatedblocks() - blocks,
+    }
+    print(f"  {name:<28} {result['wall_ms']:>10.1f}ms {result['rss_mb']:>8.1f}MB "
+          f"{result['alloc_kb']:>10.0f}KB {result['blocks']:>+9d}")
+    return result
+
+
+# ============================================
+# 夹具
+# ============================================
+class AkshareFixtures:
+    """录制的 akshare 日K（CSV），与 akshare 同名函数签名一致；未录制的股票抛 CacheMiss"""
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _load(self, func: str, symbol: str) -> pd.DataFrame:
+        path = self.root / func / f'{symbol}.csv'
+        if not path.exists():
+            raise CacheMiss(f'{func} {symbol}')
+        return pd.read_csv(path)
+
+    def stock_zh_a_hist(self, symbol: str, **kwargs) -> pd.DataFrame:
+        return self._load('stock_zh_a_hist', symbol)
+
+    def stock_zh_a_hist_tx(self, symbol: str, **kwargs) -> pd.DataFrame:
+        return self._load('stock_zh_a_hist_tx', symbol)
+
+
+def _store_response(cache: HttpCache, url: str, params: Optional[dict], text: str):
+    meta = {'url': url, 'params': params or {}, 'status': 200, 'encoding': 'utf-8',
+            'headers': {'Content-Type': 'text/plain; charset=utf-8'}}
+    cache.store(cache_key(url, params), url, params, HttpCache.build(meta, text.encode('utf-8')))
+
+
+def _node_params(node: str) -> dict:
+    # 与 generate_preopen_watchlist.fetch_sector_stocks 的请求参数一致（缓存键按参数计算）
+    return {'page': '1', 'num': '120', 'sort': 'changepercent', 'asc': '0', 'node': node, 'symbol': '', '_s_r_a': 'page'}
+
+
+def _synth_pool(rng: random.Random) -> List[str]:
+    # 约 3/4 沪深主板，其余创业板 / 科创板（会被主板过滤剔除）
+    prefixes = ['600', '601', '603', '000', '002', '300', '688']
+    weights = [3, 2, 2, 3, 2, 1.5, 1.5]
+    pool = set()
+    while len(pool) < SYNTH_POOL:
+        pool.add(rng.choices(prefixes, weights)[0] + f'{rng.randrange(1000):03d}')
+    return sorted(pool)
+
+
+def _hist_frames(code: str):
+    """与 tencent_stub_server 同一条合成K线，分别转成 EM / 腾讯两种 akshare 字段格式"""
+    from tencent_fetcher import market_code
+    from tencent_stub_server import synth_klines
+
+    rows = synth_klines(market_code(code), 120)
+    k = pd.DataFrame(rows, columns=['date', 'open', 'close', 'high', 'low', 'volume']).astype(
+        {'open': float, 'close': float, 'high': float, 'low': float, 'volume': float})
+    em = pd.DataFrame({
+        '日期': k['date'], '股票代码': code, '开盘': k['open'], '收盘': k['close'],
+        '最高': k['high'], '最低': k['low'], '成交量': (k['volume'] / 100).round(),
+        '成交额': (k['volume'] * k['close']).round(2),
+    })
+    tx = pd.DataFrame({'date': k['date'], 'open': k['open'], 'close': k['close'],
+                       'high': k['high'], 'low': k['low'], 'amount': (k['volume'] / 100).round()})
+    return em, tx
+
+
+def synthesize_fixtures(root: Path) -> dict:
+    """按固定种子合成与真实接口同格式的夹具"""
+    rng = random.Random(SEED)
+    cache = HttpCache(root / 'http', mode='record')
+    pool = _synth_pool(rng)
+
+    sectors = {}
+    for i in range(SYNTH_SECTORS):
+        node = f'new_bench{i:02d}'
+        chg = round(rng.gauss(0.3, 1.2), 2)
+        # node,名称,家数,均价,涨跌额,涨跌幅,成交量,成交额,领涨代码,领涨涨幅,领涨价,领涨涨跌额,领涨名称
+        sectors[node] = ','.join(map(str, [node, f'板块{i:02d}', SYNTH_MEMBERS, 12.3, 0.1, chg,
+                                           123456789, 987654321, 'sh600000', 5.0, 10.0, 0.5, '领涨股']))
+    _store_response(cache, SINA_HY_URL, None,
+                    f'var S_Finance_bankuai_sinaindustry = {json.dumps(sectors, ensure_ascii=False)}')
+
+    quote = ['1', '上证指数', '000001'] + ['0'] * 29 + [f'{rng.gauss(0.2, 0.8):.2f}'] + ['0'] * 10
+    _store_response(cache, QT_INDEX_URL, None, f'v_sh000001="{"~".join(quote)}";')
+
+    for node in sectors:
+        rows = []
+        for code in rng.sample(pool, SYNTH_MEMBERS):
+            trade = round(rng.uniform(4, 60), 2)
+            rows.append({
+                'symbol': ('sh' if code.startswith('6') else 'sz') + code,
+                'code': code,
+                'name': ('*ST' if rng.random() < 0.03 else '') + f'股票{code}',
+                'trade': f'{trade:.2f}',
+                'changepercent': round(rng.gauss(0.5, 2.5), 3),
+                'high': f'{trade * (1 + rng.random() * 0.03):.2f}',
+                'volume': rng.randrange(100000, 50000000),
+                'amount': rng.randrange(10 ** 6, 10 ** 9),
+                'turnoverratio': round(rng.uniform(0.2, 12), 5),
+            })
+        _store_response(cache, SINA_NODE_URL, _node_params(node), json.dumps(rows, ensure_ascii=False))
+
+    # akshare：三分之二有 EM 日K，其余只有腾讯日K（回退路径）
+    ak_codes = rng.sample([c for c in pool if c.startswith(('60', '00'))], int(SYNTH_POOL * AK_SHARE))
+    for i, code in enumerate(ak_codes):
+        em, tx = _hist_frames(code)
+        if i % 3:
+            _write_csv(root / 'akshare' / 'stock_zh_a_hist' / f'{code}.csv', em)
+        else:
+            _write_csv(root / 'akshare' / 'stock_zh_a_hist_tx' / f"{'sh' if code.startswith('6') else 'sz'}{code}.csv", tx)
+
+    manifest = {'source': 'synthetic', 'seed': SEED, 'created_at': datetime.now().isoformat(timespec='seconds'),
+                'akshare_codes': sorted(ak_codes)}
+    (root / 'manifest.json').write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding='utf-8')
+    return manifest
+
+
+def _write_csv(path: Path, df: pd.DataFrame):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(path, index=False)
+
+
+def record_fixtures(root: Path):
+    """联网跑一遍板块 / 大盘 / 成分股并录制，再录制部分成分股的 akshare 日K"""
+    import akshare as ak
+
+    os.environ['HTTP_CACHE_MODE'] = 'record'
+    os.environ['HTTP_CACHE_DIR'] = str(root / 'http')
+    gen = _import_pipeline()
+
+    main_sectors = gen.fetch_main_sectors()
+    gen.fetch_index_chg()
+    stocks, _ = gen.fetch_sector_stocks(main_sectors)
+    codes = [s['code'] for s in stocks]
+    ak_codes = random.Random(SEED).sample(codes, min(AK_RECORD, len(codes)))
+
+    end_date = datetime.now().strftime('%Y%m%d')
+    recorded = []
+    for code in ak_codes:
+        tx_symbol = f"sh{code}" if code.startswith('6') else f"sz{code}"
+        for func, symbol in (('stock_zh_a_hist', code), ('stock_zh_a_hist_tx', tx_symbol)):
+            kwargs = {'start_date': '20251201', 'end_date': end_date, 'adjust': 'qfq'}
+            if func == 'stock_zh_a_hist':
+                kwargs['period'] = 'daily'
+            try:
+                df = getattr(ak, func)(symbol=symbol, **kwargs)
+            except Exception as e:
+                print(f'  ⚠️ {func} {symbol}: {e}')
+                continue
+            if df is not None and len(df):
+                _write_csv(root / 'akshare' / func / f'{symbol}.csv', df)
+        recorded.append(code)
+
+    manifest = {'source': 'recorded', 'created_at': datetime.now().isoformat(timespec='seconds'),
+                'sectors': [s['node'] for s in main_sectors], 'members': len(codes), 'akshare_codes': recorded}
+    (root / 'manifest.json').write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"✅ 已录制: {len(main_sectors)} 个板块, {len(codes)} 只成分股, akshare {len(recorded)} 只 -> {root}")
+
+
+def _import_pipeline():
+    """导入 generate_preopen_watchlist（HTTP_CACHE 在导入时按环境变量构造）"""
+    import generate_preopen_watchlist as gen
+    return gen
+
+
+# ============================================
+# 基准
+# ============================================
+class Bench:
+    """一次完整基准运行的工作目录与各阶段共享的中间结果"""
+
+    def __init__(self, fixtures: Path, work: Path, repeat: int):
+        self.fixtures = fixtures
+        self.work = work
+        self.repeat = repeat
+        self.results: Dict[str, dict] = {}
+        self.manifest = json.loads((fixtures / 'manifest.json').read_text(encoding='utf-8'))
+
+        os.environ['HTTP_CACHE_MODE'] = 'replay'
+        os.environ['HTTP_CACHE_DIR'] = str(fixtures / 'http')
+        self.gen = _import_pipeline()
+        import market_store
+        self.market_store = market_store
+
+        # 所有输出都落在临时工作目录，不碰线上数据
+        self._pin()
+        self.gen.STATE_PATH = work / 'preopen_indicator_state.json'
+        self.gen.ak = AkshareFixtures(fixtures / 'akshare')
+        self.gen.AK_IN_REPLAY = True
+
+    def _in_work(self, path) -> Path:
+        """要删除 / 覆盖的路径必须在临时工作目录下，否则直接报错"""
+        path = Path(path).resolve()
+        if not path.is_relative_to(self.work.resolve()):
+            raise RuntimeError(f'{path} 不在基准工作目录 {self.work} 下，拒绝写入')
+        return path
+
+    def _pin(self):
+        """行情库 / 追踪库路径指回临时工作目录；懒导入各组模块后再调用一次，防止导入时被改写"""
+        self.market_store.STORE_DIR = str(self.work / 'stock_data' / 'store')
+        for name in ('watchlist_tracker', 'watchlist_dashboard'):
+            mod = sys.modules.get(name)
+            if mod is None:
+                continue
+            if not Path(mod.DB_PATH).is_relative_to(self.work):
+                mod.DB_PATH = self.work / 'watchlist_tracker.db'
+            mod.STOCK_ANALYSIS_DB = self.work / 'stock_analysis.db'
+
+    def run(self, name: str, fn: Callable, setup: Optional[Callable] = None, repeat: Optional[int] = None):
+        def reset():
+            self.gen.TRACER.reset()  # 追踪 span 不跨运行累积
+            if setup:
+                setup()
+
+        self.results[name] = measure(name, fn, repeat or self.repeat, reset)
+
+    def _members(self):
+        if not hasattr(self, 'stocks'):
+            self.sectors = self.gen.fetch_main_sectors()
+            self.idx_chg = self.gen.fetch_index_chg()
+            self.stocks, self.stock_stats = self.gen.fetch_sector_stocks(self.sectors)
+
+    # ---------- store ----------
+    def store(self):
+        """成分股里除 akshare 夹具覆盖的以外全部写入本地行情库（日K由替身服务器提供）"""
+        import tencent_fetcher
+        from kline_parser import parse_kline_frame
+        from tencent_stub_server import start_stub_server
+
+        self._members()
+        ms = self.market_store
+        ak_codes = set(self.manifest.get('akshare_codes', []))
+        codes = sorted({s['code'] for s in self.stocks} - ak_codes)
+        server, base_url = start_stub_server()
+        fetcher = tencent_fetcher.KlineFetcher(base_url=base_url, rate=1e6, burst=10 ** 6)
+
+        def sync():
+            self._pin()
+            shutil.rmtree(self._in_work(ms.STORE_DIR), ignore_errors=True)
+            mcodes = [tencent_fetcher.market_code(c) for c in codes]
+            for code, (mcode, text) in zip(codes, fetcher.fetch_klines(mcodes, count=STORE_BARS).items()):
+                df = parse_kline_frame(text, mcode) if text else None
+                if df is not None and len(df):
+                    ms.write_bars(code, df)
+
+        try:
+            self.run('store.sync', sync, repeat=1)
+            sync()
+        finally:
+            server.shutdown()
+        print(f'    本地行情库 {len(ms.list_codes())} 只')
+
+    # ---------- preopen ----------
+    def preopen(self):
+        gen = self.gen
+        self._pin()
+        if not self.market_store.list_codes():
+            self.store()
+        self.run('preopen.fetch_sectors', gen.fetch_main_sectors)
+        self.run('preopen.fetch_index', gen.fetch_index_chg)
+        self.run('preopen.fetch_members', lambda: gen.fetch_sector_stocks(self.sectors))
+
+        def cold():
+            if gen.STATE_PATH.exists():
+                self._in_work(gen.STATE_PATH).unlink()
+
+        self.run('preopen.enrich_cold', lambda: gen.enrich_indicators(self.stocks, self.idx_chg), setup=cold)
+        self.run('preopen.enrich_warm', lambda: gen.enrich_indicators(self.stocks, self.idx_chg))
+        cold()  # 报告里的数据来源统计按冷启动口径
+        df, ind_stats = gen.enrich_indicators(self.stocks, self.idx_chg)
+        self.run('preopen.select_tiers', lambda: gen.select_tiers(df.copy()))
+        observe, confirm, attack = gen.select_tiers(df)
+        step_stats = {
+            **self.stock_stats, **ind_stats,
+            'final_candidates': int(len(observe)),
+            'filtered_out': int(max(ind_stats['indicator_ok'] - len(observe), 0)),
+            'confirm_count': int(len(confirm)),
+            'attack_count': int(len(attack)),
+        }
+        self.run('preopen.build_report',
+                 lambda: gen.build_report(self.sectors, self.idx_chg, observe, confirm, attack, step_stats))
+        self.report = gen.build_report(self.sectors, self.idx_chg, observe, confirm, attack, step_stats)
+        print(f"    成分股 {len(self.stocks)} 只，指标 {ind_stats['indicator_ok']} 只"
+              f"（本地 {ind_stats['hist_local']} / 腾讯回退 {ind_stats['fallback_tx_used']}），"
+              f"观察 {len(observe)} / 确认 {len(confirm)} / 进攻 {len(attack)}")
+
+    # ---------- tracker ----------
+    def tracker(self):
+        import watchlist_tracker
+        self._pin()
+        if not hasattr(self, 'report'):
+            self.preopen()
+
+        watchlist_tracker.DB_PATH = self.work / 'watchlist_tracker.db'
+        reports = []
+        today = date.today()
+        for i in range(REPORT_DAYS):
+            d = (pd.Timestamp(today) - pd.offsets.BDay(REPORT_DAYS - 1 - i)).strftime('%Y-%m-%d')
+            path = self.work / 'reports' / f"preopen_watchlist_{d.replace('-', '')}.md"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(re.sub(r'生成时间：\S+', f'生成时间：{d}', self.report, count=1), encoding='utf-8')
+            reports.append(path)
+
+        def reset():
+            for suffix in ('', '-wal', '-shm'):
+                self._in_work(f'{watchlist_tracker.DB_PATH}{suffix}').unlink(missing_ok=True)
+
+        def ingest_all():
+            watchlist_tracker.ingest_reports(reports)
+
+        self.run('tracker.ingest_one', lambda: _quiet(watchlist_tracker.ingest_report, reports[-1]), setup=reset)
+        self.run(f'tracker.ingest_{REPORT_DAYS}d', lambda: _quiet(ingest_all), setup=reset)
+        self.run('tracker.ingest_all', lambda: _quiet(watchlist_tracker.ingest_all, self.work / 'reports'), setup=reset)
+        reset()
+        _quiet(ingest_all)
+        # 重复入库：内容摘要全部命中，只走解析 + 跳过
+        self.run(f'tracker.reingest_{REPORT_DAYS}d', lambda: _quiet(ingest_all))
+
+    # ---------- backtest ----------
+    def backtest(self):
+        import param_sweep
+        import portfolio_backtest
+        import volume_squeeze_breakout as vsb
+        import walk_forward
+
+        self._pin()
+        if not self.market_store.list_codes():
+            self.store()
+        codes = self.market_store.list_codes()
+
+        self.run('backtest.portfolio_load', lambda: portfolio_backtest.load_panel(codes))
+        panel = portfolio_backtest.load_panel(codes)
+        preset = portfolio_backtest.PRESETS[next(iter(portfolio_backtest.PRESETS))]
+        self.run('backtest.portfolio_run', lambda: portfolio_backtest.run_backtest(panel, preset))
+
+        wf_codes = codes[:50]
+        self.run('backtest.walk_forward', lambda: walk_forward.run(wf_codes, cache_path=None))
+
+        out = str(self.work / 'param_sweep.csv')
+        stacked = vsb.load_panel(codes, holds=SWEEP_GRID['hold'])
+        self.run('backtest.param_sweep',
+                 lambda: _quiet(param_sweep.sweep, stacked, SWEEP_GRID, out, workers=1, sample_frac=1.0))
+
+    # ---------- dashboard ----------
+    def dashboard(self):
+        import watchlist_dashboard
+        import watchlist_tracker
+        self._pin()
+        if not watchlist_tracker.DB_PATH.is_relative_to(self.work) or not watchlist_tracker.DB_PATH.exists():
+            self.tracker()
+
+        watchlist_dashboard.DB_PATH = watchlist_tracker.DB_PATH
+        client = watchlist_dashboard.app.test_client()
+        conn = watchlist_tracker.conn_db()
+        code = conn.execute('SELECT code FROM watchlist_records ORDER BY id DESC LIMIT 1').fetchone()['code']
+        conn.close()
+
+        for name, url in (('index', '/'), ('history', '/history'), ('records', '/records'),
+                          ('stats', '/stats'), ('stock', f'/stock/{code}')):
+            def get(url=url):
+                resp = client.get(url)
+                if resp.status_code != 200:
+                    raise RuntimeError(f'{url} -> {resp.status_code}')
+            self.run(f'dashboard.{name}', get)
+
+
+def _quiet(fn: Callable, *args, **kwargs):
+    """运行时屏蔽被测函数自己的进度输出"""
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            sys.stdout = stdout
+
+
+# ============================================
+# 历史与对比
+# ============================================
+def git_commit() -> dict:
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=SCRIPTS_DIR, capture_output=True, text=True).stdout.strip()
+
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD') or 'unknown',
+        'subject': git('log', '-1', '--format=%s'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+    }
+
+
+def load_history() -> List[dict]:
+    if not HISTORY_PATH.exists():
+        return []
+    return [json.loads(line) for line in HISTORY_PATH.read_text(encoding='utf-8').splitlines() if line.strip()]
+
+
+def save_run(entry: dict):
+    HISTORY_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with HISTORY_PATH.open('a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def compare(current: dict, base: dict) -> List[str]:
+    """返回退化项说明（时间与峰值 RSS，均需同时超过相对与绝对阈值）"""
+    regressions = []
+    print(f"\n对比 {base['commit']}（{base['time']}）-> {current['commit']}{'+dirty' if current['dirty'] else ''}")
+    print(f"  {'阶段':<28} {'基线ms':>10} {'当前ms':>10} {'变化':>8} {'RSS变化MB':>10}")
+    for name, cur in current['results'].items():
+        old = base['results'].get(name)
+        if not old:
+            print(f"  {name:<28} {'-':>10} {cur['wall_ms']:>10.1f} {'新增':>8}")
+            continue
+        ratio = cur['wall_ms'] / old['wall_ms'] - 1 if old['wall_ms'] else 0.0
+        d_rss = cur['rss_mb'] - old['rss_mb']
+        flag = ''
+        # 退化判定用最小值（中位数与最小值都变慢才算，单次抖动不会误报）
+        slow = min(cur['min_ms'] / old['min_ms'] - 1 if old['min_ms'] else 0.0, ratio)
+        if slow > REGRESSION and cur['min_ms'] - old['min_ms'] > MIN_DELTA_MS:
+            flag = ' ❌'
+            regressions.append(f"{name}: {old['wall_ms']:.1f}ms -> {cur['wall_ms']:.1f}ms ({ratio:+.0%})")
+        if d_rss > MIN_DELTA_MB and d_rss > REGRESSION * old['rss_mb']:
+            flag = ' ❌'
+            regressions.append(f"{name}: RSS {old['rss_mb']:.1f}MB -> {cur['rss_mb']:.1f}MB")
+        print(f"  {name:<28} {old['wall_ms']:>10.1f} {cur['wall_ms']:>10.1f} {ratio:>+8.0%} {d_rss:>+10.1f}{flag}")
+    return regressions
+
+
+def find_base(history: List[dict], current: dict, ref: Optional[str]) -> Optional[dict]:
+    """ref 指定提交；否则取当前提交之前最近一个不同提交的运行"""
+    for entry in reversed(history):
+        if entry is current:
+            continue
+        if ref:
+            if entry['commit'].startswith(ref) or ref.startswith(entry['commit']):
+                return entry
+        elif entry['commit'] != current['commit']:
+            return entry
+    return None
+
+
+def report_regressions(regressions: List[str]) -> int:
+    if not regressions:
+        print('\n✅ 无退化')
+        return 0
+    print(f'\n❌ {len(regressions)} 项退化（阈值 +{REGRESSION:.0%}）:')
+    for r in regressions:
+        print(f'   {r}')
+    return 1
+
+
+# ============================================
+# 命令行
+# ============================================
+def cmd_run(args) -> int:
+    fixtures = Path(args.fixtures)
+    work = Path(tempfile.mkdtemp(prefix='bench_pipeline_'))
+    try:
+        if not (fixtures / 'manifest.json').exists():
+            fixtures = work / 'fixtures'
+            print(f'ℹ️ 未找到录制夹具 {args.fixtures}，使用合成夹具')
+            synthesize_fixtures(fixtures)
+
+        bench = Bench(fixtures, work, args.repeat)
+        print(f"夹具: {bench.manifest['source']}（{bench.manifest['created_at']}）  重复 {args.repeat} 次")
+        print(f"  {'阶段':<28} {'墙钟':>12} {'RSS增量':>10} {'分配峰值':>12} {'净增块':>9}")
+        t0 = time.perf_counter()
+        for group in args.only:
+            getattr(bench, group)()
+        elapsed = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    entry = {
+        **git_commit(),
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'fixtures': bench.manifest['source'],
+        'repeat': args.repeat,
+        'python': sys.version.split()[0],
+        'elapsed_s': round(elapsed, 1),
+        'results': bench.results,
+    }
+    history = load_history()
+    if not args.no_save:
+        save_run(entry)
+        print(f'\n💾 {HISTORY_PATH}（{entry["commit"]}）')
+
+    base = find_base(history, entry, args.base)
+    if base is None:
+        print('\nℹ️ 没有可对比的历史运行')
+        return 0
+    return report_regressions(compare(entry, base))
+
+
+def cmd_compare(args) -> int:
+    history = load_history()
+    if not history:
+        print(f'❌ 没有历史记录: {HISTORY_PATH}')
+        return 1
+    current = history[-1]
+    base = find_base(history, current, args.base)
+    if base is None:
+        print('ℹ️ 没有可对比的历史运行')
+        return 0
+    return report_regressions(compare(current, base))
+
+
+def cmd_history(args) -> int:
+    history = load_history()
+    names = sorted({n for e in history for n in e['results']})
+    if args.stage:
+        names = [n for n in names if n.startswith(args.stage)]
+    for name in names:
+        print(f'\n{name}')
+        for e in history:
+            r = e['results'].get(name)
+            if r:
+                print(f"  {e['time']}  {e['commit']}{'+' if e['dirty'] else ' '}  {r['wall_ms']:>10.1f}ms "
+                      f"{r['rss_mb']:>8.1f}MB {r['alloc_kb']:>10.0f}KB  {e['subject'][:40]}")
+    return 0
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description='盘前链路离线基准')
+    sub = p.add_subparsers(dest='cmd', required=True)
+
+    run = sub.add_parser('run')
+    run.add_argument('--repeat', type=int, default=REPEAT)
+    run.add_argument('--only', type=lambda s: [g for g in s.split(',') if g], default=list(GROUPS),
+                     help=f"逗号分隔，可选 {','.join(GROUPS)}")
+    run.add_argument('--fixtures', default=str(FIXTURE_DIR))
+    run.add_argument('--base', help='对比的基线提交（默认上一个不同提交的最近一次运行）')
+    run.add_argument('--no-save', action='store_true')
+
+    rec = sub.add_parser('record')
+    rec.add_argument('--fixtures', default=str(FIXTURE_DIR))
+
+    cmp_ = sub.add_parser('compare')
+    cmp_.add_argument('--base')
+
+    hist = sub.add_parser('history')
+    hist.add_argument('--stage', help='阶段名前缀，如 preopen')
+
+    args = p.parse_args()
+    if args.cmd == 'run':
+        bad = [g for g in args.only if g not in GROUPS]
+        if bad:
+            p.error(f"未知分组: {','.join(bad)}")
+        return cmd_run(args)
+    if args.cmd == 'record':
+        root = Path(args.fixtures)
+        shutil.rmtree(root, ignore_errors=True)
+        record_fixtures(root)
+        return 0
+    if args.cmd == 'compare':
+        return cmd_compare(args)
+    return cmd_history(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
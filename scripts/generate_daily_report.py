@@ -16,10 +16,11 @@ import subprocess
 import sys
 import os
 import argparse
-import urllib.request
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from tencent_quote import QuoteTable, fetch_quotes
+
 # === 配置 ===
 OBSIDIAN_VAULT = "/root/.openclaw/workspace/obsidian"
 REPORTS_DIR = f"{OBSIDIAN_VAULT}/04-Reviews"
@@ -95,48 +96,9 @@ def load_key_stocks() -> dict:
     return {c: c[-6:] for c in tencent_codes}
 
 
-def fetch_tencent_data(codes: list[str]) -> dict:
-    """从腾讯财经获取实时行情数据"""
-    codes_str = ",".join(codes)
-    url = f"https://qt.gtimg.cn/q={codes_str}"
-
-    req = urllib.request.Request(url, headers={
-        "User-Agent": "Mozilla/5.0",
-        "Accept": "*/*",
-    })
-
-    with urllib.request.urlopen(req, timeout=10) as resp:
-        raw = resp.read().decode("gbk")
-
-    results = {}
-    for line in raw.strip().split(";"):
-        line = line.strip()
-        if not line:
-            continue
-        m = re.search(r'v_(\w+)="(.*)"', line)
-        if not m:
-            continue
-        code = m.group(1)
-        parts = m.group(2).split("~")
-        if len(parts) < 50:
-            continue
-
-        results[code] = {
-            "name": parts[1],
-            "code": parts[2],
-            "current": float(parts[3]) if parts[3] else 0,
-            "prev_close": float(parts[4]) if parts[4] else 0,
-            "open": float(parts[5]) if parts[5] else 0,
-            "volume": int(parts[6]) if parts[6] else 0,
-            "high": float(parts[33]) if len(parts) > 33 and parts[33] else 0,
-            "low": float(parts[34]) if len(parts) > 34 and parts[34] else 0,
-            "change_amt": float(parts[31]) if len(parts) > 31 and parts[31] else 0,
-            "change_pct": float(parts[32]) if len(parts) > 32 and parts[32] else 0,
-            "amount_wan": float(parts[37]) if len(parts) > 37 and parts[37] else 0,
-            "time": parts[30] if len(parts) > 30 else "",
-        }
-
-    return results
+def fetch_tencent_data(codes: list[str]) -> QuoteTable:
+    """从腾讯财经获取实时行情数据（分批并发，结果可按 {代码: {字段: 值}} 读取）"""
+    return fetch_quotes(codes)
 
 
 def parse_prev_report(date_str: str) -> dict:
@@ -470,12 +432,11 @@ def main():
     date_str = args.date
     print(f"📊 生成 {date_str} A股复盘报告...")
 
-    print("  📈 获取指数数据...")
-    indices = fetch_tencent_data(list(INDICES.keys()))
-
-    print("  📊 获取个股数据...")
+    print("  📈 获取指数与个股数据...")
     key_stocks = load_key_stocks()
-    stocks = fetch_tencent_data(list(key_stocks.keys()))
+    quotes = fetch_tencent_data(list(INDICES.keys()) + list(key_stocks.keys()))
+    indices = quotes.subset(INDICES.keys())
+    stocks = quotes.subset(key_stocks.keys())
 
     if not indices:
         print("❌ 获取指数数据失败")
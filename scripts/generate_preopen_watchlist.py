@@ -11,58 +11,89 @@ import json
 import os
 import re
 import sys
+import threading
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
+from urllib.parse import urlparse
 
 import akshare as ak
 import pandas as pd
 import requests
 
+from http_cache import HttpCache
+from pipeline_trace import Tracer, report_lines, stage_ms
+
+# 共用的指标库与本地行情存储（02-scripts/market）
+MARKET_DIR = Path(__file__).resolve().parent.parent / '02-scripts' / 'market'
+sys.path.insert(0, str(MARKET_DIR))
+import indicator_state  # noqa: E402
+import market_store  # noqa: E402
+import strategy_dsl  # noqa: E402
+
 # ============================================
-# 交易日检查（非交易日直接跳过）
+# 交易日检查（main 开头执行，非交易日直接跳过；被基准等脚本导入时不触发）
 # ============================================
 TRADING_DAY_CHECK_CMD = "python3 /root/.openclaw/workspace/scripts/check_trading_day.py --quiet"
-result = os.system(TRADING_DAY_CHECK_CMD)
-if result != 0:
-    print("❌ 非交易日，跳过候选池生成")
-    sys.exit(0)
 
 WORKSPACE = Path('/root/.openclaw/workspace')
 OUT_DIR = WORKSPACE / 'reports'
+# 增量指标状态：历史K线每天只下载回放一次，盘中重复运行只用新浪实时 tick
+STATE_PATH = WORKSPACE / 'data' / 'preopen_indicator_state.json'
 
-H = {'User-Agent': 'Mozilla/5.0'}
-
-
-def req_get(url: str, params=None, retries: int = 4, timeout: int = 20):
-    last = None
-    for i in range(retries):
-        try:
-            r = requests.get(url, params=params, headers=H, timeout=timeout)
-            r.raise_for_status()
-            return r
-        except Exception as e:
-            last = e
-            time.sleep(1.2 * (i + 1))
-    raise last
-
-
-def ema(s: pd.Series, span: int) -> pd.Series:
-    return s.ewm(span=span, adjust=False).mean()
-
-
-def macd(close: pd.Series):
-    dif = ema(close, 12) - ema(close, 26)
-    dea = ema(dif, 9)
-    return dif, dea
+# 历史K线并发下载
+HIST_WORKERS = 8          # 并发线程数
+BREAKER_THRESHOLD = 5     # 连续失败 N 次后熔断该数据源
+BREAKER_COOLDOWN = 30.0   # 熔断后多少秒放行一次试探请求
 
+H = {'User-Agent': 'Mozilla/5.0'}
 
-def rsi(close: pd.Series, n: int = 14) -> pd.Series:
-    d = close.diff()
-    up = d.clip(lower=0)
-    down = -d.clip(upper=0)
-    rs = up.rolling(n).mean() / (down.rolling(n).mean() + 1e-9)
-    return 100 - (100 / (1 + rs))
+# 新浪 / 腾讯实时接口的磁盘缓存（HTTP_CACHE_MODE=replay 可完全离线回放）
+HTTP_CACHE = HttpCache(WORKSPACE / 'data' / 'http_cache')
+# 回放模式下 akshare 请求不经过缓存，默认不调用；基准把 ak 换成录制夹具时打开
+AK_IN_REPLAY = False
+
+# 阶段 / 外部请求追踪（JSONL 落在报告旁，汇总写进报告）
+TRACER = Tracer()
+SOURCES = (('sina.com.cn', 'sina'), ('gtimg.cn', 'tencent'))
+
+STAGE_LABELS = {
+    'fetch_main_sectors': '板块',
+    'fetch_index_chg': '大盘',
+    'fetch_sector_stocks': '成分股',
+    'enrich_indicators': '指标',
+    'select_tiers': '分层',
+}
+
+
+def _source(url: str) -> str:
+    host = urlparse(url).netloc
+    return next((name for suffix, name in SOURCES if host.endswith(suffix)), host)
+
+
+def req_get(url: str, params=None, retries: int = 4, timeout: int = 20, ttl: float | None = None):
+    name = urlparse(url).path.rsplit('/', 1)[-1] or url
+    with TRACER.span(name, kind='http', source=_source(url), node=(params or {}).get('node'), cache='hit') as sp:
+        def fetch(extra_headers):
+            sp['cache'] = 'network'
+            last = None
+            for i in range(retries):
+                sp['retries'] = i
+                try:
+                    r = requests.get(url, params=params, headers={**H, **extra_headers}, timeout=timeout)
+                    r.raise_for_status()
+                    if r.status_code == 304:
+                        sp['cache'] = 'revalidated'
+                    return r
+                except Exception as e:
+                    last = e
+                    time.sleep(1.2 * (i + 1))
+            raise last
+
+        r = HTTP_CACHE.get(url, params, ttl=ttl, fetch=fetch)
+        sp['bytes'] = len(r.content)
+        return r
 
 
 def fetch_main_sectors():
@@ -128,6 +159,9 @@ def fetch_sector_stocks(main):
                     'chg': float(x.get('changepercent') or 0),
                     'turnover': float(x.get('turnoverratio') or 0),
                     'amount': float(x.get('amount') or 0),
+                    'trade': float(x.get('trade') or 0),
+                    'high': float(x.get('high') or 0),
+                    'volume': float(x.get('volume') or 0),
                 })
             except Exception:
                 # 字段异常也视作剔除
@@ -149,6 +183,141 @@ def fetch_sector_stocks(main):
     return deduped, stats
 
 
+class CircuitBreaker:
+    """单个数据源的熔断器：连续失败达到阈值后直接跳过，冷却后放行一次试探；同时累计耗时"""
+
+    def __init__(self, name: str, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+        self.counts = {'ok': 0, 'failed': 0, 'skipped': 0, 'ms': 0.0}
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.failures < self.threshold:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                self.opened_at = time.monotonic()  # 半开：只放行这一次
+                return True
+            self.counts['skipped'] += 1
+            return False
+
+    def record(self, ok: bool, seconds: float):
+        with self.lock:
+            self.counts['ms'] += seconds * 1000
+            if ok:
+                self.counts['ok'] += 1
+                self.failures = 0
+            else:
+                self.counts['failed'] += 1
+                self.failures += 1
+                if self.failures >= self.threshold:
+                    self.opened_at = time.monotonic()
+
+    def call(self, fn, *args, **kwargs):
+        """熔断时返回 None；异常或空结果记为失败"""
+        with TRACER.span(fn.__name__, kind='http', source=self.name, symbol=kwargs.get('symbol')) as sp:
+            if not self.allow():
+                sp['status'] = 'skipped'
+                return None
+            t0 = time.perf_counter()
+            try:
+                out = fn(*args, **kwargs)
+            except Exception as e:
+                out = None
+                sp['error'] = f'{type(e).__name__}: {e}'[:200]
+            ok = out is not None and len(out) > 0
+            sp['rows'] = len(out) if out is not None else 0
+            sp['status'] = 'ok' if ok else 'failed'
+            self.record(ok, time.perf_counter() - t0)
+            return out
+
+    def export(self) -> dict:
+        n = self.counts['ok'] + self.counts['failed']
+        return {
+            f'{self.name}_ok': self.counts['ok'],
+            f'{self.name}_failed': self.counts['failed'],
+            f'{self.name}_skipped': self.counts['skipped'],
+            f'{self.name}_avg_ms': round(self.counts['ms'] / n, 1) if n else 0.0,
+        }
+
+
+def load_local_hist(code: str):
+    """本地行情存储（market_store）里已更新到上一交易日的K线，没有则返回 None"""
+    meta = market_store.read_meta(code)
+    prev_day = datetime.now().date() - timedelta(days=1)
+    while prev_day.weekday() >= 5:
+        prev_day -= timedelta(days=1)
+    if not meta or not meta.get('rows') or meta['last_date'] < prev_day.isoformat():
+        return None
+    df = market_store.load_bars(code, columns=('close', 'high', 'volume'))
+    if df is None or len(df) < 35:
+        return None
+    return pd.DataFrame({
+        '日期': df['date'].dt.strftime('%Y-%m-%d'),
+        '收盘': df['close'],
+        '最高': df['high'],
+        '成交量': df['volume'] / 100,  # 存储为股，与 EM 口径（手）一致
+    })
+
+
+def fetch_hist(code: str, em: CircuitBreaker, tx: CircuitBreaker):
+    """
+    近几个月日K（qfq）：本地存储优先，其次 EM，失败时回退腾讯
+
+    Returns:
+        (hist, source)：hist 为 EM 字段命名的 DataFrame 或 None；
+        source 为 'local' / 'em' / 'tx'，腾讯回退也失败时为 'tx_failed'，未尝试回退为 None
+    """
+    with TRACER.span('fetch_hist', kind='hist', code=code) as sp:
+        hist, source = _fetch_hist(code, em, tx)
+        sp['source'] = source or 'none'
+        sp['rows'] = 0 if hist is None else len(hist)
+    return hist, source
+
+
+def _fetch_hist(code: str, em: CircuitBreaker, tx: CircuitBreaker):
+    hist = load_local_hist(code)
+    if hist is not None:
+        return hist, 'local'
+    if HTTP_CACHE.mode == 'replay' and not AK_IN_REPLAY:
+        # 离线回放：akshare 请求不经过缓存，只用本地数据
+        return None, None
+
+    end_date = datetime.now().strftime('%Y%m%d')
+    hist = em.call(ak.stock_zh_a_hist, symbol=code, period='daily',
+                   start_date='20251201', end_date=end_date, adjust='qfq')
+    if hist is not None and len(hist) >= 35:
+        return hist, 'em'
+
+    tx_symbol = f"sh{code}" if code.startswith('6') else f"sz{code}"
+    tx_df = tx.call(ak.stock_zh_a_hist_tx, symbol=tx_symbol,
+                    start_date='20251201', end_date=end_date, adjust='qfq')
+    if tx_df is None or tx_df.empty:
+        return hist, 'tx_failed'
+
+    # 对齐字段到 EM 命名
+    col_map = {
+        'date': '日期',
+        'open': '开盘',
+        'close': '收盘',
+        'high': '最高',
+        'low': '最低',
+        'amount': '成交量',  # tx amount 对应成交量
+        'vol': '成交额',
+    }
+    tx_df = tx_df.rename(columns=col_map)
+    # 仅保留需要字段
+    need_cols = ['日期', '开盘', '收盘', '最高', '最低', '成交量', '成交额']
+    for c in need_cols:
+        if c not in tx_df.columns:
+            tx_df[c] = 0
+    return tx_df[need_cols].copy(), 'tx'
+
+
 def enrich_indicators(stocks, idx_chg):
     stats = {
         'input_after_dedupe': len(stocks),
@@ -157,78 +326,60 @@ def enrich_indicators(stocks, idx_chg):
         'indicator_ok': 0,
         'fallback_tx_used': 0,
         'fallback_tx_failed': 0,
+        'state_reused': 0,
+        'hist_local': 0,
     }
 
+    states = indicator_state.load_states(str(STATE_PATH))
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    # 当天已回放过历史的直接复用状态，其余并发下载历史（各数据源独立熔断）
+    todo = [s['code'] for s in stocks if not (s['code'] in states and states[s['code']].synced_on == today)]
+    stats['state_reused'] = len(stocks) - len(todo)
+    em, tx = CircuitBreaker('em'), CircuitBreaker('tx')
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=HIST_WORKERS) as pool:
+        fetched = dict(zip(todo, pool.map(lambda c: fetch_hist(c, em, tx), todo)))
+    stats['hist_seconds'] = round(time.perf_counter() - t0, 2)
+    stats.update(em.export())
+    stats.update(tx.export())
+
     rows = []
     for s in stocks:
         code = s['code']
 
-        # 主数据源：EM；失败时回退腾讯历史数据
-        hist = None
-        try:
-            hist = ak.stock_zh_a_hist(
-                symbol=code,
-                period='daily',
-                start_date='20251201',
-                end_date=datetime.now().strftime('%Y%m%d'),
-                adjust='qfq',
-            )
-        except Exception:
-            hist = None
-
-        if hist is None or len(hist) < 35:
-            tx_symbol = f"sh{code}" if code.startswith('6') else f"sz{code}"
-            try:
-                tx_df = ak.stock_zh_a_hist_tx(
-                    symbol=tx_symbol,
-                    start_date='20251201',
-                    end_date=datetime.now().strftime('%Y%m%d'),
-                    adjust='qfq',
-                )
-                if tx_df is not None and not tx_df.empty:
-                    # 对齐字段到 EM 命名
-                    col_map = {
-                        'date': '日期',
-                        'open': '开盘',
-                        'close': '收盘',
-                        'high': '最高',
-                        'low': '最低',
-                        'amount': '成交量',  # tx amount 对应成交量
-                        'vol': '成交额',
-                    }
-                    tx_df = tx_df.rename(columns=col_map)
-                    # 仅保留需要字段
-                    need_cols = ['日期', '开盘', '收盘', '最高', '最低', '成交量', '成交额']
-                    for c in need_cols:
-                        if c not in tx_df.columns:
-                            tx_df[c] = 0
-                    hist = tx_df[need_cols].copy()
-                    stats['fallback_tx_used'] += 1
+        if code in fetched:
+            hist, source = fetched[code]
+            stats['hist_local'] += source == 'local'
+            stats['fallback_tx_used'] += source == 'tx'
+            stats['fallback_tx_failed'] += source == 'tx_failed'
+            if hist is None or len(hist) < 35:
+                # 区分失败与长度不足
+                if hist is None or len(hist) == 0:
+                    stats['hist_failed'] += 1
                 else:
-                    stats['fallback_tx_failed'] += 1
-            except Exception:
-                stats['fallback_tx_failed'] += 1
+                    stats['hist_too_short'] += 1
+                continue
 
-        if hist is None or len(hist) < 35:
-            # 区分失败与长度不足
-            if hist is None or len(hist) == 0:
-                stats['hist_failed'] += 1
-            else:
-                stats['hist_too_short'] += 1
-            continue
+            # 只回放已收盘K线，当日K线由下面的实时 tick 提供
+            done = hist[hist['日期'].astype(str).str[:10] < today]
+            states[code] = indicator_state.SymbolState.from_bars(
+                code, done['日期'], done['收盘'].astype(float), done['最高'].astype(float), done['成交量'].astype(float)
+            )
+            states[code].synced_on = today
+        st = states[code]
 
-        close = hist['收盘'].astype(float)
-        vol = hist['成交量'].astype(float)
-        ma5 = close.rolling(5).mean().iloc[-1]
-        ma10 = close.rolling(10).mean().iloc[-1]
-        ma20 = close.rolling(20).mean().iloc[-1]
-        vol5 = vol.rolling(5).mean().iloc[-1]
-        last = close.iloc[-1]
-        box_high = close.iloc[-11:-1].max()
-        high20 = hist['最高'].astype(float).iloc[-20:].max()
+        # 有成交时把新浪实时 tick 当作当日未收盘K线（成交量：股 -> 手，与历史口径一致）；
+        # 开盘前无成交时取最后一根已收盘K线
+        if s.get('trade', 0) > 0 and s.get('volume', 0) > 0:
+            snap = st.peek(s['trade'], max(s['high'], s['trade']), s['volume'] / 100)
+        else:
+            snap = st.snapshot()
 
-        dif, dea = macd(close)
-        rr = rsi(close, 14).iloc[-1]
+        last = snap['current']
+        ma5, ma10, ma20 = snap['ma5'], snap['ma10'], snap['ma20']
+        vol5 = snap['vol5']
+        rr = snap['rsi14']
 
         rows.append({
             **s,
@@ -236,21 +387,22 @@ def enrich_indicators(stocks, idx_chg):
             'ma5': float(ma5),
             'ma10': float(ma10),
             'ma20': float(ma20),
-            'high20': float(high20),
+            'high20': float(snap['high20']),
             'ma_bull': bool(ma5 > ma10 > ma20 and last > ma5),
-            'breakout10': bool(last >= box_high * 0.995),
-            'vol_ratio5': float(vol.iloc[-1] / vol5) if vol5 and vol5 > 0 else 0,
-            'macd_ok': bool(dif.iloc[-1] > 0 and dif.iloc[-1] > dea.iloc[-1]),
+            'breakout10': bool(last >= snap['box_high'] * 0.995),
+            'vol_ratio5': float(snap['vol'] / vol5) if vol5 and vol5 > 0 else 0,
+            'macd_ok': bool(snap['dif'] > 0 and snap['dif'] > snap['dea']),
             'rsi14': float(rr) if pd.notna(rr) else 0,
             'excess_vs_index': float(s['chg'] - idx_chg),
             'excess_vs_sector': float(s['chg'] - s['sector_chg']),
         })
 
+    indicator_state.save_states(str(STATE_PATH), states)
     stats['indicator_ok'] = len(rows)
     return pd.DataFrame(rows), stats
 
 
-def build_report(main, idx_chg, observe, confirm, attack, step_stats):
+def build_report(main, idx_chg, observe, confirm, attack, step_stats, spans=None):
     dt = datetime.now().strftime('%Y-%m-%d %H:%M')
     lines = []
     lines.append(f"# 开盘前候选观察名单（放宽版）")
@@ -331,14 +483,34 @@ def build_report(main, idx_chg, observe, confirm, attack, step_stats):
         f"腾讯回退成功 {step_stats['fallback_tx_used']} 只，"
         f"腾讯回退失败 {step_stats['fallback_tx_failed']} 只，"
         f"历史长度不足 {step_stats['hist_too_short']} 只，"
+        f"复用当日指标状态 {step_stats['state_reused']} 只，"
         f"成功计算 {step_stats['indicator_ok']} 只"
     )
+    lines.append(
+        f"   - 数据源：本地存储 {step_stats['hist_local']} 只；"
+        f"EM 成功 {step_stats['em_ok']} / 失败 {step_stats['em_failed']} / 熔断跳过 {step_stats['em_skipped']}，"
+        f"平均 {step_stats['em_avg_ms']:.0f}ms；"
+        f"腾讯 成功 {step_stats['tx_ok']} / 失败 {step_stats['tx_failed']} / 熔断跳过 {step_stats['tx_skipped']}，"
+        f"平均 {step_stats['tx_avg_ms']:.0f}ms；"
+        f"{HIST_WORKERS} 线程并发下载耗时 {step_stats['hist_seconds']:.1f}s"
+    )
     lines.append(
         f"5. 放宽规则筛选：观察仓 {step_stats['final_candidates']} 只，"
         f"确认仓 {step_stats['confirm_count']} 只，"
         f"进攻仓 {step_stats['attack_count']} 只，"
         f"观察仓筛选剔除 {step_stats['filtered_out']} 只"
     )
+    if spans:
+        stages = stage_ms(spans)
+        lines.append(
+            "6. 阶段耗时："
+            + " / ".join(f"{STAGE_LABELS.get(k, k)} {v / 1000:.2f}s" for k, v in stages.items())
+            + f"，合计 {sum(stages.values()) / 1000:.2f}s"
+        )
+
+        lines.append("")
+        lines.append("## 耗时追踪（外部请求）")
+        lines.extend(report_lines(spans))
 
     lines.append("")
     lines.append("## 生成过程（简版，便于跟踪调整）")
@@ -351,41 +523,36 @@ def build_report(main, idx_chg, observe, confirm, attack, step_stats):
     return '\n'.join(lines)
 
 
-def main():
-    main_sectors = fetch_main_sectors()
-    idx_chg = fetch_index_chg()
-    stocks, stock_stats = fetch_sector_stocks(main_sectors)
-    df, indicator_stats = enrich_indicators(stocks, idx_chg)
-
-    # 三仓分层：观察 / 确认 / 进攻
+def select_tiers(df: pd.DataFrame):
+    """三仓分层：观察 / 确认 / 进攻（条件见 strategy_dsl.WATCHLIST_TIERS，排序与名额在此处理）"""
     if df.empty:
-        observe = df
-        confirm = df
-        attack = df
-    else:
-        observe = df[
-            (df['chg'] >= 2.0)
-            & (df['turnover'] >= 2.0)
-            & (df['turnover'] <= 15.0)
-            & (df['vol_ratio5'] >= 0.9)
-            & (df['vol_ratio5'] <= 4.0)
-            & (df['excess_vs_index'] >= 1.5)
-        ].sort_values(['excess_vs_index', 'chg', 'turnover'], ascending=False).head(10)
-
-        confirm = observe[
-            (observe['excess_vs_index'] >= 3.0)
-            & (observe['excess_vs_sector'] >= 2.0)
-            & (observe['macd_ok'])
-            & (observe['rsi14'] >= 55)
-            & (observe['rsi14'] <= 85)
-            & (observe['vol_ratio5'] >= 1.0)
-        ].sort_values(['excess_vs_index', 'chg'], ascending=False).head(2)
-
-        attack = confirm[
-            (confirm['chg'] >= 7.0)
-            & (confirm['turnover'] >= 5.0)
-            & (confirm['turnover'] <= 15.0)
-        ].sort_values(['chg', 'turnover'], ascending=False).head(1)
+        return df, df, df
+    for tier, mask in strategy_dsl.evaluate(strategy_dsl.WATCHLIST_TIERS, df).items():
+        df[f'is_{tier}'] = mask
+
+    observe = df[df['is_observe']].sort_values(['excess_vs_index', 'chg', 'turnover'], ascending=False).head(10)
+    confirm = observe[observe['is_confirm']].sort_values(['excess_vs_index', 'chg'], ascending=False).head(2)
+    attack = confirm[confirm['is_attack']].sort_values(['chg', 'turnover'], ascending=False).head(1)
+    return observe, confirm, attack
+
+
+def main():
+    # 交易日检查（非交易日直接跳过）
+    if os.system(TRADING_DAY_CHECK_CMD) != 0:
+        print("❌ 非交易日，跳过候选池生成")
+        sys.exit(0)
+
+    TRACER.reset()
+    with TRACER.span('fetch_main_sectors'):
+        main_sectors = fetch_main_sectors()
+    with TRACER.span('fetch_index_chg'):
+        idx_chg = fetch_index_chg()
+    with TRACER.span('fetch_sector_stocks'):
+        stocks, stock_stats = fetch_sector_stocks(main_sectors)
+    with TRACER.span('enrich_indicators'):
+        df, indicator_stats = enrich_indicators(stocks, idx_chg)
+    with TRACER.span('select_tiers'):
+        observe, confirm, attack = select_tiers(df)
 
     step_stats = {
         **stock_stats,
@@ -396,13 +563,16 @@ def main():
         'attack_count': int(len(attack)),
     }
 
-    md = build_report(main_sectors, idx_chg, observe, confirm, attack, step_stats)
+    step_stats.update({f'{k}_ms': v for k, v in stage_ms(TRACER.spans).items()})
+    with TRACER.span('build_report'):
+        md = build_report(main_sectors, idx_chg, observe, confirm, attack, step_stats, spans=list(TRACER.spans))
 
     OUT_DIR.mkdir(parents=True, exist_ok=True)
     d = datetime.now().strftime('%Y%m%d')
     out = OUT_DIR / f'preopen_watchlist_{d}.md'
     out.write_text(md, encoding='utf-8')
-    print(str(out))
+    TRACER.write_jsonl(OUT_DIR / f'preopen_watchlist_{d}.trace.jsonl')
+    print(str(out))  # 最后一行输出报告路径（run_preopen_watchlist_mail.sh 取 tail -n 1）
 
 
 if __name__ == '__main__':
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""跨运行的 HTTP 响应磁盘缓存（按 URL + 参数）
+- live：TTL 内直接用缓存；过期后带 If-None-Match / If-Modified-Since 条件请求，304 时续用缓存
+- record：总是请求网络并落盘（录制一次完整运行）
+- replay：只读缓存，不访问网络，未命中抛 CacheMiss（离线回放 / 基准）
+- off：不读不写
+
+模式与 TTL 可用环境变量覆盖：HTTP_CACHE_MODE / HTTP_CACHE_TTL / HTTP_CACHE_DIR
+
+用法：
+    cache = HttpCache(WORKSPACE / 'data' / 'http_cache')
+    r = cache.get(url, params, ttl=60, fetch=lambda headers: requests.get(url, params=params, headers=headers))
+    python3 http_cache.py ls | clear
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+MODES = ('live', 'record', 'replay', 'off')
+DEFAULT_DIR = Path('/root/.openclaw/workspace/data/http_cache')
+DEFAULT_TTL = 60.0
+
+
+class CacheMiss(KeyError):
+    """replay 模式下请求未被录制"""
+
+
+def cache_key(url: str, params: Optional[dict] = None) -> str:
+    raw = json.dumps([url, sorted((params or {}).items())], ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class HttpCache:
+    def __init__(self, root=None, mode: Optional[str] = None, ttl: Optional[float] = None):
+        self.root = Path(os.environ.get('HTTP_CACHE_DIR') or root or DEFAULT_DIR)
+        self.mode = mode or os.environ.get('HTTP_CACHE_MODE', 'live')
+        if self.mode not in MODES:
+            raise ValueError(f"HTTP_CACHE_MODE 必须是 {MODES} 之一: {self.mode}")
+        self.ttl = float(os.environ.get('HTTP_CACHE_TTL') or (DEFAULT_TTL if ttl is None else ttl))
+        self.stats = {'hit': 0, 'revalidated': 0, 'network': 0, 'stored': 0}
+        self._lock = threading.Lock()
+
+    # ---------- 磁盘 ----------
+    def _paths(self, key: str):
+        d = self.root / key[:2]
+        return d / f'{key}.json', d / f'{key}.body'
+
+    def load(self, key: str):
+        meta_path, body_path = self._paths(key)
+        if not meta_path.exists() or not body_path.exists():
+            return None
+        try:
+            return json.loads(meta_path.read_text(encoding='utf-8')), body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def store(self, key: str, url: str, params: Optional[dict], resp: requests.Response):
+        meta = {
+            'url': url,
+            'params': params or {},
+            'status': resp.status_code,
+            'encoding': resp.encoding,
+            'headers': {k: v for k, v in resp.headers.items()
+                        if k.lower() in ('content-type', 'etag', 'last-modified')},
+            'fetched_at': time.time(),
+        }
+        meta_path, body_path = self._paths(key)
+        self._write(body_path, resp.content)  # 先写正文，meta 作为提交标记
+        self._write(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        self._count('stored')
+
+    def _touch(self, key: str, meta: dict):
+        meta['fetched_at'] = time.time()
+        self._write(self._paths(key)[0], json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    @staticmethod
+    def build(meta: dict, body: bytes) -> requests.Response:
+        """缓存条目 -> requests.Response（.text / .json() 与原响应一致）"""
+        resp = requests.Response()
+        resp.status_code = meta['status']
+        resp._content = body
+        resp.headers = CaseInsensitiveDict(meta['headers'])
+        resp.encoding = meta['encoding']
+        resp.url = meta['url']
+        return resp
+
+    # ---------- 读取 ----------
+    def get(self, url: str, params: Optional[dict] = None, ttl: Optional[float] = None,
+            fetch: Callable[[Dict[str, str]], requests.Response] = None) -> requests.Response:
+        """
+        Args:
+            fetch: 实际发请求的函数，参数为需要附加的条件请求头
+            ttl: 本次请求的新鲜期（秒），None 用实例默认值
+        """
+        if self.mode == 'off':
+            return fetch({})
+
+        key = cache_key(url, params)
+        entry = self.load(key)
+
+        if self.mode == 'replay':
+            if entry is None:
+                raise CacheMiss(f'{url} {params or ""}')
+            self._count('hit')
+            return self.build(*entry)
+
+        if self.mode == 'live' and entry is not None:
+            meta, body = entry
+            if time.time() - meta['fetched_at'] < (self.ttl if ttl is None else ttl):
+                self._count('hit')
+                return self.build(meta, body)
+
+        headers = {}
+        if self.mode == 'live' and entry is not None:
+            validators = CaseInsensitiveDict(entry[0]['headers'])
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last-modified'):
+                headers['If-Modified-Since'] = validators['last-modified']
+
+        self._count('network')
+        resp = fetch(headers)
+        if resp.status_code == 304 and entry is not None:
+            self._touch(key, entry[0])
+            self._count('revalidated')
+            return self.build(*entry)
+        if resp.status_code == 200:
+            self.store(key, url, params, resp)
+        return resp
+
+    def clear(self) -> int:
+        n = 0
+        for p in self.root.glob('*/*.json'):
+            p.unlink(missing_ok=True)
+            p.with_suffix('.body').unlink(missing_ok=True)
+            n += 1
+        return n
+
+
+if __name__ == '__main__':
+    cache = HttpCache()
+    cmd = sys.argv[1] if len(sys.argv) > 1 else 'ls'
+    if cmd == 'clear':
+        print(f'🧹 已清除 {cache.clear()} 条缓存：{cache.root}')
+    else:
+        print(f'📁 {cache.root}（模式 {cache.mode}，TTL {cache.ttl:.0f}s）')
+        for p in sorted(cache.root.glob('*/*.json')):
+            meta = json.loads(p.read_text(encoding='utf-8'))
+            age = time.time() - meta['fetched_at']
+            print(f"  {age:>8.0f}s  {meta['status']}  {meta['url']}  {meta['params'] or ''}")
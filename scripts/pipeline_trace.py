@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""轻量阶段追踪：给流水线各阶段和每次外部请求打 span，落盘为 JSONL 并汇总
+- span 字段：id / parent / name / kind / thread / start_ms / ms / status + 调用方附加的属性
+  （外部请求常用 source / bytes / retries / cache / rows）
+- kind：stage（流水线阶段）/ http（外部请求）/ hist（单只股票历史K线，含最终数据源）
+- 工作线程里的 span 没有同线程父级时挂到当前阶段下
+
+用法：
+    TRACER = Tracer()
+    with TRACER.span('fetch_main_sectors'):
+        with TRACER.span('newSinaHy.php', kind='http', source='sina') as sp:
+            sp['bytes'] = len(body)
+    TRACER.write_jsonl(path)
+    python3 pipeline_trace.py reports/preopen_watchlist_20260320.trace.jsonl
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+
+class Tracer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.spans: List[dict] = []
+            self._ids = itertools.count(1)
+            self._stage = None
+            self.t0 = time.perf_counter()
+            self.started_at = time.time()
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name: str, kind: str = 'stage', **attrs):
+        """返回可写的属性字典；异常时 status=error 并继续抛出"""
+        stack = self._stack()
+        parent = stack[-1] if stack else self._stage
+        sp = {
+            'id': next(self._ids),
+            'parent': parent['id'] if parent else None,
+            'name': name,
+            'kind': kind,
+            'thread': threading.current_thread().name,
+            'start_ms': round((time.perf_counter() - self.t0) * 1000, 3),
+            'status': 'ok',
+            **attrs,
+        }
+        outer_stage = self._stage
+        if kind == 'stage':
+            self._stage = sp
+        stack.append(sp)
+        t0 = time.perf_counter()
+        try:
+            yield sp
+        except BaseException as e:
+            sp['status'] = 'error'
+            sp['error'] = f'{type(e).__name__}: {e}'[:200]
+            raise
+        finally:
+            sp['ms'] = round((time.perf_counter() - t0) * 1000, 3)
+            stack.pop()
+            if kind == 'stage':
+                self._stage = outer_stage
+            with self._lock:
+                self.spans.append(sp)
+
+    def write_jsonl(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s['start_ms'])
+        with path.open('w', encoding='utf-8') as f:
+            for sp in spans:
+                f.write(json.dumps(sp, ensure_ascii=False, default=str) + '\n')
+
+
+# ============================================
+# 汇总
+# ============================================
+def _p95(values: List[float]) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.95))] if values else 0.0
+
+
+def stage_ms(spans: Iterable[dict]) -> Dict[str, float]:
+    """阶段名 -> 耗时（ms），按开始时间排序"""
+    return {s['name']: s['ms'] for s in sorted(spans, key=lambda s: s['start_ms']) if s['kind'] == 'stage'}
+
+
+def summarize(spans: Iterable[dict], kind: str = 'http', key: str = 'source') -> Dict[str, dict]:
+    """按 key 属性分组统计某类 span：次数 / 失败 / 重试 / 缓存命中 / 总耗时 / 平均 / P95 / 最慢 / 字节"""
+    groups = defaultdict(list)
+    for s in spans:
+        if s['kind'] == kind:
+            groups[s.get(key) or '-'].append(s)
+
+    out = {}
+    for name, items in groups.items():
+        ms = [s['ms'] for s in items]
+        out[name] = {
+            'count': len(items),
+            'errors': sum(s['status'] not in ('ok', 'skipped') for s in items),
+            'skipped': sum(s['status'] == 'skipped' for s in items),
+            'retries': sum(s.get('retries', 0) for s in items),
+            'cached': sum(s.get('cache') == 'hit' for s in items),
+            'total_ms': round(sum(ms), 1),
+            'avg_ms': round(sum(ms) / len(ms), 1),
+            'p95_ms': round(_p95(ms), 1),
+            'max_ms': round(max(ms), 1),
+            'bytes': sum(s.get('bytes', 0) for s in items),
+        }
+    return dict(sorted(out.items(), key=lambda kv: -kv[1]['total_ms']))
+
+
+def report_lines(spans: List[dict]) -> List[str]:
+    """Markdown 汇总：外部请求按数据源、历史K线按最终来源"""
+    lines = []
+    http = summarize(spans, 'http', 'source')
+    if http:
+        lines.append("| 数据源 | 请求 | 失败 | 熔断跳过 | 重试 | 缓存命中 | 总耗时 | 平均 | P95 | 最慢 | 流量 |")
+        lines.append("|---|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|")
+        for name, r in http.items():
+            lines.append(
+                f"| {name} | {r['count']} | {r['errors']} | {r['skipped']} | {r['retries']} | {r['cached']} | "
+                f"{r['total_ms'] / 1000:.2f}s | {r['avg_ms']:.0f}ms | {r['p95_ms']:.0f}ms | {r['max_ms']:.0f}ms | "
+                f"{r['bytes'] / 1024:.0f}KB |"
+            )
+    hist = summarize(spans, 'hist', 'source')
+    if hist:
+        lines.append("")
+        lines.append("- 历史K线最终来源：" + "；".join(
+            f"{name} {r['count']} 只（平均 {r['avg_ms']:.0f}ms，P95 {r['p95_ms']:.0f}ms）" for name, r in hist.items()))
+    return lines
+
+
+def load_jsonl(path: Path) -> List[dict]:
+    return [json.loads(line) for line in Path(path).read_text(encoding='utf-8').splitlines() if line.strip()]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('用法: python3 pipeline_trace.py <trace.jsonl>')
+        sys.exit(1)
+    spans = load_jsonl(Path(sys.argv[1]))
+    print(f'📁 {sys.argv[1]}（{len(spans)} 个 span）')
+    for name, ms in stage_ms(spans).items():
+        print(f'  {name:<24} {ms / 1000:>8.2f}s')
+    print()
+    print('\n'.join(report_lines(spans)))
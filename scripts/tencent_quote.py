@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+腾讯财经 qt.gtimg.cn 批量实时行情客户端
+
+- 任意数量代码按 URL 长度均匀分批（不会出现最后一批只有几只）
+- 各批并发请求，每个响应只做一次 GBK 解码
+- 结果为列式 QuoteTable：数值列为 array('d')，同时兼容原来的 {代码: {字段: 值}} 读法
+
+Usage:
+    from tencent_quote import fetch_quotes
+    table = fetch_quotes(["sh000001", "sz399001", "sh600519"])
+    table["sh600519"]["change_pct"]          # 按行读
+    table.column("change_pct")               # 整列 array('d')
+
+    python3 tencent_quote.py sh000001 sz399006 sh600519
+"""
+
+import math
+import sys
+import urllib.request
+from array import array
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+# === 配置 ===
+QUOTE_URL = "https://qt.gtimg.cn/q="
+HEADERS = {"User-Agent": "Mozilla/5.0", "Accept": "*/*"}
+MAX_URL_LEN = 2000      # 单个请求 URL 上限（字符）
+MAX_WORKERS = 8
+TIMEOUT = 10
+MIN_FIELDS = 50         # 字段数不足的行视为无效（停牌/退市代码返回的短串）
+
+# 数值字段 -> 在 ~ 分隔串中的下标
+NUMERIC_FIELDS = {
+    "current": 3,
+    "prev_close": 4,
+    "open": 5,
+    "volume": 6,
+    "change_amt": 31,
+    "change_pct": 32,
+    "high": 33,
+    "low": 34,
+    "amount_wan": 37,
+    "turnover": 38,
+}
+INT_FIELDS = ("volume",)
+
+
+class QuoteTable(Mapping):
+    """
+    列式行情快照
+
+    codes / names / times 为列表，数值字段为 array('d')（缺失为 0，与旧实现一致）；
+    作为 Mapping 时 table[code] 返回该行 dict，便于沿用旧的 dict-of-dicts 代码。
+    """
+
+    def __init__(self, fields=tuple(NUMERIC_FIELDS)):
+        self.fields = tuple(fields)
+        self.codes = []
+        self.names = []
+        self.stock_codes = []
+        self.times = []
+        self.columns = {f: array("d") for f in self.fields}
+        self._index = {}
+
+    def append(self, code: str, parts: list):
+        self._index[code] = len(self.codes)
+        self.codes.append(code)
+        self.names.append(parts[1])
+        self.stock_codes.append(parts[2])
+        self.times.append(parts[30] if len(parts) > 30 else "")
+        for f in self.fields:
+            v = parts[NUMERIC_FIELDS[f]]
+            try:
+                self.columns[f].append(float(v) if v else 0.0)
+            except ValueError:
+                self.columns[f].append(0.0)
+
+    def extend(self, other: "QuoteTable"):
+        for i, code in enumerate(other.codes):
+            if code in self._index:
+                continue
+            self._index[code] = len(self.codes)
+            self.codes.append(code)
+            self.names.append(other.names[i])
+            self.stock_codes.append(other.stock_codes[i])
+            self.times.append(other.times[i])
+            for f in self.fields:
+                self.columns[f].append(other.columns[f][i])
+
+    def column(self, field: str) -> array:
+        return self.columns[field]
+
+    def subset(self, codes) -> "QuoteTable":
+        """按给定代码顺序取子表（不存在的跳过）"""
+        out = QuoteTable(self.fields)
+        for code in codes:
+            i = self._index.get(code)
+            if i is None:
+                continue
+            out._index[code] = len(out.codes)
+            out.codes.append(code)
+            out.names.append(self.names[i])
+            out.stock_codes.append(self.stock_codes[i])
+            out.times.append(self.times[i])
+            for f in self.fields:
+                out.columns[f].append(self.columns[f][i])
+        return out
+
+    def row(self, i: int) -> dict:
+        r = {"name": self.names[i], "code": self.stock_codes[i], "time": self.times[i]}
+        for f in self.fields:
+            v = self.columns[f][i]
+            r[f] = int(v) if f in INT_FIELDS else v
+        return r
+
+    # Mapping 接口
+    def __getitem__(self, code: str) -> dict:
+        return self.row(self._index[code])
+
+    def __iter__(self):
+        return iter(self.codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self._index
+
+
+def parse_quotes(raw: str, table: QuoteTable = None) -> QuoteTable:
+    """解析一个已解码的响应：v_sh600519="1~贵州茅台~600519~...";"""
+    table = table if table is not None else QuoteTable()
+    for seg in raw.split(";"):
+        key, sep, value = seg.strip().partition("=")
+        if not sep or not key.startswith("v_"):
+            continue
+        parts = value.strip('"').split("~")
+        if len(parts) < MIN_FIELDS:
+            continue
+        table.append(key[2:], parts)
+    return table
+
+
+def chunk_codes(codes: list, max_url_len: int = MAX_URL_LEN) -> list:
+    """按 URL 长度把代码均匀分成最少的批次"""
+    if not codes:
+        return []
+    per_code = max(len(c) for c in codes) + 1  # 含逗号
+    per_batch = max(1, (max_url_len - len(QUOTE_URL)) // per_code)
+    n_batches = math.ceil(len(codes) / per_batch)
+    size = math.ceil(len(codes) / n_batches)
+    return [codes[i:i + size] for i in range(0, len(codes), size)]
+
+
+def _fetch_chunk(codes: list) -> QuoteTable:
+    req = urllib.request.Request(QUOTE_URL + ",".join(codes), headers=HEADERS)
+    with urllib.request.urlopen(req, timeout=TIMEOUT) as resp:
+        raw = resp.read().decode("gbk", errors="replace")
+    return parse_quotes(raw)
+
+
+def fetch_quotes(codes, max_workers: int = MAX_WORKERS, max_url_len: int = MAX_URL_LEN) -> QuoteTable:
+    """
+    批量获取实时行情
+
+    Args:
+        codes: 腾讯行情代码（sh600519 / sz399001 …），重复的只取一次
+        max_workers: 并发批次数
+
+    Returns:
+        QuoteTable（按输入顺序；失败的批次跳过）
+    """
+    codes = list(dict.fromkeys(codes))
+    chunks = chunk_codes(codes, max_url_len)
+    table = QuoteTable()
+    if not chunks:
+        return table
+
+    def safe_fetch(chunk):
+        try:
+            return _fetch_chunk(chunk)
+        except Exception as e:
+            print(f"  ⚠️ 行情批次失败（{len(chunk)} 只）: {e}")
+            return QuoteTable()
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+        for part in pool.map(safe_fetch, chunks):
+            table.extend(part)
+    return table.subset(codes)
+
+
+if __name__ == "__main__":
+    t = fetch_quotes(sys.argv[1:] or ["sh000001", "sz399001", "sz399006"])
+    for code in t:
+        r = t[code]
+        print(f"{code} {r['name']}: {r['current']:.2f} ({r['change_pct']:+.2f}%)")
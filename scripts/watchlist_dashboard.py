@@ -8,22 +8,115 @@
 访问：http://localhost:5000
 """
 
+import queue
+import sys
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, g, jsonify, request, render_template_string
 
 import sqlite3
 
+# 板块成分索引（02-scripts/market/sector_index）
+MARKET_DIR = Path(__file__).resolve().parent.parent / '02-scripts' / 'market'
+sys.path.insert(0, str(MARKET_DIR))
+import sector_index  # noqa: E402
+
 DB_PATH = Path("/root/.openclaw/workspace/data/watchlist_tracker.db")
+STOCK_ANALYSIS_DB = Path("/root/.openclaw/workspace/data/stock_analysis.db")
+
+# 只读连接参数：看板不写库，query_only 兜底；mmap 直接映射库文件，页缓存 16MB
+READ_PRAGMAS = (
+    "PRAGMA query_only=ON",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-16000",
+)
+POOL_SIZE = 8  # 每个库最多保留的空闲连接数
 
 app = Flask(__name__)
 
 
-def conn_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# 查询计划测试（tests/test_query_plans.py）设为列表时记录每条实际执行的 SQL
+_SQL_TRACE = None
+
+
+# ---------------------------------------------------------------------------
+# 只读连接池：开发服务器每个请求一个线程，连接按线程借出、请求结束归还复用，
+# 省掉每次请求的打开 / 建 schema 缓存开销；库文件为 WAL 模式时读不阻塞早盘入库
+# ---------------------------------------------------------------------------
+class ReadPool:
+    def __init__(self, path: Path, size: int = POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+
+    def _open(self) -> sqlite3.Connection:
+        # 借出的连接同一时刻只归一个线程使用，归还后可能被别的线程借走
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.OperationalError:
+                pass  # 写连接正占用时切换失败，不影响读，下次新建连接再试
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._open()
+
+    def release(self, conn: sqlite3.Connection):
+        try:
+            conn.set_trace_callback(None)
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        if self._idle.qsize() < self.size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def read_pool(path: Path) -> ReadPool:
+    with _POOLS_LOCK:
+        if path not in _POOLS:
+            _POOLS[path] = ReadPool(path)
+        return _POOLS[path]
+
+
+def conn_db(path: Path = None) -> sqlite3.Connection:
+    """当前请求的只读连接：同一请求内复用，请求结束由 release_db 归还连接池"""
+    path = Path(path or DB_PATH)
+    conns = g.setdefault("db_conns", {})
+    if path not in conns:
+        conns[path] = read_pool(path).acquire()
+        if _SQL_TRACE is not None:
+            conns[path].set_trace_callback(_SQL_TRACE.append)
+    return conns[path]
+
+
+@app.teardown_appcontext
+def release_db(exc):
+    for path, conn in g.pop("db_conns", {}).items():
+        read_pool(path).release(conn)
 
 
 # ---------------------------------------------------------------------------
@@ -44,48 +137,58 @@ def history_pool():
     cur.execute("SELECT MAX(report_date) as latest FROM watchlist_records")
     latest_row = cur.fetchone()
     if not latest_row or not latest_row['latest']:
-        conn.close()
         return "<h1>暂无候选票数据</h1>"
     latest_date = datetime.strptime(latest_row['latest'], '%Y-%m-%d').date()
+    cutoff = (latest_date - timedelta(days=days)).isoformat()
 
-    # 获取所有活跃股票（未标记为'失效'的）及其最后出现日期
-    # 支持搜索过滤
-    if q:
-        cur.execute("""
-            SELECT code, name, sector, MAX(report_date) as last_date
-            FROM watchlist_records
-            WHERE status != '失效' AND (code LIKE ? OR name LIKE ?)
-            GROUP BY code, name, sector
-        """, (f"%{q}%", f"%{q}%"))
-    else:
-        cur.execute("""
-            SELECT code, name, sector, MAX(report_date) as last_date
-            FROM watchlist_records
-            WHERE status != '失效'
-            GROUP BY code, name, sector
-        """)
-    candidates = [dict(r) for r in cur.fetchall()]
-    conn.close()
-
-    # 筛选出超过阈值未出现的
-    stale = []
-    for cand in candidates:
-        last_dt = datetime.strptime(cand['last_date'], '%Y-%m-%d').date()
-        gap = (latest_date - last_dt).days
-        if gap >= days:
-            cand['gap_days'] = gap
-            stale.append(cand)
-
-    # 按最后出现日期倒序
-    stale.sort(key=lambda x: x['last_date'], reverse=True)
-
-    # 分页
-    total = len(stale)
-    start = (page - 1) * per_page
-    end = start + per_page
-    page_items = stale[start:end]
+    # 活跃股票（未标记为'失效'的记录）最后出现日期超过阈值的：直接查 code_summary，
+    # 筛选 / 分页 / 统计都在索引上完成，不随历史记录增长
+    where = "active_last_seen <= ?"
+    params = [cutoff]
+    if q:  # 支持搜索过滤
+        where += " AND (code LIKE ? OR name LIKE ?)"
+        params += [f"%{q}%", f"%{q}%"]
+    gap = "CAST(julianday(?) - julianday(active_last_seen) AS INTEGER)"
+
+    cur.execute(
+        f"SELECT COUNT(*) AS total, AVG({gap}) AS avg_gap, MAX({gap}) AS max_gap, MIN({gap}) AS min_gap "
+        f"FROM code_summary WHERE {where}",
+        [latest_date.isoformat()] * 3 + params,
+    )
+    agg = cur.fetchone()
+    total = agg['total']
     total_pages = (total + per_page - 1) // per_page
 
+    # 按最后出现日期倒序分页
+    cur.execute(
+        f"""
+        SELECT code, name, sector, active_last_seen AS last_date, {gap} AS gap_days
+        FROM code_summary
+        WHERE {where}
+        ORDER BY active_last_seen DESC
+        LIMIT ? OFFSET ?
+        """,
+        [latest_date.isoformat()] + params + [per_page, (page - 1) * per_page],
+    )
+    page_items = [dict(r) for r in cur.fetchall()]
+
+    # 计算统计信息
+    if total:
+        cur.execute(
+            f"SELECT COALESCE(sector, '未知') AS sector, COUNT(*) AS cnt FROM code_summary WHERE {where} "
+            f"GROUP BY 1 ORDER BY cnt DESC",
+            params,
+        )
+        stats = {
+            'avg_gap': round(agg['avg_gap'], 1),
+            'max_gap': agg['max_gap'],
+            'min_gap': agg['min_gap'],
+            # 板块分布
+            'sector_counts': {r['sector']: r['cnt'] for r in cur.fetchall()},
+        }
+    else:
+        stats = {'avg_gap': 0, 'max_gap': 0, 'min_gap': 0, 'sector_counts': {}}
+
     return render_template_string(
         HISTORY_TEMPLATE,
         stale=page_items,
@@ -94,7 +197,8 @@ def history_pool():
         total=total,
         page=page,
         total_pages=total_pages,
-        q=q
+        q=q,
+        stats=stats
     )
 
 
@@ -109,14 +213,10 @@ def stock_details_api():
     if not code:
         return jsonify({"error": "missing code parameter"}), 400
 
-    # daily_stock_analysis 的数据库路径
-    SX|    db_path = Path("/root/.openclaw/workspace/data/stock_analysis.db")
-    if not db_path.exists():
+    if not STOCK_ANALYSIS_DB.exists():
         return jsonify({"error": "daily_stock_analysis database not found"}), 404
 
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
+    cur = conn_db(STOCK_ANALYSIS_DB).cursor()
 
     try:
         cur.execute("""
@@ -129,10 +229,7 @@ def stock_details_api():
         """, (code,))
         rows = [dict(r) for r in cur.fetchall()]
     except Exception as e:
-        conn.close()
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
 
     if not rows:
         return jsonify({"total": 0, "records": []})
@@ -183,14 +280,6 @@ def index():
     conn = conn_db()
     cur = conn.cursor()
 
-    # 计算每只股票的最后出现日期（用于剩余天数）
-    cur.execute("""
-        SELECT code, MAX(report_date) as last_date
-        FROM watchlist_records
-        GROUP BY code
-    """)
-    last_date_map = {r['code']: r['last_date'] for r in cur.fetchall()}
-
     # 最新数据日期
     cur.execute("SELECT MAX(report_date) as latest FROM watchlist_records")
     latest_row = cur.fetchone()
@@ -200,19 +289,22 @@ def index():
     buckets = ["进攻", "确认", "观察"]
     data = {}
     for b in buckets:
+        # 每只股票的最后出现日期（用于剩余天数）取自 code_summary
         cur.execute(
             """
-            SELECT code, name, sector, chg_pct, status, note, target_range, ideal_buy, secondary_buy, stop_loss
-            FROM watchlist_records
-            WHERE report_date=? AND bucket=?
-            ORDER BY chg_pct DESC
+            SELECT r.code, r.name, r.sector, r.chg_pct, r.status, r.note, r.target_range,
+                   r.ideal_buy, r.secondary_buy, r.stop_loss, s.last_seen
+            FROM watchlist_records r
+            LEFT JOIN code_summary s ON s.code = r.code
+            WHERE r.report_date=? AND r.bucket=?
+            ORDER BY r.chg_pct DESC
             """,
             (date, b),
         )
         rows = [dict(r) for r in cur.fetchall()]
         # 为每条记录计算剩余天数
         for r in rows:
-            last_dt = datetime.strptime(last_date_map.get(r['code'], date), '%Y-%m-%d').date()
+            last_dt = datetime.strptime(r.pop('last_seen') or date, '%Y-%m-%d').date()
             gap = (latest_date - last_dt).days
             r['remaining_days'] = max(0, 7 - gap)  # 剩余天数（小于等于2表示即将归档）
         data[b] = rows
@@ -250,7 +342,6 @@ def index():
     except Exception:
         yesterday_stats = None
 
-    conn.close()
     return render_template_string(INDEX_TEMPLATE, date=date, data=data, today=today, yesterday_stats=yesterday_stats)
 
 
@@ -275,7 +366,6 @@ def stock_detail(code):
     records = [dict(r) for r in cur.fetchall()]
 
     if not records:
-        conn.close()
         return f"<h1>未找到股票代码 {code} 的记录</h1><p><a href='/'>返回首页</a></p>"
 
     # 基本信息
@@ -294,18 +384,34 @@ def stock_detail(code):
     hit_rate = round(status_counts.get("已止盈", 0) / settled * 100, 1) if settled > 0 else None
     profit_rate = round(status_counts.get("已止盈", 0) / total_appearances * 100, 1) if total_appearances > 0 else None
 
-    # 同板块关联分析
-    cur.execute(
-        """
-        SELECT code, name, COUNT(*) as appearances, MAX(report_date) as latest
-        FROM watchlist_records
-        WHERE sector = ? AND code != ?
-        GROUP BY code, name
-        ORDER BY appearances DESC, latest DESC
-        LIMIT 5
-        """,
-        (sector, code),
-    )
+    # 同板块关联分析：有板块成分索引时按多对多成分取同板块个股，否则按记录里的板块名
+    # sectors.db 同样走只读连接池（成分由 sector_index refresh 维护，看板不建表）
+    peer_codes = []
+    sectors_db = Path(sector_index.db_path())
+    if sectors_db.exists():
+        peer_codes = sector_index.peers(conn_db(sectors_db), code)
+    if peer_codes:
+        cur.execute(
+            f"""
+            SELECT code, name, appearances, last_seen as latest
+            FROM code_summary
+            WHERE code IN ({','.join('?' * len(peer_codes))})
+            ORDER BY appearances DESC, latest DESC
+            LIMIT 5
+            """,
+            peer_codes,
+        )
+    else:
+        cur.execute(
+            """
+            SELECT code, name, appearances, last_seen as latest
+            FROM code_summary
+            WHERE sector = ? AND code != ?
+            ORDER BY appearances DESC, latest DESC
+            LIMIT 5
+            """,
+            (sector, code),
+        )
     related_stocks = [dict(r) for r in cur.fetchall()]
 
     # 准备图表数据（按日期序列）
@@ -326,7 +432,6 @@ def stock_detail(code):
         status_sequence.append(r["status"])
         bucket_sequence.append(r["bucket"])
 
-    conn.close()
 
     return render_template_string(
         STOCK_DETAIL_TEMPLATE,
@@ -377,7 +482,6 @@ def records():
     q += " ORDER BY report_date DESC, CASE bucket WHEN '进攻' THEN 1 WHEN '确认' THEN 2 ELSE 3 END"
     cur.execute(q, params)
     rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
 
     return jsonify({"total": len(rows), "records": rows})
 
@@ -416,7 +520,6 @@ def stats():
     for r in cur.fetchall():
         bucket_stats.setdefault(r["bucket"], {})[r["status"]] = r["cnt"]
 
-    conn.close()
 
     # 计算比率（样本不足显示 N/A）
     def pct(part, whole):
@@ -995,4 +1098,9 @@ HISTORY_TEMPLATE = """<!DOCTYPE html>
 
 
 if __name__ == "__main__":
+    import watchlist_tracker
+
+    # 启动前补跑表结构迁移（code_summary 等），之后请求只读
+    watchlist_tracker.DB_PATH = DB_PATH
+    watchlist_tracker.init_db()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -5,7 +5,10 @@
 用法：
   python3 scripts/watchlist_tracker.py init
   python3 scripts/watchlist_tracker.py ingest --file reports/preopen_watchlist_20260320.md
+  python3 scripts/watchlist_tracker.py ingest --file reports/preopen_watchlist_*.md
   python3 scripts/watchlist_tracker.py auto-latest
+  python3 scripts/watchlist_tracker.py ingest-all [--workers 4]
+  python3 scripts/watchlist_tracker.py rebuild
   python3 scripts/watchlist_tracker.py sync-sentiment
   python3 scripts/watchlist_tracker.py list --date 2026-03-20
   python3 scripts/watchlist_tracker.py stats
@@ -14,27 +17,38 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
+import json
+import os
+import re
 import sqlite3
 from datetime import datetime
+from multiprocessing import Pool
 from pathlib import Path
 from typing import Dict, List
 
 DB_PATH = Path("/root/.openclaw/workspace/data/watchlist_tracker.db")
 STOCK_ANALYSIS_DB = Path("/root/.openclaw/workspace/data/stock_analysis.db")
 REPORTS_DIR = Path("/root/.openclaw/workspace/reports")
+PREOPEN_PATTERN = "preopen_watchlist_*.md"
+AGENT_PATTERN = "right_compound_selection_*.md"  # 右侧短线复利选股Agent.py 的输出
+WORKERS = os.cpu_count() or 1
 
 
 def conn_db():
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
+    # WAL 模式写在库文件里，设一次永久生效：看板读连接不被入库写事务阻塞
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
 
-def init_db():
-    conn = conn_db()
-    cur = conn.cursor()
-
+# ---------------------------------------------------------------------------
+# 结构迁移：PRAGMA user_version 记录已执行到的版本，init_db 只补跑更新的迁移
+# ---------------------------------------------------------------------------
+def _migrate_base(cur):
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS watchlist_records (
@@ -75,14 +89,264 @@ def init_db():
         """
     )
 
-    # 迁移: 添加 sentiment_score 列（如果不存在）
-    try:
+    # 早期库没有 sentiment_score 列
+    cols = {r[1] for r in cur.execute("PRAGMA table_info(watchlist_records)")}
+    if "sentiment_score" not in cols:
         cur.execute("ALTER TABLE watchlist_records ADD COLUMN sentiment_score REAL")
-    except sqlite3.OperationalError:
-        pass  # 列已存在
 
-    conn.commit()
-    conn.close()
+
+def _migrate_indexes(cur):
+    # 按日期 / 仓位的查询走 UNIQUE(report_date, bucket, code) 自动索引，其余访问路径：
+    # 个股页、按代码取最后出现日期、情绪同步、归档更新
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_records_code_date ON watchlist_records(code, report_date)")
+    # 同板块关联个股（覆盖索引，不回表）
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_records_sector ON watchlist_records(sector, code, name, report_date)")
+    # 历史池 / 归档：按 code, name, sector 分组取活跃记录的最后日期（覆盖索引，分组无需排序）
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_records_active ON watchlist_records(code, name, sector, status, report_date)"
+    )
+    # 按状态筛选与状态 / 仓位统计
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_records_status ON watchlist_records(status, bucket)")
+
+
+# 每只股票一行的汇总（首次 / 最后出现、出现次数、各状态计数、最后仓位与板块），
+# 由 watchlist_records 上的触发器维护：任何写入（入库、改状态、归档、Agent 入库）都在同一事务里
+# 按代码重算该股票的汇总行（走 idx_records_code_date，只读这一只股票的记录）
+_SUMMARY_SELECT = """
+    SELECT r.code, r.name, r.sector, r.bucket, MAX(r.report_date),
+           (SELECT MIN(report_date) FROM watchlist_records WHERE code = r.code),
+           (SELECT MAX(report_date) FROM watchlist_records WHERE code = r.code AND status != '失效'),
+           COUNT(*),
+           SUM(r.status = '待观察'), SUM(r.status = '已入场'), SUM(r.status = '已止盈'),
+           SUM(r.status = '已止损'), SUM(r.status = '失效')
+    FROM watchlist_records r
+    WHERE {where}
+    GROUP BY r.code
+"""
+_SUMMARY_COLUMNS = (
+    "code, name, sector, last_bucket, last_seen, first_seen, active_last_seen, appearances, "
+    "n_pending, n_entered, n_profit, n_loss, n_invalid"
+)
+
+
+def _refresh_summary_sql(code_ref: str) -> str:
+    return (
+        f"DELETE FROM code_summary WHERE code = {code_ref};\n"
+        f"INSERT INTO code_summary ({_SUMMARY_COLUMNS}) {_SUMMARY_SELECT.format(where=f'r.code = {code_ref}')};"
+    )
+
+
+def _migrate_code_summary(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS code_summary (
+            code TEXT PRIMARY KEY NOT NULL,
+            name TEXT,
+            sector TEXT,
+            last_bucket TEXT,
+            last_seen TEXT NOT NULL,
+            first_seen TEXT NOT NULL,
+            active_last_seen TEXT,
+            appearances INTEGER NOT NULL,
+            n_pending INTEGER NOT NULL,
+            n_entered INTEGER NOT NULL,
+            n_profit INTEGER NOT NULL,
+            n_loss INTEGER NOT NULL,
+            n_invalid INTEGER NOT NULL
+        )
+        """
+    )
+    # 历史池 / 归档按活跃记录的最后日期筛选排序；同板块关联个股
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_summary_active ON code_summary(active_last_seen)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_summary_sector ON code_summary(sector, appearances)")
+
+    cur.execute("DELETE FROM code_summary")
+    cur.execute(f"INSERT INTO code_summary ({_SUMMARY_COLUMNS}) {_SUMMARY_SELECT.format(where='1')}")
+
+    for ddl in (
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_insert AFTER INSERT ON watchlist_records BEGIN
+            {_refresh_summary_sql('NEW.code')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_update
+        AFTER UPDATE OF report_date, bucket, code, name, sector, status ON watchlist_records BEGIN
+            {_refresh_summary_sql('NEW.code')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_recode
+        AFTER UPDATE OF code ON watchlist_records WHEN OLD.code != NEW.code BEGIN
+            {_refresh_summary_sql('OLD.code')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_delete AFTER DELETE ON watchlist_records BEGIN
+            {_refresh_summary_sql('OLD.code')}
+        END
+        """,
+    ):
+        cur.execute(ddl)
+
+
+# 报告入库写入的内容列；row_hash 为这些列的摘要，重复入库时内容未变的行不写（也不触发汇总重算）
+_CONTENT_COLUMNS = (
+    "name", "sector", "chg_pct", "turnover_pct", "excess_vs_index", "vol_ratio5", "rsi14",
+    "ideal_buy", "secondary_buy", "stop_loss", "target_range",
+)
+
+
+def _row_hash(values) -> str:
+    # SQLite 把 -0.0 存成 0.0，+ 0.0 归一，保证回填（读库值）与入库（解析值）算出同一摘要
+    values = [v + 0.0 if isinstance(v, float) else v for v in values]
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _migrate_row_hash(cur):
+    cols = {r[1] for r in cur.execute("PRAGMA table_info(watchlist_records)")}
+    if "row_hash" not in cols:
+        cur.execute("ALTER TABLE watchlist_records ADD COLUMN row_hash TEXT")
+    rows = cur.execute(f"SELECT id, {', '.join(_CONTENT_COLUMNS)} FROM watchlist_records").fetchall()
+    cur.executemany(
+        "UPDATE watchlist_records SET row_hash = ? WHERE id = ?",
+        [(_row_hash(r[1:]), r[0]) for r in rows],
+    )
+
+
+def _migrate_ingested_files(cur):
+    # 已入库报告文件的校验和：ingest-all 只处理新增或内容变化的文件
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ingested_files (
+            path TEXT PRIMARY KEY NOT NULL,
+            kind TEXT NOT NULL,
+            sha1 TEXT NOT NULL,
+            report_date TEXT,
+            n_rows INTEGER NOT NULL,
+            ingested_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+# 早期 Agent 入库直接写 YYYYMMDD：统一成 YYYY-MM-DD（看板按 %Y-%m-%d 解析 MAX(report_date)，
+# 补录 / 重建按规范日期写入，不统一会同一天出现两份记录）。与同一天已有的记录合并：
+# 内容列以规范日期的记录为准、缺的取旧记录，人工维护的状态 / 备注 / 情绪分保留非默认值
+_COMPACT_DATE = "[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]"
+_ISO_DATE_SQL = "substr(report_date, 1, 4) || '-' || substr(report_date, 5, 2) || '-' || substr(report_date, 7, 2)"
+
+
+def _migrate_report_date(cur):
+    merge_cols = _CONTENT_COLUMNS + ("sentiment_score",)
+    cols = ("id", "report_date", "bucket", "code", "status", "note", "created_at", "row_hash") + merge_cols
+    select = f"SELECT {', '.join(cols)} FROM watchlist_records"
+    legacy = cur.execute(f"{select} WHERE report_date GLOB ?", (_COMPACT_DATE,)).fetchall()
+    for old in (dict(zip(cols, r)) for r in legacy):
+        d = old["report_date"]
+        day = f"{d[:4]}-{d[4:6]}-{d[6:]}"
+        row = cur.execute(
+            f"{select} WHERE report_date = ? AND bucket = ? AND code = ?", (day, old["bucket"], old["code"])
+        ).fetchone()
+        if row is None:
+            cur.execute("UPDATE watchlist_records SET report_date = ? WHERE id = ?", (day, old["id"]))
+            continue
+        new = dict(zip(cols, row))
+        merged = {c: old[c] if new[c] is None else new[c] for c in merge_cols}
+        merged["status"] = old["status"] if new["status"] == "待观察" else new["status"]
+        merged["note"] = new["note"] or old["note"]
+        merged["created_at"] = min(filter(None, (old["created_at"], new["created_at"])), default=None)
+        # 内容列补了旧记录的值时摘要失效，置空让下次入库按报告重写
+        same = all(merged[c] == new[c] for c in _CONTENT_COLUMNS)
+        merged["row_hash"] = new["row_hash"] if same else None
+        cur.execute("DELETE FROM watchlist_records WHERE id = ?", (old["id"],))
+        cur.execute(
+            f"UPDATE watchlist_records SET {', '.join(f'{c} = ?' for c in merged)} WHERE id = ?",
+            (*merged.values(), new["id"]),
+        )
+
+    # 过程指标同一天同一指标以规范日期的为准
+    cur.execute(
+        f"""
+        DELETE FROM process_metrics WHERE report_date GLOB ? AND EXISTS (
+            SELECT 1 FROM process_metrics p
+            WHERE p.report_date = {_ISO_DATE_SQL.replace('report_date', 'process_metrics.report_date')}
+              AND p.metric_key = process_metrics.metric_key)
+        """,
+        (_COMPACT_DATE,),
+    )
+    for table in ("process_metrics", "ingested_files"):
+        cur.execute(f"UPDATE {table} SET report_date = {_ISO_DATE_SQL} WHERE report_date GLOB ?", (_COMPACT_DATE,))
+
+
+MIGRATIONS = [
+    (1, "基础表 + sentiment_score 列", _migrate_base),
+    (2, "watchlist_records 二级索引", _migrate_indexes),
+    (3, "code_summary 汇总表 + 触发器", _migrate_code_summary),
+    (4, "watchlist_records.row_hash 内容摘要", _migrate_row_hash),
+    (5, "ingested_files 报告文件校验和", _migrate_ingested_files),
+    (6, "report_date 统一为 YYYY-MM-DD", _migrate_report_date),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn: sqlite3.Connection) -> List[int]:
+    """按版本号补跑迁移，每个迁移与版本号更新在同一事务内；返回本次执行的版本"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    applied = []
+    for v, _, fn in MIGRATIONS:
+        if v <= version:
+            continue
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+        try:
+            fn(cur)
+            cur.execute(f"PRAGMA user_version = {v}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(v)
+    return applied
+
+
+def init_db():
+    conn = conn_db()
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            applied = migrate(conn)
+            for v, desc, _ in MIGRATIONS:
+                if v in applied:
+                    print(f"schema migrated: v{v} {desc}")
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------------------------------------
+# 查询计划检查：EXPLAIN QUERY PLAN 中的 SCAN <表或别名>（不走索引，或按非覆盖索引整表遍历回表）
+# 视为全表扫描；USING AUTOMATIC ... INDEX（每次查询先整表建临时索引）同样算；
+# SCAN ... USING COVERING INDEX 只读索引、SCAN CONSTANT ROW、子查询 / CTE 的结果集允许
+# ---------------------------------------------------------------------------
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\S+)(?: AS \S+)?(?: USING INDEX \S+)?$")
+_SUBQUERY = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (\S+)")
+
+
+def explain(conn: sqlite3.Connection, sql: str, params=()) -> List[str]:
+    return [r[3] for r in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+
+def full_scans(conn: sqlite3.Connection, sql: str, params=()) -> List[str]:
+    """语句计划中的全表扫描与自动索引（按别名出现的表同样算；子查询 / 常量行 / 覆盖索引扫描不算）"""
+    details = [d.strip() for d in explain(conn, sql, params)]
+    subqueries = {m.group(1) for m in map(_SUBQUERY.match, details) if m}
+    out = []
+    for detail in details:
+        m = _FULL_SCAN.match(detail)
+        if m and m.group(1) not in subqueries and not m.group(1).startswith("("):
+            out.append(detail)
+        elif "USING AUTOMATIC" in detail:
+            out.append(detail)
+    return out
 
 
 def _to_float(s: str):
@@ -188,76 +452,250 @@ def _parse_process_metrics(text: str) -> Dict[str, str]:
     return out
 
 
-def ingest_report(path: Path):
-    text = path.read_text(encoding="utf-8")
-    report_date = _extract_report_date(text)
+_UPSERT_RECORD_SQL = f"""
+    INSERT INTO watchlist_records (report_date, bucket, code, {', '.join(_CONTENT_COLUMNS)}, row_hash)
+    VALUES ({', '.join('?' * (len(_CONTENT_COLUMNS) + 4))})
+    ON CONFLICT(report_date, bucket, code) DO UPDATE SET
+        {', '.join(f'{c}=excluded.{c}' for c in _CONTENT_COLUMNS)},
+        row_hash=excluded.row_hash
+    WHERE row_hash IS NOT excluded.row_hash
+"""
 
-    observe = _parse_bucket(text, "观察仓")
-    confirm = _parse_bucket(text, "确认仓")
-    attack = _parse_bucket(text, "进攻仓")
-    metrics = _parse_process_metrics(text)
+_UPSERT_METRIC_SQL = """
+    INSERT INTO process_metrics (report_date, metric_key, metric_value)
+    VALUES (?,?,?)
+    ON CONFLICT(report_date, metric_key) DO UPDATE SET metric_value=excluded.metric_value
+    WHERE metric_value IS NOT excluded.metric_value
+"""
 
-    init_db()
-    conn = conn_db()
-    cur = conn.cursor()
 
-    def upsert(bucket: str, rows: List[Dict]):
-        for r in rows:
-            cur.execute(
-                """
-                INSERT INTO watchlist_records
-                (report_date,bucket,code,name,sector,chg_pct,turnover_pct,excess_vs_index,vol_ratio5,rsi14,ideal_buy,secondary_buy,stop_loss,target_range)
-                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-                ON CONFLICT(report_date,bucket,code) DO UPDATE SET
-                    name=excluded.name,
-                    sector=excluded.sector,
-                    chg_pct=excluded.chg_pct,
-                    turnover_pct=excluded.turnover_pct,
-                    excess_vs_index=excluded.excess_vs_index,
-                    vol_ratio5=excluded.vol_ratio5,
-                    rsi14=excluded.rsi14,
-                    ideal_buy=excluded.ideal_buy,
-                    secondary_buy=excluded.secondary_buy,
-                    stop_loss=excluded.stop_loss,
-                    target_range=excluded.target_range
-                """,
-                (
-                    report_date,
-                    bucket,
-                    r["code"],
-                    r["name"],
-                    r["sector"],
-                    r["chg_pct"],
-                    r["turnover_pct"],
-                    r["excess_vs_index"],
-                    r["vol_ratio5"],
-                    r["rsi14"],
-                    r["ideal_buy"],
-                    r["secondary_buy"],
-                    r["stop_loss"],
-                    r["target_range"],
-                ),
+_UPSERT_FILE_SQL = """
+    INSERT INTO ingested_files (path, kind, sha1, report_date, n_rows) VALUES (?,?,?,?,?)
+    ON CONFLICT(path) DO UPDATE SET
+        kind=excluded.kind, sha1=excluded.sha1, report_date=excluded.report_date,
+        n_rows=excluded.n_rows, ingested_at=CURRENT_TIMESTAMP
+"""
+
+
+def _file_sha1(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def parse_report(path: Path, data: bytes = None) -> Dict:
+    """解析一份盘前报告：报告日期、三仓候选行、生成过程明细"""
+    data = path.read_bytes() if data is None else data
+    text = data.decode("utf-8")
+    return {
+        "path": path,
+        "kind": "preopen",
+        "sha1": _file_sha1(data),
+        "report_date": _extract_report_date(text),
+        "buckets": {
+            "观察": _parse_bucket(text, "观察仓"),
+            "确认": _parse_bucket(text, "确认仓"),
+            "进攻": _parse_bucket(text, "进攻仓"),
+        },
+        "metrics": _parse_process_metrics(text),
+    }
+
+
+# ---------------------------------------------------------------------------
+# 右侧短线复利选股Agent 输出（right_compound_selection_YYYYMMDD.md）：
+# 观察仓条目带价格明细，确认仓 / 进攻仓是观察仓的子集，只列代码名称，行内容按 Agent 的
+# ingest_to_db 还原；旧报告没有"现价"行时按止损位 / 止损比例反推现价
+# ---------------------------------------------------------------------------
+_AGENT_ITEM = re.compile(r"^(?:\d+\)|- 标的：)\s*(\d{6})\s+(.+?)\s*$")
+
+
+def parse_agent_report(path: Path, data: bytes = None) -> Dict:
+    data = path.read_bytes() if data is None else data
+    text = data.decode("utf-8")
+
+    m = re.search(r"日报 - (\d{8})", text) or re.search(r"(\d{8})", path.name)
+    report_date = datetime.strptime(m.group(1), "%Y%m%d").strftime("%Y-%m-%d")
+    m = re.search(r"止损：(\d+)%\s*\|\s*止盈：(\d+)%-(\d+)%", text)
+    sl = int(m.group(1)) / 100 if m else 0.04
+
+    sections: Dict[str, List[tuple]] = {"观察": [], "确认": [], "进攻": []}
+    details: Dict[str, Dict] = {}
+    current = None
+    bucket = None
+    for line in text.splitlines():
+        if line.startswith("## "):
+            bucket = next((b for b in sections if f"{b}仓" in line), None)
+            current = None
+            continue
+        if bucket is None:
+            continue
+        item = _AGENT_ITEM.match(line.strip())
+        if item:
+            current = item.group(1)
+            sections[bucket].append((current, item.group(2)))
+            continue
+        s = line.strip()
+        if bucket != "观察" or current is None or not s.startswith("- "):
+            continue
+        key, _, value = s[2:].partition("：")
+        d = details.setdefault(current, {})
+        if key == "入选理由":
+            parts = value.split("，", 3)  # 趋势强度 / 均线多头 / 量比 / 行业提示
+            d["sector"] = parts[3] if len(parts) > 3 else ""
+        elif key == "现价":
+            pm = re.match(r"([\d.]+)(?:（换手([\d.]+)%）)?", value)
+            if pm:
+                d["current"] = float(pm.group(1))
+                d["turnover"] = float(pm.group(2)) if pm.group(2) else None
+        elif key == "止损位":
+            d["stop_loss"] = _to_float(value)
+        elif key == "目标价":
+            lo, _, hi = value.partition("~")
+            if _to_float(lo) is not None and _to_float(hi) is not None:
+                d["target_range"] = f"{_to_float(lo)} ~ {_to_float(hi)}"
+
+    buckets = {}
+    for b, items in sections.items():
+        rows = []
+        for code, name in items:
+            d = details.get(code, {})
+            cur = d.get("current")
+            if cur is None and d.get("stop_loss") is not None:
+                cur = round(d["stop_loss"] / (1 - sl), 2)
+            rows.append(
+                {
+                    "code": code,
+                    "name": name,
+                    "sector": d.get("sector", ""),
+                    "chg_pct": None,
+                    "turnover_pct": d.get("turnover"),
+                    # Agent 入库不改 excess_vs_index / vol_ratio5，这里也不带，写入时沿用同键已有值
+                    "rsi14": None,
+                    "ideal_buy": cur,
+                    "secondary_buy": cur * 0.98 if cur is not None else None,
+                    "stop_loss": d.get("stop_loss"),
+                    "target_range": d.get("target_range", ""),
+                }
             )
+        buckets[b] = rows
+    return {
+        "path": path,
+        "kind": "agent",
+        "sha1": _file_sha1(data),
+        "report_date": report_date,
+        "buckets": buckets,
+        "metrics": {},
+    }
+
+
+PARSERS = {"preopen": parse_report, "agent": parse_agent_report}
+
+
+def write_parsed(conn: sqlite3.Connection, parsed: List[Dict]) -> Dict[str, int]:
+    """解析结果在一个事务里批量 upsert；同一键后出现的覆盖先出现的（行里没带的列沿用先出现的值），
+    内容摘要未变的行跳过。同一事务里记下各文件的校验和"""
+    records: Dict[tuple, Dict] = {}
+    metrics = {}
+    files = []
+    for rep in parsed:
+        d = rep["report_date"]
+        n_rows = 0
+        for bucket, rows in rep["buckets"].items():
+            for r in rows:
+                key = (d, bucket, r["code"])
+                records[key] = {**records.get(key, {}), **r}
+            n_rows += len(rows)
+        metrics.update(((d, k), v) for k, v in rep["metrics"].items())
+        files.append((str(Path(rep["path"]).resolve()), rep["kind"], rep["sha1"], d, n_rows))
 
-    upsert("观察", observe)
-    upsert("确认", confirm)
-    upsert("进攻", attack)
+    cur = conn.cursor()
+    cur.execute("BEGIN")
+    try:
+        batch = []
+        for key, r in records.items():
+            missing = [c for c in _CONTENT_COLUMNS if c not in r]
+            if missing:  # 批次里没有先出现的同键行：取库里已有记录的值
+                old = cur.execute(
+                    f"SELECT {', '.join(missing)} FROM watchlist_records WHERE report_date=? AND bucket=? AND code=?",
+                    key,
+                ).fetchone()
+                r = {**r, **dict(zip(missing, old or [None] * len(missing)))}
+            values = [r[c] for c in _CONTENT_COLUMNS]
+            batch.append((*key, *values, _row_hash(values)))
+        cur.executemany(_UPSERT_RECORD_SQL, batch)
+        written = cur.rowcount
+        cur.executemany(_UPSERT_METRIC_SQL, [(*key, v) for key, v in metrics.items()])
+        cur.executemany(_UPSERT_FILE_SQL, files)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {"reports": len(parsed), "rows": len(records), "written": written, "unchanged": len(records) - written}
 
-    for k, v in metrics.items():
-        cur.execute(
-            """
-            INSERT INTO process_metrics (report_date, metric_key, metric_value)
-            VALUES (?,?,?)
-            ON CONFLICT(report_date, metric_key) DO UPDATE SET metric_value=excluded.metric_value
-            """,
-            (report_date, k, v),
+
+def ingest_reports(paths: List[Path]) -> Dict[str, int]:
+    """批量入库：先解析全部报告，再一次性写入"""
+    parsed = [parse_report(Path(p)) for p in paths]
+
+    init_db()
+    conn = conn_db()
+    try:
+        result = write_parsed(conn, parsed)
+    finally:
+        conn.close()
+
+    for rep in parsed:
+        b = rep["buckets"]
+        print(
+            f"ingested: date={rep['report_date']}, 观察={len(b['观察'])}, 确认={len(b['确认'])}, 进攻={len(b['进攻'])}"
         )
+    if len(parsed) > 1 or result["unchanged"]:
+        print(f"写入 {result['written']} 行，未变跳过 {result['unchanged']} 行（共 {result['reports']} 份报告）")
+    return result
+
+
+def ingest_report(path: Path):
+    return ingest_reports([path])
+
+
+def _parse_job(job):
+    kind, path = job
+    return PARSERS[kind](Path(path))
+
+
+def ingest_all(reports_dir: Path = None, force: bool = False, workers: int = WORKERS) -> Dict[str, int]:
+    """补录目录下全部盘前报告与 Agent 输出：校验和未变的文件跳过（force 全部重新解析），
+    其余用进程池并行解析，合并后一个事务写入。同一天同一仓同一只股票以 Agent 输出为准（盘后运行，晚于盘前报告）"""
+    reports_dir = Path(reports_dir or REPORTS_DIR)
+    init_db()
+    conn = conn_db()
+    try:
+        known = {r["path"]: r["sha1"] for r in conn.execute("SELECT path, sha1 FROM ingested_files")}
+
+        jobs = []
+        n_files = 0
+        for kind, pattern in (("preopen", PREOPEN_PATTERN), ("agent", AGENT_PATTERN)):
+            for path in sorted(reports_dir.glob(pattern)):
+                n_files += 1
+                if force or known.get(str(path.resolve())) != _file_sha1(path.read_bytes()):
+                    jobs.append((kind, str(path)))
+        print(f"📁 {reports_dir}: {n_files} 份报告，需处理 {len(jobs)} 份（未变跳过 {n_files - len(jobs)} 份）")
+        if not jobs:
+            return {"files": n_files, "reports": 0, "rows": 0, "written": 0, "unchanged": 0}
+
+        if workers > 1 and len(jobs) > 1:
+            with Pool(min(workers, len(jobs))) as pool:
+                parsed = pool.map(_parse_job, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+        else:
+            parsed = [_parse_job(job) for job in jobs]
+        parsed.sort(key=lambda rep: (rep["report_date"], rep["kind"] == "agent", str(rep["path"])))
+
+        result = write_parsed(conn, parsed)
+    finally:
+        conn.close()
 
-    conn.commit()
-    conn.close()
     print(
-        f"ingested: date={report_date}, 观察={len(observe)}, 确认={len(confirm)}, 进攻={len(attack)}"
+        f"✅ 解析 {result['reports']} 份，写入 {result['written']} 行，未变跳过 {result['unchanged']} 行"
     )
+    return {"files": n_files, **result}
 
 
 def find_latest_report() -> Path:
@@ -383,13 +821,20 @@ def main():
 
     sub.add_parser("init")
     ing = sub.add_parser("ingest")
-    ing.add_argument("--file", required=True)
+    ing.add_argument("--file", required=True, nargs="+", help="可一次传入多份报告，一个事务批量入库")
 
     ls = sub.add_parser("list")
     ls.add_argument("--date", required=True)
 
     sub.add_parser("stats")
     sub.add_parser("auto-latest")
+    for name, help_text in (
+        ("ingest-all", "补录报告目录下新增或修改过的盘前报告 / Agent 输出"),
+        ("rebuild", "忽略校验和，重新解析并写入全部报告（不清空人工更新的状态）"),
+    ):
+        ia = sub.add_parser(name, help=help_text)
+        ia.add_argument("--dir", default=str(REPORTS_DIR))
+        ia.add_argument("--workers", type=int, default=WORKERS)
     sub.add_parser("sync-sentiment")
 
     up = sub.add_parser("update-status")
@@ -409,9 +854,11 @@ def main():
         init_db()
         print(f"initialized: {DB_PATH}")
     elif args.cmd == "ingest":
-        ingest_report(Path(args.file))
+        ingest_reports([Path(f) for f in args.file])
     elif args.cmd == "auto-latest":
         auto_latest()
+    elif args.cmd in ("ingest-all", "rebuild"):
+        ingest_all(Path(args.dir), force=args.cmd == "rebuild", workers=args.workers)
     elif args.cmd == "sync-sentiment":
         sync_sentiment_from_analysis()
     elif args.cmd == "list":
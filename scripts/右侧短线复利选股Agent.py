@@ -271,6 +271,7 @@ def build_report(
             lines.append(f"{i}) {s.code} {s.name}")
             lines.append(f"   - 入选理由：{reason}")
             lines.append(f"   - 胜率评估：{to_winrate(sc)}%")
+            lines.append(f"   - 现价：{fmt_price(s.current)}（换手{s.turnover:.2f}%）")
             lines.append(f"   - 止损位：{fmt_price(stop)}")
             lines.append(f"   - 目标价：{fmt_price(t_low)} ~ {fmt_price(t_high)}")
     else:
@@ -339,6 +340,11 @@ def ingest_to_db(report_date: str, observe, confirm, attack, preset: dict):
         print(f"⚠️ 数据库不存在，跳过入库: {DB_PATH}")
         return
 
+    # 补跑表结构迁移；code_summary 汇总由触发器随写入同步维护
+    import watchlist_tracker
+    watchlist_tracker.DB_PATH = DB_PATH
+    watchlist_tracker.init_db()
+
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
 
@@ -366,7 +372,8 @@ def ingest_to_db(report_date: str, observe, confirm, attack, preset: dict):
                 ideal_buy=excluded.ideal_buy,
                 secondary_buy=excluded.secondary_buy,
                 stop_loss=excluded.stop_loss,
-                target_range=excluded.target_range
+                target_range=excluded.target_range,
+                row_hash=NULL
         """,
             (
                 report_date,
@@ -446,8 +453,9 @@ def main():
 
     print(f"✅ 生成完成: {out_path}")
 
-    # 双写 DB
-    ingest_to_db(out_date_str, observe, confirm, attack, preset)
+    # 双写 DB（报告日期与盘前报告一致用 YYYY-MM-DD）
+    db_date = datetime.strptime(out_date_str, "%Y%m%d").strftime("%Y-%m-%d")
+    ingest_to_db(db_date, observe, confirm, attack, preset)
 
 
 if __name__ == "__main__":
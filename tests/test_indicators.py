@@ -0,0 +1,35 @@
+"""indicators 按股票缓存：内容变化不命中旧结果，条目数有上限"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "02-scripts" / "market"))
+
+import indicators  # noqa: E402
+
+
+def _bars(scale: float = 1.0) -> pd.DataFrame:
+    return pd.DataFrame({"date": pd.date_range("2026-01-01", periods=40), "close": np.linspace(10, 20, 40) * scale})
+
+
+def test_cache_misses_when_history_is_readjusted():
+    indicators.clear_cache()
+    first = indicators.add_indicators(_bars(), ["price_ma5"], key="600000")["price_ma5"].iloc[-1]
+    # 复权重算：最后K线与行数不变，价格整体变化
+    again = indicators.add_indicators(_bars(0.9), ["price_ma5"], key="600000")["price_ma5"].iloc[-1]
+    assert again == pytest.approx(first * 0.9)
+
+
+def test_cache_is_bounded(monkeypatch):
+    indicators.clear_cache()
+    monkeypatch.setattr(indicators, "CACHE_SIZE", 3)
+    dates = np.arange(30).astype("datetime64[D]")
+    loaded = [(f"{j:06d}", {"date": dates, "close": np.arange(30.0) + j}) for j in range(10)]
+    entries = indicators._fill_cache(loaded, ["price_ma5"], ["close"])
+    assert len(indicators._CACHE) == 3
+    assert [e["price_ma5"][-1] for e in entries] == [27.0 + j for j in range(10)]
+
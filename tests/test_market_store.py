@@ -0,0 +1,57 @@
+"""market_store 追加写入的列约束与读端一致性"""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "02-scripts" / "market"))
+
+import market_store  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(market_store, "STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(market_store, "USE_PANEL", False)
+
+
+def _bars(start: str, n: int, columns=market_store.COLUMNS) -> pd.DataFrame:
+    df = pd.DataFrame({"date": pd.bdate_range(start, periods=n)})
+    for i, c in enumerate(columns):
+        df[c] = np.arange(n, dtype=np.float64) + 10 * i
+    return df
+
+
+def test_append_rejects_frame_missing_stored_columns():
+    market_store.write_bars("600000", _bars("2026-01-05", 5))
+    with pytest.raises(ValueError, match="open"):
+        market_store.append_bars("600000", _bars("2026-01-12", 3, ("close", "volume")))
+    assert market_store.read_meta("600000")["rows"] == 5
+
+
+def test_append_widens_partition_with_new_columns():
+    market_store.write_bars("600000", _bars("2026-01-05", 5, ("close", "volume")))
+    assert market_store.append_bars("600000", _bars("2026-01-05", 8)) == 3
+
+    meta = market_store.read_meta("600000")
+    assert meta["columns"] == list(market_store.COLUMNS)
+    df = market_store.load_bars("600000")
+    assert len(df) == 8
+    assert df["high"].isna().sum() == 5 and df["high"].iloc[5:].notna().all()
+
+
+def test_reader_truncates_columns_written_ahead_of_meta():
+    market_store.write_bars("600000", _bars("2026-01-05", 5))
+    # 模拟追加写到一半：close / date 已替换为 6 行，meta.json 仍是 5 行
+    longer = _bars("2026-01-05", 6)
+    code_dir = os.path.join(market_store.STORE_DIR, "600000")
+    np.save(os.path.join(code_dir, "date.npy"), longer["date"].to_numpy().astype("datetime64[D]"))
+    np.save(os.path.join(code_dir, "close.npy"), longer["close"].to_numpy())
+
+    df = market_store.load_bars("600000")
+    assert len(df) == 5
+    assert df["close"].tolist() == longer["close"].iloc[:5].tolist()
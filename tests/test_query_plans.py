@@ -0,0 +1,178 @@
+"""看板各页面实际执行的 SQL 走索引：对每条语句做 EXPLAIN QUERY PLAN，不允许全表扫描 / 自动索引
+
+    python -m pytest tests/test_query_plans.py
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+import watchlist_tracker  # noqa: E402
+
+LATEST = "2026-03-20"
+HEADER = "| 代码 | 名称 | 板块 | 涨幅 | 换手 | 超额vs大盘 | 量比5日 | RSI | 理想买点(MA5) | 次优买点(MA10) | 止损位 | 目标位区间 |"
+
+# 不带筛选的 /records 与 LIKE 模糊搜索本身就要读全表，不在检查范围内
+URLS = [
+    "/",
+    f"/?date={LATEST}",
+    "/history",
+    "/history?days=3&page=2",
+    "/stock/600001",
+    f"/records?date={LATEST}",
+    "/records?status=待观察",
+    "/stats",
+]
+
+
+def _report(day: str, codes) -> str:
+    lines = [f"# 盘前候选池\n\n生成时间：{day} 08:30\n"]
+    for i, section in enumerate(("进攻仓", "确认仓", "观察仓")):
+        lines += [f"## {section}", "", HEADER, "|" + "---|" * 12]
+        for code in codes[i::3]:
+            lines.append(
+                f"| {code} | 股{code} | 板块{int(code) % 5} | 3.2% | 8.1% | 1.5 | 1.3 | 61 | 10.2 | 9.9 | 9.5 | 11 ~ 12 |"
+            )
+        lines.append("")
+    lines += ["## 生成过程明细", "", "1. 板块 10 个", ""]
+    return "\n".join(lines)
+
+
+@pytest.fixture
+def tracker_db(tmp_path, monkeypatch):
+    """30 个交易日的盘前报告入库，部分股票标记失效（历史池 / 归档用）"""
+    db = tmp_path / "watchlist_tracker.db"
+    monkeypatch.setattr(watchlist_tracker, "DB_PATH", db)
+    reports = []
+    days = [f"2026-02-{d:02d}" for d in range(1, 29)] + ["2026-03-19", LATEST]
+    for i, day in enumerate(days):
+        codes = [f"{600000 + (i * 7 + k) % 120:06d}" for k in range(24)]
+        path = tmp_path / "reports" / f"preopen_watchlist_{day.replace('-', '')}.md"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(_report(day, codes), encoding="utf-8")
+        reports.append(path)
+    watchlist_tracker.ingest_reports(reports)
+
+    conn = watchlist_tracker.conn_db()
+    conn.execute("UPDATE watchlist_records SET status='失效' WHERE code IN ('600003', '600010')")
+    conn.commit()
+    conn.close()
+    return db
+
+
+@pytest.fixture
+def dashboard(tracker_db, tmp_path, monkeypatch):
+    pytest.importorskip("flask")
+    import watchlist_dashboard
+    import market_store
+
+    monkeypatch.setattr(watchlist_dashboard, "DB_PATH", tracker_db)
+    monkeypatch.setattr(market_store, "STORE_DIR", str(tmp_path / "stock_data" / "store"))
+    yield watchlist_dashboard
+    watchlist_dashboard.read_pool(tracker_db).close_all()
+
+
+@pytest.mark.parametrize("url", URLS)
+def test_dashboard_queries_use_indexes(dashboard, tracker_db, monkeypatch, url):
+    trace = []
+    monkeypatch.setattr(dashboard, "_SQL_TRACE", trace)
+    resp = dashboard.app.test_client().get(url)
+    assert resp.status_code == 200
+
+    statements = list(dict.fromkeys(q for q in trace if q.lstrip().upper().startswith("SELECT")))
+    assert statements
+    conn = sqlite3.connect(tracker_db)
+    scans = {q: watchlist_tracker.full_scans(conn, q) for q in statements}
+    conn.close()
+    assert {" ".join(q.split()): d for q, d in scans.items() if d} == {}
+
+
+def test_missing_index_is_reported(dashboard, tracker_db, monkeypatch):
+    conn = sqlite3.connect(tracker_db)
+    conn.execute("DROP INDEX idx_records_code_date")
+    conn.execute("DROP INDEX idx_records_active")
+    conn.commit()
+
+    trace = []
+    monkeypatch.setattr(dashboard, "_SQL_TRACE", trace)
+    assert dashboard.app.test_client().get("/stock/600001").status_code == 200
+    scans = [d for q in trace if q.lstrip().upper().startswith("SELECT") for d in watchlist_tracker.full_scans(conn, q)]
+    conn.close()
+    assert scans
+
+
+# ---------------------------------------------------------------------------
+# full_scans 本身
+# ---------------------------------------------------------------------------
+@pytest.fixture
+def bare_conn():
+    """没有任何索引的表"""
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE watchlist_records (id INTEGER PRIMARY KEY, report_date, bucket, code, chg_pct)")
+    conn.execute("CREATE TABLE code_summary (code, last_seen)")
+    yield conn
+    conn.close()
+
+
+def test_full_scan_on_aliased_table(bare_conn):
+    sql = (
+        "SELECT r.code, s.last_seen FROM watchlist_records r LEFT JOIN code_summary s ON s.code = r.code "
+        "WHERE r.report_date = '2026-03-20' AND r.bucket = '进攻' ORDER BY r.chg_pct DESC"
+    )
+    scans = watchlist_tracker.full_scans(bare_conn, sql)
+    assert "SCAN r" in scans
+    assert any("AUTOMATIC" in d for d in scans)
+
+
+def test_non_covering_index_scan_is_reported(bare_conn):
+    bare_conn.execute("CREATE INDEX idx_code ON watchlist_records(code)")
+    sql = "SELECT * FROM watchlist_records INDEXED BY idx_code ORDER BY code"
+    assert watchlist_tracker.full_scans(bare_conn, sql) == ["SCAN watchlist_records USING INDEX idx_code"]
+
+
+def test_covering_index_subquery_and_constant_row_are_allowed(bare_conn):
+    bare_conn.execute("CREATE INDEX idx_date_code ON watchlist_records(report_date, code)")
+    for sql in (
+        "SELECT report_date, code FROM watchlist_records ORDER BY report_date",
+        "SELECT * FROM (SELECT report_date, COUNT(*) AS n FROM watchlist_records GROUP BY report_date "
+        "ORDER BY n DESC LIMIT 5) t",
+        "WITH t AS MATERIALIZED (SELECT code FROM watchlist_records WHERE report_date = '2026-03-20') SELECT * FROM t",
+        "SELECT 1",
+    ):
+        assert watchlist_tracker.full_scans(bare_conn, sql) == [], sql
+
+
+def test_stock_peers_read_sectors_db_from_pool(dashboard, tmp_path, monkeypatch):
+    import sector_index
+
+    sectors_db = Path(sector_index.db_path())
+    conn = sector_index.connect(str(sectors_db))
+    conn.executemany(
+        "INSERT INTO sector_members(node, code) VALUES (?, ?)",
+        [("yh", "600001"), ("yh", "600002"), ("yh", "600005"), ("dz", "600009")],
+    )
+    conn.commit()
+    conn.close()
+
+    trace = []
+    monkeypatch.setattr(dashboard, "_SQL_TRACE", trace)
+    monkeypatch.setattr(sector_index, "connect", None)  # 请求里不应再开写连接 / 跑建表脚本
+    resp = dashboard.app.test_client().get("/stock/600001")
+    assert resp.status_code == 200
+    assert "600005" in resp.get_data(as_text=True)
+    assert not any("CREATE" in q.upper() for q in trace)
+
+    pool = dashboard.read_pool(sectors_db)
+    assert pool._idle.qsize() == 1
+    conn = pool.acquire()
+    try:
+        peers_sql = [q for q in trace if "sector_members" in q]
+        assert peers_sql and not any(watchlist_tracker.full_scans(conn, q) for q in peers_sql)
+    finally:
+        pool.release(conn)
+        pool.close_all()
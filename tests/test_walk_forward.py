@@ -0,0 +1,48 @@
+"""walk_forward 折缓存：增量运行与全新运行的结果一致"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "02-scripts" / "market"))
+
+import market_store  # noqa: E402
+import strategy_dsl  # noqa: E402
+import walk_forward  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(market_store, "STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(market_store, "USE_PANEL", False)
+
+
+def _bars(n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    return pd.DataFrame({
+        "date": pd.bdate_range("2022-01-03", periods=n),
+        "open": close, "high": close * 1.01, "low": close * 0.99, "close": close,
+        "volume": rng.lognormal(12, 0.5, n),
+    })
+
+
+def test_incremental_run_matches_fresh_run():
+    # 长周期 EMA 对预热长度最敏感：截断预热时信号明显偏离全量运行
+    above_ema = strategy_dsl.col("close") > strategy_dsl.col("ema200")
+    rules = [*strategy_dsl.STRATEGIES, strategy_dsl.Rule("EMA200 之上", above_ema)]
+    bars = _bars(800)
+    cache = walk_forward.FoldCache(path=None)
+
+    market_store.write_bars("600000", bars.iloc[:700])
+    walk_forward.evaluate_symbol("600000", rules, cache)
+    market_store.write_bars("600000", bars)
+    incremental = pd.DataFrame(walk_forward.evaluate_symbol("600000", rules, cache))
+    assert incremental["cached"].any() and not incremental["cached"].all()
+
+    fresh = pd.DataFrame(walk_forward.evaluate_symbol("600000", rules, walk_forward.FoldCache(path=None)))
+    cols = ["strategy", "fold", *walk_forward.STAT_KEYS]
+    pd.testing.assert_frame_equal(incremental[cols], fresh[cols])
@@ -0,0 +1,71 @@
+"""watchlist_tracker 结构迁移"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import watchlist_tracker  # noqa: E402
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(watchlist_tracker, "DB_PATH", tmp_path / "watchlist_tracker.db")
+    watchlist_tracker.init_db()
+    conn = watchlist_tracker.conn_db()
+    yield conn
+    conn.close()
+
+
+def _insert(conn, report_date, bucket, code, **cols):
+    cols = {"name": "股票", "sector": "银行", **cols}
+    conn.execute(
+        f"INSERT INTO watchlist_records (report_date, bucket, code, {', '.join(cols)}) "
+        f"VALUES (?, ?, ?, {', '.join('?' * len(cols))})",
+        (report_date, bucket, code, *cols.values()),
+    )
+
+
+def test_v6_normalizes_compact_report_dates(conn):
+    # v5 时代的库：Agent 写入的 YYYYMMDD 与报告补录写入的 YYYY-MM-DD 并存
+    _insert(conn, "20260319", "观察", "600000", chg_pct=3.0, status="已入场", note="手动")
+    _insert(conn, "20260320", "观察", "600000", chg_pct=4.0, rsi14=60.0, status="失效", sentiment_score=0.5)
+    _insert(conn, "2026-03-20", "观察", "600000", chg_pct=4.5, rsi14=None, row_hash="h")
+    _insert(conn, "20260320", "进攻", "600001", chg_pct=9.0)
+    conn.executemany(
+        "INSERT INTO process_metrics (report_date, metric_key, metric_value) VALUES (?, ?, ?)",
+        [("20260320", "step_1", "旧"), ("2026-03-20", "step_1", "新"), ("20260320", "step_2", "仅旧")],
+    )
+    conn.execute("PRAGMA user_version = 5")
+    conn.commit()
+
+    watchlist_tracker.init_db()
+
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == watchlist_tracker.SCHEMA_VERSION
+    rows = {
+        (r["report_date"], r["bucket"], r["code"]): dict(r)
+        for r in conn.execute("SELECT * FROM watchlist_records")
+    }
+    assert set(rows) == {
+        ("2026-03-19", "观察", "600000"),
+        ("2026-03-20", "观察", "600000"),
+        ("2026-03-20", "进攻", "600001"),
+    }
+    merged = rows[("2026-03-20", "观察", "600000")]
+    assert merged["chg_pct"] == 4.5 and merged["rsi14"] == 60.0
+    assert merged["status"] == "失效" and merged["sentiment_score"] == 0.5
+    assert merged["row_hash"] is None
+    assert rows[("2026-03-19", "观察", "600000")]["note"] == "手动"
+
+    metrics = dict(
+        ((r[0], r[1]), r[2]) for r in conn.execute("SELECT report_date, metric_key, metric_value FROM process_metrics")
+    )
+    assert metrics == {("2026-03-20", "step_1"): "新", ("2026-03-20", "step_2"): "仅旧"}
+
+    summary = conn.execute("SELECT * FROM code_summary WHERE code = '600000'").fetchone()
+    assert (summary["first_seen"], summary["last_seen"], summary["active_last_seen"]) == (
+        "2026-03-19", "2026-03-20", "2026-03-19",
+    )
+    assert (summary["appearances"], summary["n_entered"], summary["n_invalid"]) == (2, 1, 1)